@@ -6,74 +6,275 @@ Handles authentication and provides typed responses for common Discord operation
 """
 
 import os
+import time
+import logging
+import asyncio
 import httpx
-from typing import Dict, Any, Optional, List
+from datetime import datetime, timezone
+from urllib.parse import quote
+from typing import Dict, Any, Optional, List, AsyncIterator
 from dotenv import load_dotenv
 
+from rate_limiter import RateLimiter
+from metadata_cache import MetadataCache
+from metrics import record_upstream
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (HTTP/2 support for httpx)
+except ImportError:
+    h2 = None
+
 load_dotenv()
 
+DISCORD_EPOCH_MS = 1420070400000
+PAGE_SIZE = 100  # Discord max messages per request
+
+
+def snowflake_from_time(moment: datetime) -> int:
+    """Smallest snowflake created at the given time, usable as a before/after cursor"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0, int(moment.timestamp() * 1000) - DISCORD_EPOCH_MS) << 22
+
+
+def snowflake_time(snowflake: str) -> datetime:
+    return datetime.fromtimestamp(((int(snowflake) >> 22) + DISCORD_EPOCH_MS) / 1000, tz=timezone.utc)
+
+
+def audit_log_headers(reason: Optional[str]) -> Optional[Dict[str, str]]:
+    """Discord reads moderation reasons from this header, URL-encoded, not from the body"""
+    return {"X-Audit-Log-Reason": quote(reason, safe="")} if reason else None
+
+
 class DiscordClient:
-    def __init__(self, bot_token: str, base_url: str = "https://discord.com/api/v10"):
+    def __init__(
+        self,
+        bot_token: str,
+        base_url: str = "https://discord.com/api/v10",
+        max_concurrency: int = 10,
+        max_retries: int = 5,
+        global_rate: float = 50.0,
+        cache_max_entries: int = 1000,
+        cache_ttls: Optional[Dict[str, float]] = None,
+        http2: bool = False,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: float = 30.0,
+        timeout: Optional[httpx.Timeout] = None
+    ):
         self.bot_token = bot_token
         self.base_url = base_url
+        if http2 and h2 is None:
+            logger.warning("⚠️ HTTP/2 requested but the h2 package is missing (pip install 'httpx[http2]'); using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        # Requests beyond max_concurrency wait in the rate limiter, so a larger pool would sit idle
+        max_connections = max_connections or max_concurrency
         self.client = httpx.AsyncClient(
             headers={
                 "Authorization": f"Bot {bot_token}",
                 "Content-Type": "application/json"
-            }
+            },
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections or max_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=timeout or httpx.Timeout(30.0, connect=5.0)
+        )
+        self.rate_limiter = RateLimiter(
+            max_concurrency=max_concurrency,
+            global_rate=global_rate,
+            max_retries=max_retries
         )
+        self.metadata_cache = MetadataCache(cache_max_entries, cache_ttls)
 
     async def close(self):
         await self.client.aclose()
 
+    async def prewarm(self, connections: int = 2):
+        """
+        Open pooled connections ahead of the first tool calls, so their TLS
+        handshakes are not paid on the request path. HTTP/2 multiplexes over
+        one connection.
+        """
+        count = 1 if self.http2 else max(1, connections)
+        url = f"{self.base_url}/gateway"
+        results = await asyncio.gather(*(self.client.get(url) for _ in range(count)), return_exceptions=True)
+        failures = [result for result in results if isinstance(result, Exception)]
+        if failures:
+            logger.warning("⚠️ Pre-warming %d of %d connections failed: %s", len(failures), count, failures[0])
+        return count - len(failures)
+
     async def __aenter__(self):
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.close()
 
-    async def _get(self, endpoint: str, params: Optional[Dict] = None) -> Any:
+    async def _request(self, method: str, endpoint: str, **kwargs) -> httpx.Response:
+        """Send a request through the rate limiter and raise for the final status"""
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        response = await self.client.get(url, params=params)
+
+        async def send() -> httpx.Response:
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                record_upstream(method, endpoint, "error", time.perf_counter() - start)
+                raise
+            record_upstream(method, endpoint, str(response.status_code), time.perf_counter() - start)
+            return response
+
+        response = await self.rate_limiter.request(method, endpoint, send)
         response.raise_for_status()
+        return response
+
+    async def _get(self, endpoint: str, params: Optional[Dict] = None) -> Any:
+        response = await self._request("GET", endpoint, params=params)
         return response.json()
 
     async def _post(self, endpoint: str, data: Optional[Dict] = None) -> Any:
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
         kwargs = {"json": data} if data else {}
-        response = await self.client.post(url, **kwargs)
-        response.raise_for_status()
+        response = await self._request("POST", endpoint, **kwargs)
         return response.json() if response.content else {}
 
-    async def _delete(self, endpoint: str) -> Any:
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        response = await self.client.delete(url)
-        response.raise_for_status()
+    async def _delete(self, endpoint: str, headers: Optional[Dict[str, str]] = None) -> Any:
+        response = await self._request("DELETE", endpoint, headers=headers)
         return response.json() if response.content else {}
 
+    async def get_gateway_url(self) -> str:
+        """Websocket URL for the bot's gateway connection"""
+        return (await self._get("/gateway/bot"))["url"]
+
     async def get_bot_user(self) -> Dict[str, Any]:
-        return await self._get("/users/@me")
+        return await self.metadata_cache.get("bot_user", (), lambda: self._get("/users/@me"))
 
     async def get_channel_info(self, channel_id: str) -> Dict[str, Any]:
         """Get detailed information about a specific channel"""
-        return await self._get(f"/channels/{channel_id}")
+        return await self.metadata_cache.get(
+            "channel", (channel_id,), lambda: self._get(f"/channels/{channel_id}")
+        )
 
     async def send_message(self, channel_id: str, content: str) -> Dict[str, Any]:
         """Send a message to a channel"""
         return await self._post(f"/channels/{channel_id}/messages", {"content": content})
 
-    async def get_messages(self, channel_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get message history from a channel"""
-        params = {"limit": min(limit, 100)}  # Discord max is 100
+    async def get_messages(
+        self,
+        channel_id: str,
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        around: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Get one page of message history from a channel, optionally relative to a message id"""
+        params = {"limit": min(limit, PAGE_SIZE)}
+        # Discord honours only one cursor per request
+        if before:
+            params["before"] = before
+        elif after:
+            params["after"] = after
+        elif around:
+            params["around"] = around
         return await self._get(f"/channels/{channel_id}/messages", params)
 
-    async def search_messages(self, channel_id: str, query: str, limit: int = 25) -> Dict[str, Any]:
-        """Search messages in a channel with filters"""
-        params = {
-            "content": query,
-            "limit": min(limit, 25)  # Discord search max is 25
-        }
-        return await self._get(f"/channels/{channel_id}/messages/search", params)
+    async def iter_messages(
+        self,
+        channel_id: str,
+        limit: Optional[int] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        oldest_first: bool = False
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a channel's history between the before/after message ids
+        (exclusive), newest first unless oldest_first. Pages are fetched with
+        cursors, and the next page is requested while the current one is
+        being consumed.
+        """
+        if limit is not None and limit <= 0:
+            return
+        lower = int(after) if after else None
+        upper = int(before) if before else None
+        yielded = 0
+
+        def out_of_range(message_id: int) -> bool:
+            return (upper is not None and message_id >= upper) or (lower is not None and message_id <= lower)
+
+        def fetch(cursor: Optional[str], consumed: int) -> "asyncio.Future[List[Dict[str, Any]]]":
+            page_size = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit - consumed)
+            if oldest_first:
+                return asyncio.ensure_future(self.get_messages(channel_id, page_size, after=cursor or "0"))
+            return asyncio.ensure_future(self.get_messages(channel_id, page_size, before=cursor))
+
+        pending = fetch(after if oldest_first else before, 0)
+        try:
+            while pending is not None:
+                page = await pending
+                pending = None
+                page.sort(key=lambda message: int(message["id"]), reverse=not oldest_first)
+                requested = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit - yielded)
+                # A short page is the end of the history in this direction
+                if (
+                    page and len(page) >= requested
+                    and (limit is None or yielded + len(page) < limit)
+                    and not out_of_range(int(page[-1]["id"]))
+                ):
+                    pending = fetch(page[-1]["id"], yielded + len(page))
+                for message in page:
+                    if out_of_range(int(message["id"])):
+                        return
+                    yield message
+                    yielded += 1
+                    if limit is not None and yielded >= limit:
+                        return
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def iter_messages_multi(
+        self,
+        channel_ids: List[str],
+        max_parallel: int = 3,
+        **kwargs
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream history from several channels, reading at most max_parallel
+        channels at a time. Messages are yielded as they arrive, so channels
+        interleave; iter_messages options apply to each channel.
+        """
+        semaphore = asyncio.Semaphore(max(1, max_parallel))
+        queue: asyncio.Queue = asyncio.Queue(maxsize=PAGE_SIZE * max(1, max_parallel))
+        done = object()
+
+        async def read(channel_id: str):
+            try:
+                async with semaphore:
+                    async for message in self.iter_messages(channel_id, **kwargs):
+                        await queue.put(message)
+            except Exception as e:
+                await queue.put(e)
+            finally:
+                await queue.put(done)
+
+        readers = [asyncio.ensure_future(read(channel_id)) for channel_id in channel_ids]
+        try:
+            finished = 0
+            while finished < len(readers):
+                item = await queue.get()
+                if item is done:
+                    finished += 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for reader in readers:
+                reader.cancel()
 
     async def delete_message(self, channel_id: str, message_id: str) -> bool:
         """Delete a specific message"""
@@ -86,12 +287,14 @@ class DiscordClient:
 
     async def get_guild_member(self, guild_id: str, user_id: str) -> Dict[str, Any]:
         """Get information about a guild member"""
-        return await self._get(f"/guilds/{guild_id}/members/{user_id}")
+        return await self.metadata_cache.get(
+            "guild_member", (guild_id, user_id), lambda: self._get(f"/guilds/{guild_id}/members/{user_id}")
+        )
 
     async def remove_guild_member(self, guild_id: str, user_id: str, reason: Optional[str] = None) -> bool:
         """Remove a member from the guild (kick)"""
-        params = {"reason": reason} if reason else {}
-        await self._delete(f"/guilds/{guild_id}/members/{user_id}")
+        await self._delete(f"/guilds/{guild_id}/members/{user_id}", audit_log_headers(reason))
+        self.metadata_cache.invalidate("guild_member", guild_id, user_id)
         return True
 
     async def ban_guild_member(self, guild_id: str, user_id: str, reason: Optional[str] = None, delete_message_days: int = 0) -> Dict[str, Any]:
@@ -99,25 +302,51 @@ class DiscordClient:
         data = {
             "delete_message_days": delete_message_days
         }
-        if reason:
-            data["reason"] = reason
-        return await self._put(f"/guilds/{guild_id}/bans/{user_id}", data)
+        result = await self._put(f"/guilds/{guild_id}/bans/{user_id}", data, audit_log_headers(reason))
+        self.metadata_cache.invalidate("guild_member", guild_id, user_id)
+        return result
 
     async def unban_guild_member(self, guild_id: str, user_id: str) -> bool:
         """Unban a member from the guild"""
         await self._delete(f"/guilds/{guild_id}/bans/{user_id}")
         return True
 
-    async def _put(self, endpoint: str, data: Optional[Dict] = None) -> Any:
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        response = await self.client.put(url, json=data)
-        response.raise_for_status()
+    async def _put(self, endpoint: str, data: Optional[Dict] = None, headers: Optional[Dict[str, str]] = None) -> Any:
+        response = await self._request("PUT", endpoint, json=data, headers=headers)
         return response.json() if response.content else {}
 
+    def rate_limit_stats(self) -> Dict[str, Any]:
+        return self.rate_limiter.stats()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.metadata_cache.stats()
+
 def create_client_from_env() -> DiscordClient:
     bot_token = os.getenv("DISCORD_BOT_TOKEN")
     guild_id = os.getenv("DISCORD_GUILD_ID", "")  # Optional for some operations
     base_url = os.getenv("DISCORD_API_BASE_URL", "https://discord.com/api/v10")
     if not bot_token:
         raise ValueError("DISCORD_BOT_TOKEN environment variable is required")
-    return DiscordClient(bot_token=bot_token, base_url=base_url)
\ No newline at end of file
+    return DiscordClient(
+        bot_token=bot_token,
+        base_url=base_url,
+        max_concurrency=int(os.getenv("DISCORD_MAX_CONCURRENCY", 10)),
+        max_retries=int(os.getenv("DISCORD_MAX_RETRIES", 5)),
+        global_rate=float(os.getenv("DISCORD_GLOBAL_RATE_LIMIT", 50)),
+        cache_max_entries=int(os.getenv("CACHE_MAX_ENTRIES", 1000)),
+        cache_ttls={
+            "bot_user": float(os.getenv("CACHE_TTL_BOT_USER", 3600)),
+            "channel": float(os.getenv("CACHE_TTL_CHANNEL", 300)),
+            "guild_member": float(os.getenv("CACHE_TTL_GUILD_MEMBER", 60))
+        },
+        http2=os.getenv("DISCORD_HTTP2", "false").lower() == "true",
+        max_connections=int(os.getenv("DISCORD_MAX_CONNECTIONS", 0)) or None,
+        max_keepalive_connections=int(os.getenv("DISCORD_MAX_KEEPALIVE_CONNECTIONS", 0)) or None,
+        keepalive_expiry=float(os.getenv("DISCORD_KEEPALIVE_EXPIRY", 30)),
+        timeout=httpx.Timeout(
+            connect=float(os.getenv("DISCORD_CONNECT_TIMEOUT", 5)),
+            read=float(os.getenv("DISCORD_READ_TIMEOUT", 30)),
+            write=float(os.getenv("DISCORD_WRITE_TIMEOUT", 30)),
+            pool=float(os.getenv("DISCORD_POOL_TIMEOUT", 30))
+        )
+    )
\ No newline at end of file
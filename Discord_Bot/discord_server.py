@@ -6,15 +6,89 @@ with Discord via a bot.
 """
 
 import os
+import sys
+import logging
 import asyncio
 from typing import Dict, Any, Optional, List
 from fastmcp import FastMCP, Context
 from fastmcp.exceptions import ToolError
 from dotenv import load_dotenv
-from discord_client import DiscordClient, create_client_from_env
+from datetime import datetime
+from discord_client import DiscordClient, create_client_from_env, snowflake_from_time
+from message_store import MessageStore, MessageSyncer, default_store_path
+from moderation import BatchModerator
+from gateway import DEFAULT_INTENTS, GatewayListener
+import metrics
+from metrics import render_samples, track_tool
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Level for status messages, which are written to stderr
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Upper bound on messages get_messages returns per channel
+MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", 5000))
+# Channels read at the same time when get_messages is given several
+HISTORY_PARALLEL_CHANNELS = int(os.getenv("HISTORY_PARALLEL_CHANNELS", 3))
+
+# SQLite file holding synced messages and their full-text index
+MESSAGE_STORE_PATH = os.getenv("MESSAGE_STORE_PATH") or default_store_path()
+# Channels kept in sync from startup; search_messages adds any channel it is asked about
+SYNC_CHANNEL_IDS = [cid.strip() for cid in os.getenv("SYNC_CHANNEL_IDS", "").split(",") if cid.strip()]
+# Seconds between background syncs; 0 (the default) disables the background task
+SYNC_INTERVAL_SECONDS = float(os.getenv("SYNC_INTERVAL_SECONDS", 0))
+# Newest messages fetched the first time a channel is synced
+SYNC_BACKFILL_MESSAGES = int(os.getenv("SYNC_BACKFILL_MESSAGES", 1000))
+
+# Listen to gateway events to keep caches and the message store current without polling
+GATEWAY_ENABLED = os.getenv("DISCORD_GATEWAY_ENABLED", "false").lower() == "true"
+# Gateway websocket URL; defaults to the one returned by GET /gateway/bot
+GATEWAY_URL = os.getenv("DISCORD_GATEWAY_URL", "")
+# Gateway intents bitmask; the default needs the privileged MESSAGE_CONTENT intent
+GATEWAY_INTENTS = int(os.getenv("DISCORD_GATEWAY_INTENTS", DEFAULT_INTENTS))
+# Events kept for the discord://events/recent resource
+GATEWAY_RECENT_EVENTS = int(os.getenv("GATEWAY_RECENT_EVENTS", 500))
+# Cache TTL for objects received from the gateway, which keeps them up to date while connected
+GATEWAY_CACHE_TTL_SECONDS = float(os.getenv("GATEWAY_CACHE_TTL_SECONDS", 86400))
+
+# Connections opened to Discord at startup, before the first tool call
+PREWARM_CONNECTIONS = int(os.getenv("DISCORD_PREWARM_CONNECTIONS", 2))
+
+# Port for a Prometheus text endpoint at /metrics; 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Moderation requests a batch runs at the same time
+MODERATION_CONCURRENCY = int(os.getenv("MODERATION_CONCURRENCY", 5))
+
+# Fields get_messages can project a message onto
+MESSAGE_FIELDS = {
+    "id": lambda msg: msg["id"],
+    "channel_id": lambda msg: msg.get("channel_id"),
+    "content": lambda msg: msg["content"],
+    "author": lambda msg: msg["author"]["username"],
+    "author_id": lambda msg: msg["author"]["id"],
+    "timestamp": lambda msg: msg["timestamp"],
+    "edited_timestamp": lambda msg: msg.get("edited_timestamp"),
+    "attachments": lambda msg: msg.get("attachments", []),
+    "embeds": lambda msg: msg.get("embeds", []),
+    "mentions": lambda msg: [user["id"] for user in msg.get("mentions", [])],
+    "reactions": lambda msg: msg.get("reactions", []),
+    "pinned": lambda msg: msg.get("pinned", False),
+    "reply_to": lambda msg: (msg.get("message_reference") or {}).get("message_id")
+}
+DEFAULT_MESSAGE_FIELDS = [
+    "id", "content", "author", "author_id", "timestamp", "edited_timestamp", "attachments", "embeds"
+]
+
+def parse_time(value: str, name: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ToolError(f"{name} must be an ISO 8601 timestamp, got '{value}'")
+
 mcp = FastMCP(
     name="Discord MCP Server",
     instructions="""
@@ -22,14 +96,25 @@ mcp = FastMCP(
     Use get_bot_info to retrieve the bot's user information.
     Use get_channel_info to fetch channel metadata by channel ID.
     Use send_message to send messages to channels.
-    Use get_messages to retrieve message history.
-    Use search_messages to search messages with filters.
+    Use get_messages to retrieve message history, with time ranges, field projection and several channels at once.
+    Use search_messages for full-text search with filters over locally synced messages.
     Use moderate_content for message deletion and user management.
+    Use moderate_batch to delete many messages or kick/ban/unban many users in one call.
+    Read discord://cache/stats for metadata cache hit rates.
+    Read discord://events/recent for recent gateway events (new, edited and deleted messages, channel changes).
+    Read discord://metrics for tool and Discord API latency, upstream calls, retries, 429s and cache hits.
     """
 )
 
 # Global client management
 _discord_client: Optional[DiscordClient] = None
+# One client (and one connection pool) per process, however many tools ask for it at once
+_client_lock = asyncio.Lock()
+_message_store: Optional[MessageStore] = None
+_syncer: Optional[MessageSyncer] = None
+_syncer_lock = asyncio.Lock()
+_moderator: Optional[BatchModerator] = None
+_gateway: Optional[GatewayListener] = None
 
 def get_client() -> DiscordClient:
     if _discord_client is None:
@@ -39,11 +124,46 @@ def get_client() -> DiscordClient:
 async def ensure_client_initialized():
     """Ensure the Discord client is initialized"""
     global _discord_client
-    if _discord_client is None:
-        _discord_client = create_client_from_env()
-        print("[DEBUG] Discord client initialized successfully")
+    if _discord_client is not None:
+        return
+    async with _client_lock:
+        if _discord_client is None:
+            _discord_client = create_client_from_env()
+            logger.debug("Discord client initialized successfully")
+
+async def get_syncer() -> MessageSyncer:
+    """Open the message store on first use and sync the configured channels"""
+    global _message_store, _syncer
+    if _syncer is not None:
+        return _syncer
+    async with _syncer_lock:
+        if _syncer is None:
+            store = await MessageStore.open(MESSAGE_STORE_PATH)
+            syncer = await MessageSyncer.create(get_client(), store, SYNC_BACKFILL_MESSAGES)
+            syncer.channels.update(SYNC_CHANNEL_IDS)
+            syncer.gateway_connected = lambda: _gateway is not None and _gateway.connected
+            _message_store, _syncer = store, syncer
+    return _syncer
+
+def get_moderator() -> BatchModerator:
+    global _moderator
+    if _moderator is None:
+        _moderator = BatchModerator(get_client(), MODERATION_CONCURRENCY)
+    return _moderator
+
+def summarize_batch(action: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    succeeded = sum(1 for result in results if result["success"])
+    return {
+        "action": action,
+        "success": succeeded == len(results),
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
 
 @mcp.tool
+@track_tool
 async def get_bot_info(ctx: Context = None) -> Dict[str, Any]:
     """
     Get information about the Discord bot.
@@ -65,6 +185,7 @@ async def get_bot_info(ctx: Context = None) -> Dict[str, Any]:
         raise ToolError(error_msg)
 
 @mcp.tool
+@track_tool
 async def get_channel_info(channel_id: str, ctx: Context = None) -> Dict[str, Any]:
     """
     Get detailed information about a specific Discord channel.
@@ -92,6 +213,7 @@ async def get_channel_info(channel_id: str, ctx: Context = None) -> Dict[str, An
         raise ToolError(error_msg)
 
 @mcp.tool
+@track_tool
 async def send_message(channel_id: str, content: str, ctx: Context = None) -> Dict[str, Any]:
     """
     Send a message to a Discord channel.
@@ -125,38 +247,63 @@ async def send_message(channel_id: str, content: str, ctx: Context = None) -> Di
         raise ToolError(error_msg)
 
 @mcp.tool
-async def get_messages(channel_id: str, limit: int = 50, ctx: Context = None) -> List[Dict[str, Any]]:
+@track_tool
+async def get_messages(
+    channel_id: str,
+    limit: int = 50,
+    since: str = None,
+    until: str = None,
+    fields: List[str] = None,
+    oldest_first: bool = False,
+    ctx: Context = None
+) -> List[Dict[str, Any]]:
     """
-    Retrieve message history from a Discord channel.
+    Retrieve message history from one or more Discord channels.
     
     Args:
-        channel_id: The Discord channel ID to get messages from
-        limit: Maximum number of messages to retrieve (max 100)
+        channel_id: The Discord channel ID, or a comma-separated list of channel IDs
+        limit: Maximum number of messages to retrieve per channel (pages through history beyond 100)
+        since: Only messages at or after this ISO 8601 time
+        until: Only messages before this ISO 8601 time
+        fields: Message fields to return (id, channel_id, content, author, author_id, timestamp,
+            edited_timestamp, attachments, embeds, mentions, reactions, pinned, reply_to)
+        oldest_first: Return messages in chronological order instead of newest first
     
     Returns:
-        List of messages with their content and metadata
+        List of messages with the requested fields
     """
+    channel_ids = [cid.strip() for cid in channel_id.split(",") if cid.strip()]
     if ctx:
-        await ctx.info(f"Fetching {limit} messages from channel {channel_id}")
+        await ctx.info(f"Fetching up to {limit} messages from {len(channel_ids)} channel(s): {channel_id}")
     try:
+        if fields:
+            unknown = [field for field in fields if field not in MESSAGE_FIELDS]
+            if unknown:
+                raise ToolError(f"Unknown message fields: {', '.join(unknown)}")
+        else:
+            fields = DEFAULT_MESSAGE_FIELDS + (["channel_id"] if len(channel_ids) > 1 else [])
+        options = {
+            "limit": min(limit, MAX_HISTORY_MESSAGES),
+            "oldest_first": oldest_first,
+            # Cursors are exclusive; the first snowflake of `since` must be included
+            "after": str(snowflake_from_time(parse_time(since, "since")) - 1) if since else None,
+            "before": str(snowflake_from_time(parse_time(until, "until"))) if until else None
+        }
+
         await ensure_client_initialized()
         client = get_client()
-        messages = await client.get_messages(channel_id, limit)
-        if ctx:
-            await ctx.info(f"Retrieved {len(messages)} messages")
-        return [
-            {
-                "id": msg["id"],
-                "content": msg["content"],
-                "author": msg["author"]["username"],
-                "author_id": msg["author"]["id"],
-                "timestamp": msg["timestamp"],
-                "edited_timestamp": msg.get("edited_timestamp"),
-                "attachments": msg.get("attachments", []),
-                "embeds": msg.get("embeds", [])
-            }
-            for msg in messages
+        if len(channel_ids) > 1:
+            messages = client.iter_messages_multi(channel_ids, HISTORY_PARALLEL_CHANNELS, **options)
+        else:
+            messages = client.iter_messages(channel_ids[0], **options)
+        # Project while streaming so full message objects are not kept around
+        projected = [
+            {field: MESSAGE_FIELDS[field](msg) for field in fields}
+            async for msg in messages
         ]
+        if ctx:
+            await ctx.info(f"Retrieved {len(projected)} messages")
+        return projected
     except Exception as e:
         error_msg = f"Failed to get messages from channel '{channel_id}': {str(e)}"
         if ctx:
@@ -164,27 +311,65 @@ async def get_messages(channel_id: str, limit: int = 50, ctx: Context = None) ->
         raise ToolError(error_msg)
 
 @mcp.tool
-async def search_messages(channel_id: str, query: str, limit: int = 25, ctx: Context = None) -> Dict[str, Any]:
+@track_tool
+async def search_messages(
+    channel_id: str,
+    query: str,
+    limit: int = 25,
+    author_id: str = None,
+    author: str = None,
+    since: str = None,
+    until: str = None,
+    has_attachments: bool = None,
+    has_embeds: bool = None,
+    pinned: bool = None,
+    mentions: str = None,
+    offset: int = 0,
+    refresh: bool = False,
+    ctx: Context = None
+) -> Dict[str, Any]:
     """
-    Search messages in a Discord channel with filters.
+    Search messages in Discord channels with filters, from the local message store.
     
     Args:
-        channel_id: The Discord channel ID to search in
-        query: The search query to filter messages
-        limit: Maximum number of search results (max 25)
+        channel_id: The Discord channel ID, a comma-separated list, or empty for every synced channel
+        query: Words that must all appear in the message (end a word with * for prefix match); empty matches all
+        limit: Maximum number of search results
+        author_id: Only messages by this user ID
+        author: Only messages by this username
+        since: Only messages at or after this ISO 8601 time
+        until: Only messages before this ISO 8601 time
+        has_attachments: Only messages with (true) or without (false) attachments
+        has_embeds: Only messages with (true) or without (false) embeds
+        pinned: Only pinned (true) or unpinned (false) messages
+        mentions: Only messages mentioning this user ID
+        offset: Number of results to skip, for paging
+        refresh: Fetch new messages for the channels before searching
     
     Returns:
-        Search results with matching messages
+        Search results with matching messages, best match first (newest first without a query)
     """
+    channel_ids = [cid.strip() for cid in channel_id.split(",") if cid.strip()]
     if ctx:
-        await ctx.info(f"Searching for '{query}' in channel {channel_id}")
+        await ctx.info(f"Searching for '{query}' in channel {channel_id or 'all synced channels'}")
     try:
+        since_time = parse_time(since, "since") if since else None
+        until_time = parse_time(until, "until") if until else None
+
         await ensure_client_initialized()
-        client = get_client()
-        results = await client.search_messages(channel_id, query, limit)
+        syncer = await get_syncer()
+        store = syncer.store
+        # Channels never synced are fetched now; known ones are kept fresh by the background sync
+        for cid in channel_ids:
+            if refresh or not await store.run(store.is_synced, cid):
+                await syncer.sync_channel(cid)
+        results = await store.run(
+            store.search, query, channel_ids, author_id, author, since_time, until_time,
+            has_attachments, has_embeds, pinned, mentions, limit, offset
+        )
         if ctx:
-            await ctx.info(f"Search completed with {len(results.get('results', []))} results")
-        return results
+            await ctx.info(f"Search completed with {len(results)} results")
+        return {"query": query, "channel_ids": channel_ids, "results": results}
     except Exception as e:
         error_msg = f"Failed to search messages in channel '{channel_id}': {str(e)}"
         if ctx:
@@ -192,6 +377,7 @@ async def search_messages(channel_id: str, query: str, limit: int = 25, ctx: Con
         raise ToolError(error_msg)
 
 @mcp.tool
+@track_tool
 async def moderate_content(
     action: str,
     channel_id: str = None,
@@ -225,15 +411,19 @@ async def moderate_content(
             if not channel_id or not message_id:
                 raise ToolError("channel_id and message_id are required for delete_message action")
             await client.delete_message(channel_id, message_id)
+            if _message_store:
+                await _message_store.run(_message_store.delete_messages, [message_id])
             result = {"action": "delete_message", "success": True, "message_id": message_id}
             
         elif action == "delete_messages_bulk":
             if not channel_id or not message_id:
                 raise ToolError("channel_id and message_id are required for delete_messages_bulk action")
             # For bulk delete, message_id should be a comma-separated list
-            message_ids = [msg_id.strip() for msg_id in message_id.split(",")]
-            await client.delete_messages_bulk(channel_id, message_ids)
-            result = {"action": "delete_messages_bulk", "success": True, "message_ids": message_ids}
+            message_ids = [msg_id.strip() for msg_id in message_id.split(",") if msg_id.strip()]
+            results = await get_moderator().delete_messages(channel_id, message_ids)
+            if _message_store:
+                await _message_store.run(_message_store.delete_messages, [r["message_id"] for r in results if r["success"]])
+            result = {**summarize_batch("delete_messages_bulk", results), "message_ids": message_ids}
             
         elif action == "kick_user":
             if not guild_id or not user_id:
@@ -266,30 +456,235 @@ async def moderate_content(
             await ctx.error(error_msg)
         raise ToolError(error_msg)
 
+@mcp.tool
+@track_tool
+async def moderate_batch(
+    action: str,
+    targets: List[str],
+    channel_id: str = None,
+    guild_id: str = None,
+    reason: str = None,
+    ctx: Context = None
+) -> Dict[str, Any]:
+    """
+    Apply one moderation action to many messages or users at once.
+    
+    Args:
+        action: The moderation action ('delete_messages', 'kick_users', 'ban_users', 'unban_users')
+        targets: Message IDs for delete_messages, user IDs for the user actions
+        channel_id: The Discord channel ID (required for delete_messages)
+        guild_id: The guild/server ID (required for user actions)
+        reason: Optional reason for kicks and bans
+    
+    Returns:
+        Counts of succeeded and failed items, and a result for each target
+    """
+    targets = [target.strip() for target in targets if target and target.strip()]
+    if ctx:
+        await ctx.info(f"Performing batch moderation action {action} on {len(targets)} targets")
+    try:
+        await ensure_client_initialized()
+        moderator = get_moderator()
+
+        if action == "delete_messages":
+            if not channel_id:
+                raise ToolError("channel_id is required for delete_messages action")
+            results = await moderator.delete_messages(channel_id, targets)
+            if _message_store:
+                await _message_store.run(_message_store.delete_messages, [r["message_id"] for r in results if r["success"]])
+        elif action in ("kick_users", "ban_users", "unban_users"):
+            if not guild_id:
+                raise ToolError(f"guild_id is required for {action} action")
+            if action == "kick_users":
+                results = await moderator.kick_users(guild_id, targets, reason)
+            elif action == "ban_users":
+                results = await moderator.ban_users(guild_id, targets, reason)
+            else:
+                results = await moderator.unban_users(guild_id, targets)
+        else:
+            raise ToolError(f"Unknown batch moderation action: {action}")
+
+        summary = summarize_batch(action, results)
+        if ctx:
+            await ctx.info(f"Batch action '{action}': {summary['succeeded']} succeeded, {summary['failed']} failed")
+        return summary
+    except Exception as e:
+        error_msg = f"Failed to perform batch moderation action '{action}': {str(e)}"
+        if ctx:
+            await ctx.error(error_msg)
+        raise ToolError(error_msg)
+
+@mcp.resource("discord://cache/stats", mime_type="application/json")
+async def cache_stats() -> Dict[str, Any]:
+    """Hit rates, entry counts and TTLs of the bot user, channel and guild member cache"""
+    await ensure_client_initialized()
+    return get_client().cache_stats()
+
+@mcp.resource("discord://events/recent", mime_type="application/json")
+async def recent_events() -> Dict[str, Any]:
+    """Most recent gateway events, oldest first, with the gateway connection state"""
+    if _gateway is None:
+        return {"gateway": {"enabled": False}, "events": []}
+    return {"gateway": {"enabled": True, **_gateway.stats()}, "events": _gateway.recent_events(GATEWAY_RECENT_EVENTS)}
+
+@mcp.resource("discord://metrics", mime_type="application/json")
+async def metrics_resource() -> Dict[str, Any]:
+    """Per-tool and per-route latency percentiles, upstream calls per tool call, rate limit and cache counters"""
+    snapshot = metrics.snapshot()
+    if _discord_client is not None:
+        snapshot["rate_limiter"] = _discord_client.rate_limit_stats()
+        snapshot["cache"] = _discord_client.cache_stats()
+    if _gateway is not None:
+        snapshot["gateway"] = _gateway.stats()
+    return snapshot
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text format"""
+    extra = []
+    if _discord_client is not None:
+        limiter = _discord_client.rate_limit_stats()
+        extra += render_samples(
+            "discord_api_rate_limiter_events_total", "Requests sent, 429s received and retries made by the rate limiter",
+            "counter", [({"event": event}, limiter[event]) for event in ("requests", "rate_limited", "global_rate_limited", "retries")]
+        )
+        cache = _discord_client.cache_stats()
+        extra += render_samples(
+            "discord_metadata_cache_lookups_total", "Metadata cache lookups by type and result", "counter",
+            [
+                ({"type": kind, "result": result}, counters[result])
+                for kind, counters in cache["types"].items()
+                for result in ("hits", "misses", "coalesced")
+            ]
+        )
+        extra += render_samples(
+            "discord_metadata_cache_entries", "Entries in the metadata cache", "gauge", [({}, cache["entries"])]
+        )
+    if _gateway is not None:
+        extra += render_samples(
+            "discord_gateway_events_total", "Gateway dispatch events received", "counter", [({}, _gateway.events_received)]
+        )
+    return metrics.render_prometheus(extra)
+
+async def start_metrics_server() -> Optional[asyncio.AbstractServer]:
+    """Serve render_metrics() over plain HTTP for Prometheus scrapes"""
+    if METRICS_PORT <= 0:
+        return None
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            path = request_line.decode(errors="replace").split(" ")[1] if request_line.count(b" ") >= 2 else ""
+            if path.split("?")[0] == "/metrics":
+                status, body = "200 OK", render_metrics().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, METRICS_HOST, METRICS_PORT)
+    logger.info("📈 Prometheus metrics at http://%s:%d/metrics", METRICS_HOST, METRICS_PORT)
+    return server
+
+async def apply_gateway_event(event_type: str, data: Dict[str, Any]):
+    """Update the metadata cache and message store from one gateway event"""
+    cache = get_client().metadata_cache
+    if event_type == "READY":
+        cache.set("bot_user", (), data["user"], GATEWAY_CACHE_TTL_SECONDS)
+        if _syncer:
+            _syncer.reset_live()
+    elif event_type == "GUILD_CREATE":
+        for channel in data.get("channels", []) + data.get("threads", []):
+            cache.set("channel", (channel["id"],), {**channel, "guild_id": data["id"]}, GATEWAY_CACHE_TTL_SECONDS)
+    elif event_type in ("CHANNEL_CREATE", "CHANNEL_UPDATE", "THREAD_CREATE", "THREAD_UPDATE"):
+        cache.set("channel", (data["id"],), data, GATEWAY_CACHE_TTL_SECONDS)
+    elif event_type in ("CHANNEL_DELETE", "THREAD_DELETE"):
+        cache.invalidate("channel", data["id"])
+    elif event_type == "GUILD_DELETE":
+        cache.invalidate("channel")
+    elif event_type in ("GUILD_MEMBER_UPDATE", "GUILD_MEMBER_REMOVE", "GUILD_BAN_ADD"):
+        cache.invalidate("guild_member", data["guild_id"], data["user"]["id"])
+    elif event_type.startswith("MESSAGE_"):
+        # Message events only feed the store, which stays closed until something uses it
+        if _syncer is None and not SYNC_CHANNEL_IDS:
+            return
+        syncer = await get_syncer()
+        store = syncer.store
+        if event_type == "MESSAGE_CREATE":
+            await syncer.apply_message(data)
+        elif event_type == "MESSAGE_UPDATE":
+            await store.run(store.update_message, data)
+        elif event_type == "MESSAGE_DELETE":
+            await store.run(store.delete_messages, [data["id"]])
+        elif event_type == "MESSAGE_DELETE_BULK":
+            await store.run(store.delete_messages, data["ids"])
+
+def start_gateway() -> Optional[asyncio.Task]:
+    global _gateway
+    if not GATEWAY_ENABLED:
+        return None
+    client = get_client()
+
+    async def gateway_url() -> str:
+        return GATEWAY_URL or await client.get_gateway_url()
+
+    _gateway = GatewayListener(client.bot_token, gateway_url, GATEWAY_INTENTS, GATEWAY_RECENT_EVENTS)
+    _gateway.add_handler(apply_gateway_event)
+    logger.info("🔌 Connecting to the Discord gateway")
+    return asyncio.create_task(_gateway.run())
+
 # Server lifecycle
 async def initialize_client():
-    global _discord_client
     try:
-        _discord_client = create_client_from_env()
-        print(f"✅ Discord client initialized.")
+        await ensure_client_initialized()
+        logger.info("✅ Discord client initialized.")
     except Exception as e:
-        print(f"❌ Failed to initialize Discord client: {e}")
+        logger.error("❌ Failed to initialize Discord client: %s", e)
         raise
+    if PREWARM_CONNECTIONS > 0:
+        warmed = await get_client().prewarm(PREWARM_CONNECTIONS)
+        logger.info("✅ Pre-warmed %d connection(s) to Discord", warmed)
 
 async def cleanup_client():
     global _discord_client
     if _discord_client:
         await _discord_client.close()
-        print("✅ Discord client closed")
+        logger.info("✅ Discord client closed")
+    if _message_store:
+        _message_store.close()
+
+async def start_background_sync() -> Optional[asyncio.Task]:
+    if SYNC_INTERVAL_SECONDS <= 0:
+        return None
+    syncer = await get_syncer()
+    logger.info("🔄 Syncing %d channel(s) every %gs into %s", len(syncer.channels), SYNC_INTERVAL_SECONDS, MESSAGE_STORE_PATH)
+    return asyncio.create_task(syncer.run(SYNC_INTERVAL_SECONDS))
 
 def main():
+    # stdout carries the MCP protocol over stdio, so status messages go to stderr
+    logging.basicConfig(level=LOG_LEVEL, stream=sys.stderr, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
     async def run_server():
         await initialize_client()
+        sync_task = await start_background_sync()
+        gateway_task = start_gateway()
+        metrics_server = await start_metrics_server()
         try:
-            print("🚀 Starting Discord MCP Server...")
-            print("📡 Server will be available for MCP connections")
+            logger.info("🚀 Starting Discord MCP Server...")
+            logger.info("📡 Server will be available for MCP connections")
             await mcp.run_async()
         finally:
+            for task in (sync_task, gateway_task):
+                if task:
+                    task.cancel()
+            if metrics_server:
+                metrics_server.close()
             await cleanup_client()
     asyncio.run(run_server())
 
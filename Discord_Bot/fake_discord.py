@@ -0,0 +1,303 @@
+"""
+Fake Discord API
+
+Small in-memory stand-in for the Discord REST API, used by the load test. It
+serves the routes DiscordClient calls over HTTP/1.1 keep-alive, adds a
+configurable latency, and enforces per-route and global rate limits with the
+same headers and 429 bodies Discord sends, so retries and rate limit
+handling are exercised too.
+
+    python fake_discord.py --port 8765 --latency 0.02
+"""
+
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from discord_client import snowflake_from_time, snowflake_time
+
+API_PREFIX = "/api/v10"
+BOT_USER = {"id": "100000000000000001", "username": "load-test-bot", "discriminator": "0", "bot": True}
+
+ROUTES: List[Tuple[str, "re.Pattern[str]", str]] = [
+    (method, re.compile(f"^{pattern}$"), handler)
+    for method, pattern, handler in (
+        ("GET", r"/gateway(/bot)?", "gateway"),
+        ("GET", r"/users/@me", "bot_user"),
+        ("GET", r"/channels/(\d+)", "channel"),
+        ("GET", r"/channels/(\d+)/messages", "list_messages"),
+        ("POST", r"/channels/(\d+)/messages", "create_message"),
+        ("POST", r"/channels/(\d+)/messages/bulk-delete", "bulk_delete"),
+        ("DELETE", r"/channels/(\d+)/messages/(\d+)", "delete_message"),
+        ("GET", r"/guilds/(\d+)/members/(\d+)", "member"),
+        ("DELETE", r"/guilds/(\d+)/members/(\d+)", "no_content"),
+        ("PUT", r"/guilds/(\d+)/bans/(\d+)", "no_content"),
+        ("DELETE", r"/guilds/(\d+)/bans/(\d+)", "no_content")
+    )
+]
+
+
+class FakeDiscordAPI:
+    """In-memory channels and messages behind Discord-style rate limits"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        channels: int = 5,
+        messages_per_channel: int = 1000,
+        latency: float = 0.02,
+        jitter: float = 0.01,
+        route_limit: int = 50,
+        route_window: float = 1.0,
+        global_rate: int = 500,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.route_limit = route_limit
+        self.route_window = route_window
+        self.global_rate = global_rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.channel_ids = [str(200000000000000000 + i) for i in range(channels)]
+        self.guild_id = "300000000000000000"
+        # Messages per channel, oldest first, spread over the last 30 days
+        self.messages: Dict[str, List[Dict[str, Any]]] = {}
+        now_ms = time.time() * 1000
+        for channel_id in self.channel_ids:
+            self.messages[channel_id] = [
+                self._message(channel_id, int(now_ms - (messages_per_channel - i) * 30 * 86400 * 1000 / messages_per_channel), i)
+                for i in range(messages_per_channel)
+            ]
+        self._windows: Dict[str, Tuple[float, int]] = {}
+        self._global_window: Tuple[float, int] = (0.0, 0)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+
+    def _message(self, channel_id: str, timestamp_ms: int, index: int) -> Dict[str, Any]:
+        created = datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc)
+        words = ["deploy", "release", "bug", "review", "meeting", "lunch", "incident", "roadmap", "test", "docs"]
+        return {
+            # Keep ids unique when several messages share a millisecond
+            "id": str(snowflake_from_time(created) + index % 4096),
+            "channel_id": channel_id,
+            "author": {"id": str(400000000000000000 + index % 20), "username": f"user{index % 20}"},
+            "content": " ".join(self.random.choice(words) for _ in range(6)),
+            "timestamp": created.isoformat(),
+            "edited_timestamp": None,
+            "attachments": [],
+            "embeds": [],
+            "mentions": [],
+            "pinned": False
+        }
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}{API_PREFIX}"
+
+    async def start(self) -> "FakeDiscordAPI":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    return
+                method, target, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode().strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, payload, extra_headers = await self.respond(method, target, json.loads(body) if body else None)
+                data = b"" if payload is None else json.dumps(payload).encode()
+                head = [f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}", f"Content-Length: {len(data)}"]
+                if payload is not None:
+                    head.append("Content-Type: application/json")
+                head += [f"{name}: {value}" for name, value in extra_headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _rate_limit(self, bucket: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, str]]:
+        """Count a request against the global and route windows; returns a 429 body when over either"""
+        now = time.monotonic()
+        started, used = self._global_window
+        if now - started >= 1.0:
+            started, used = now, 0
+        if used >= self.global_rate:
+            retry_after = 1.0 - (now - started)
+            return (
+                {"message": "You are being rate limited.", "retry_after": retry_after, "global": True},
+                {"X-RateLimit-Global": "true", "X-RateLimit-Scope": "global", "Retry-After": f"{retry_after:.3f}"}
+            )
+        self._global_window = (started, used + 1)
+
+        started, used = self._windows.get(bucket, (now, 0))
+        if now - started >= self.route_window:
+            started, used = now, 0
+        reset_after = self.route_window - (now - started)
+        headers = {
+            "X-RateLimit-Bucket": f"fake{abs(hash(bucket.split(':')[0])) % 10**8}",
+            "X-RateLimit-Limit": str(self.route_limit),
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}"
+        }
+        if used >= self.route_limit:
+            headers.update({"X-RateLimit-Remaining": "0", "X-RateLimit-Scope": "user"})
+            return {"message": "You are being rate limited.", "retry_after": reset_after, "global": False}, headers
+        self._windows[bucket] = (started, used + 1)
+        headers["X-RateLimit-Remaining"] = str(self.route_limit - used - 1)
+        return None, headers
+
+    async def respond(self, method: str, target: str, body: Any) -> Tuple[int, Any, Dict[str, str]]:
+        self.requests += 1
+        path, _, query = target.partition("?")
+        params = dict(pair.partition("=")[::2] for pair in query.split("&") if pair)
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        if not path.startswith(API_PREFIX):
+            return 404, {"message": "404: Not Found", "code": 0}, {}
+        path = path[len(API_PREFIX):]
+
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.match(path)
+            if route_method == method and match:
+                break
+        else:
+            return 404, {"message": "404: Not Found", "code": 0}, {}
+
+        # Buckets are per route and per major parameter, as on Discord
+        major = match.group(1) if match.groups() and handler != "gateway" else ""
+        limited, headers = self._rate_limit(f"{method} {pattern.pattern}:{major}")
+        if limited is not None:
+            self.rate_limited += 1
+            return 429, limited, headers
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return 503, {"message": "Service Unavailable", "code": 0}, headers
+        status, payload = getattr(self, f"_{handler}")(*match.groups(), params=params, body=body)
+        return status, payload, headers
+
+    def _gateway(self, *_, **__):
+        return 200, {"url": "ws://127.0.0.1:1", "shards": 1}
+
+    def _bot_user(self, **_):
+        return 200, BOT_USER
+
+    def _channel(self, channel_id: str, **_):
+        if channel_id not in self.messages:
+            return 404, {"message": "Unknown Channel", "code": 10003}
+        return 200, {"id": channel_id, "type": 0, "guild_id": self.guild_id, "name": f"channel-{channel_id[-2:]}"}
+
+    def _list_messages(self, channel_id: str, params: Dict[str, str], **_):
+        if channel_id not in self.messages:
+            return 404, {"message": "Unknown Channel", "code": 10003}
+        limit = min(max(int(params.get("limit", 50)), 1), 100)
+        history = self.messages[channel_id]
+        if "after" in params:
+            after = int(params["after"])
+            page = [m for m in history if int(m["id"]) > after][:limit]
+        else:
+            before = int(params.get("before", 1 << 63))
+            page = [m for m in history if int(m["id"]) < before][-limit:]
+        # Discord returns newest first
+        return 200, page[::-1]
+
+    def _create_message(self, channel_id: str, body: Dict[str, Any], **_):
+        if channel_id not in self.messages:
+            return 404, {"message": "Unknown Channel", "code": 10003}
+        history = self.messages[channel_id]
+        message = self._message(channel_id, int(time.time() * 1000), len(history))
+        message.update(content=body.get("content", ""), author=BOT_USER)
+        # Keep ids increasing even when the clock has not moved
+        if history and int(message["id"]) <= int(history[-1]["id"]):
+            message["id"] = str(int(history[-1]["id"]) + 1)
+        history.append(message)
+        return 200, message
+
+    def _delete_message(self, channel_id: str, message_id: str, **_):
+        history = self.messages.get(channel_id, [])
+        for i, message in enumerate(history):
+            if message["id"] == message_id:
+                del history[i]
+                return 204, None
+        return 404, {"message": "Unknown Message", "code": 10008}
+
+    def _bulk_delete(self, channel_id: str, body: Dict[str, Any], **_):
+        ids = set(body.get("messages", []))
+        if not 2 <= len(ids) <= 100:
+            return 400, {"message": "Invalid Form Body", "code": 50035}
+        oldest_allowed = datetime.now(timezone.utc) - timedelta(days=14)
+        if any(snowflake_time(message_id) < oldest_allowed for message_id in ids):
+            return 400, {"message": "You can only bulk delete messages that are under 14 days old.", "code": 50034}
+        history = self.messages.get(channel_id, [])
+        self.messages[channel_id] = [message for message in history if message["id"] not in ids]
+        return 204, None
+
+    def _member(self, guild_id: str, user_id: str, **_):
+        return 200, {"user": {"id": user_id, "username": f"user{int(user_id) % 20}"}, "roles": [], "joined_at": None}
+
+    def _no_content(self, *_, **__):
+        return 204, None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "rate_limited": self.rate_limited, "injected_errors": self.errors}
+
+
+async def serve(args: argparse.Namespace):
+    api = await FakeDiscordAPI(
+        args.host, args.port, args.channels, args.messages, args.latency, args.jitter,
+        args.route_limit, args.route_window, args.global_rate, args.error_rate
+    ).start()
+    print(f"✅ Fake Discord API at {api.base_url} (channels: {', '.join(api.channel_ids)})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--channels", type=int, default=5, help="number of fake channels")
+    parser.add_argument("--messages", type=int, default=1000, help="messages of history per channel")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.01, help="random +/- seconds on top of the latency")
+    parser.add_argument("--route-limit", type=int, default=50, help="requests per route bucket and window")
+    parser.add_argument("--route-window", type=float, default=1.0, help="route bucket window in seconds")
+    parser.add_argument("--global-rate", type=int, default=500, help="requests per second across all routes")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Discord REST API for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,207 @@
+"""
+Discord Gateway Listener
+
+Minimal Gateway (websocket) client that runs next to the MCP server and
+hands every dispatch event to registered handlers, so local state is updated
+as events happen instead of by polling the REST API. It keeps a heartbeat,
+resumes dropped sessions, and remembers a bounded buffer of recent events.
+"""
+
+import json
+import logging
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+# Gateway opcodes
+DISPATCH = 0
+HEARTBEAT = 1
+IDENTIFY = 2
+RESUME = 6
+RECONNECT = 7
+INVALID_SESSION = 9
+HELLO = 10
+HEARTBEAT_ACK = 11
+
+# GUILDS | GUILD_MESSAGES | MESSAGE_CONTENT (privileged, enable it in the developer portal)
+DEFAULT_INTENTS = (1 << 0) | (1 << 9) | (1 << 15)
+
+# Close codes after which reconnecting cannot succeed (bad token, intents, shard or version)
+FATAL_CLOSE_CODES = (4004, 4010, 4011, 4012, 4013, 4014)
+
+EventHandler = Callable[[str, Dict[str, Any]], Optional[Awaitable[None]]]
+
+
+def summarize_event(event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact view of an event for the recent-events buffer"""
+    summary: Dict[str, Any] = {"type": event_type}
+    for field in ("guild_id", "channel_id"):
+        if data.get(field):
+            summary[field] = data[field]
+    if event_type.startswith("MESSAGE_"):
+        if "ids" in data:
+            summary["message_ids"] = data["ids"]
+        elif "id" in data:
+            summary["message_id"] = data["id"]
+        if data.get("author"):
+            summary["author"] = data["author"].get("username")
+            summary["author_id"] = data["author"].get("id")
+        if "content" in data:
+            summary["content"] = data["content"]
+    elif event_type.startswith(("CHANNEL_", "GUILD_")) and "id" in data:
+        summary["id"] = data["id"]
+        if "name" in data:
+            summary["name"] = data["name"]
+    return summary
+
+
+class GatewayListener:
+    """Connects to the gateway, keeps the session alive and dispatches events to handlers"""
+
+    def __init__(
+        self,
+        token: str,
+        get_url: Callable[[], Awaitable[str]],
+        intents: int = DEFAULT_INTENTS,
+        max_recent_events: int = 500
+    ):
+        self.token = token
+        self.get_url = get_url
+        self.intents = intents
+        self.handlers: List[EventHandler] = []
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=max_recent_events)
+        self.session_id: Optional[str] = None
+        self.resume_url: Optional[str] = None
+        self.sequence: Optional[int] = None
+        self.connected = False
+        self.events_received = 0
+        self.reconnects = 0
+        self._heartbeat_acked = True
+
+    def add_handler(self, handler: EventHandler):
+        self.handlers.append(handler)
+
+    async def _dispatch(self, event_type: str, data: Dict[str, Any]):
+        self.events_received += 1
+        self.recent.append({"seq": self.sequence, "received_at": time.time(), **summarize_event(event_type, data)})
+        for handler in self.handlers:
+            try:
+                result = handler(event_type, data)
+                if result is not None:
+                    await result
+            except Exception as e:
+                logger.error("❌ Gateway handler failed on %s: %s", event_type, e)
+
+    async def _heartbeat(self, ws, interval: float):
+        await asyncio.sleep(interval * random.random())
+        while True:
+            if not self._heartbeat_acked:
+                # No ACK since the last beat: the connection is dead even if the socket is open
+                await ws.close(code=4000)
+                return
+            self._heartbeat_acked = False
+            await ws.send(json.dumps({"op": HEARTBEAT, "d": self.sequence}))
+            await asyncio.sleep(interval)
+
+    async def _identify(self, ws):
+        if self.session_id and self.sequence is not None:
+            await ws.send(json.dumps({
+                "op": RESUME,
+                "d": {"token": self.token, "session_id": self.session_id, "seq": self.sequence}
+            }))
+        else:
+            await ws.send(json.dumps({
+                "op": IDENTIFY,
+                "d": {
+                    "token": self.token,
+                    "intents": self.intents,
+                    "properties": {"os": "linux", "browser": "discord-mcp", "device": "discord-mcp"}
+                }
+            }))
+
+    async def _session(self, url: str) -> bool:
+        """Run one connection until it closes; returns False if reconnecting is pointless"""
+        async with websockets.connect(url, max_size=None) as ws:
+            heartbeat: Optional[asyncio.Task] = None
+            try:
+                async for raw in ws:
+                    payload = json.loads(raw)
+                    op = payload.get("op")
+                    if payload.get("s") is not None:
+                        self.sequence = payload["s"]
+
+                    if op == HELLO:
+                        self._heartbeat_acked = True
+                        heartbeat = asyncio.create_task(
+                            self._heartbeat(ws, payload["d"]["heartbeat_interval"] / 1000)
+                        )
+                        await self._identify(ws)
+                    elif op == HEARTBEAT_ACK:
+                        self._heartbeat_acked = True
+                    elif op == HEARTBEAT:
+                        await ws.send(json.dumps({"op": HEARTBEAT, "d": self.sequence}))
+                    elif op == RECONNECT:
+                        await ws.close(code=4000)
+                    elif op == INVALID_SESSION:
+                        if not payload.get("d"):
+                            self.session_id = self.resume_url = self.sequence = None
+                        await asyncio.sleep(1 + random.random() * 4)
+                        await ws.close(code=4000)
+                    elif op == DISPATCH:
+                        event_type, data = payload["t"], payload.get("d") or {}
+                        if event_type == "READY":
+                            self.session_id = data.get("session_id")
+                            self.resume_url = data.get("resume_gateway_url")
+                        if event_type in ("READY", "RESUMED"):
+                            self.connected = True
+                        await self._dispatch(event_type, data)
+            except websockets.ConnectionClosed:
+                pass
+            finally:
+                self.connected = False
+                if heartbeat:
+                    heartbeat.cancel()
+            close_code = ws.close_code
+        if close_code in FATAL_CLOSE_CODES:
+            logger.error("❌ Gateway closed with code %s; not reconnecting", close_code)
+            return False
+        return True
+
+    async def run(self):
+        """Connect, and reconnect with backoff after drops, until cancelled or a fatal close"""
+        backoff = 1.0
+        while True:
+            started = time.monotonic()
+            try:
+                base_url = self.resume_url if self.session_id and self.resume_url else await self.get_url()
+                separator = "&" if "?" in base_url else "?"
+                if not await self._session(f"{base_url}{separator}v=10&encoding=json"):
+                    return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("❌ Gateway connection failed: %s", e)
+            self.reconnects += 1
+            # Reset the backoff after a connection that stayed up for a while
+            backoff = 1.0 if time.monotonic() - started > 60 else min(backoff * 2, 60.0)
+            await asyncio.sleep(backoff * (0.5 + random.random() / 2))
+
+    def recent_events(self, limit: int = 100, event_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        events = [event for event in self.recent if event_type is None or event["type"] == event_type]
+        return events[-limit:]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "session_id": self.session_id,
+            "sequence": self.sequence,
+            "events_received": self.events_received,
+            "reconnects": self.reconnects,
+            "buffered_events": len(self.recent)
+        }
@@ -0,0 +1,214 @@
+"""
+Load Test
+
+Drives the MCP tools with a weighted mix of calls from concurrent workers
+against the fake Discord API (started in-process unless --base-url points at
+another server), then reports throughput, p50/p95/p99 latency per tool,
+errors, upstream requests per call, 429s, retries and cache hit rates as
+JSON. Tools are called directly, without an MCP transport, so the numbers
+cover the tool code, the client, the rate limiter and the caches.
+
+    python load_test.py --workers 20 --duration 30 --output results.json
+    python load_test.py --calls 2000 --mix get_channel_info=5,get_messages=3,search_messages=2
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fake_discord import FakeDiscordAPI, add_arguments
+
+DEFAULT_MIX = "get_bot_info=1,get_channel_info=4,get_messages=3,search_messages=2,send_message=1"
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def parse_mix(mix: str) -> List[Tuple[str, float]]:
+    weights = []
+    for item in mix.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name:
+            weights.append((name, float(weight or 1)))
+    return weights
+
+
+def tool_calls(server: Any, channel_ids: List[str], guild_id: str) -> Dict[str, Callable[[random.Random], Any]]:
+    """Argument generators for every tool the mix can name"""
+
+    def tool(name: str) -> Callable:
+        # fastmcp may wrap the function in a tool object; call the underlying coroutine function
+        registered = getattr(server, name)
+        return getattr(registered, "fn", registered)
+
+    return {
+        "get_bot_info": lambda rng: tool("get_bot_info")(),
+        "get_channel_info": lambda rng: tool("get_channel_info")(rng.choice(channel_ids)),
+        "get_messages": lambda rng: tool("get_messages")(rng.choice(channel_ids), limit=rng.choice([10, 50, 150])),
+        "search_messages": lambda rng: tool("search_messages")(
+            rng.choice(channel_ids), rng.choice(["deploy", "bug review", "incident*", "roadmap docs"]), limit=10
+        ),
+        "send_message": lambda rng: tool("send_message")(rng.choice(channel_ids), f"load test {rng.random():.6f}"),
+        "moderate_batch": lambda rng: tool("moderate_batch")(
+            "ban_users", [str(400000000000000000 + rng.randrange(20)) for _ in range(3)], guild_id=guild_id
+        )
+    }
+
+
+async def run_load(args: argparse.Namespace) -> Dict[str, Any]:
+    api: Optional[FakeDiscordAPI] = None
+    if args.base_url:
+        base_url = args.base_url
+        channel_ids = [cid.strip() for cid in args.channel_ids.split(",") if cid.strip()]
+        guild_id = args.guild_id
+    else:
+        api = await FakeDiscordAPI(
+            channels=args.channels, messages_per_channel=args.messages, latency=args.latency, jitter=args.jitter,
+            route_limit=args.route_limit, route_window=args.route_window, global_rate=args.global_rate,
+            error_rate=args.error_rate, seed=args.seed
+        ).start()
+        base_url, channel_ids, guild_id = api.base_url, api.channel_ids, api.guild_id
+
+    # discord_server reads its configuration at import time
+    os.environ["DISCORD_API_BASE_URL"] = base_url
+    os.environ.setdefault("DISCORD_BOT_TOKEN", "load-test-token")
+    store_dir = tempfile.TemporaryDirectory()
+    os.environ["MESSAGE_STORE_PATH"] = os.path.join(store_dir.name, "messages.db")
+    import discord_server
+    import metrics
+
+    calls = tool_calls(discord_server, channel_ids, guild_id)
+    mix = parse_mix(args.mix)
+    unknown = [name for name, _ in mix if name not in calls]
+    if unknown:
+        raise SystemExit(f"Unknown tools in --mix: {', '.join(unknown)} (choose from {', '.join(calls)})")
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    await discord_server.initialize_client()
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, Dict[str, int]] = {name: {} for name in names}
+    issued = 0
+    deadline = time.monotonic() + args.duration if args.duration else None
+
+    async def worker(worker_id: int):
+        nonlocal issued
+        rng = random.Random(args.seed * 1000 + worker_id)
+        while (args.calls and issued < args.calls) or (deadline and time.monotonic() < deadline):
+            issued += 1
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                await calls[name](rng)
+            except Exception as e:
+                kind = type(e).__name__
+                errors[name][kind] = errors[name].get(kind, 0) + 1
+            latencies[name].append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker(i) for i in range(args.workers)))
+        elapsed = time.perf_counter() - started
+        client = discord_server.get_client()
+        limiter, cache = client.rate_limit_stats(), client.cache_stats()
+    finally:
+        await discord_server.cleanup_client()
+        if api:
+            await api.stop()
+        store_dir.cleanup()
+
+    tools = {}
+    for name in names:
+        values = sorted(latencies[name])
+        if not values:
+            continue
+        tools[name] = {
+            "calls": len(values),
+            "errors": sum(errors[name].values()),
+            "error_types": errors[name],
+            "p50_seconds": percentile(values, 0.50),
+            "p95_seconds": percentile(values, 0.95),
+            "p99_seconds": percentile(values, 0.99),
+            "max_seconds": values[-1],
+            "upstream_calls_per_call": metrics.TOOL_UPSTREAM_CALLS.summary().get(name, {}).get("mean")
+        }
+    total = sum(len(values) for values in latencies.values())
+    lookups = sum(t["hits"] + t["misses"] + t["coalesced"] for t in cache["types"].values())
+    saved = sum(t["hits"] + t["coalesced"] for t in cache["types"].values())
+    return {
+        "elapsed_seconds": elapsed,
+        "calls": total,
+        "calls_per_second": total / elapsed if elapsed else 0.0,
+        "errors": sum(tool["errors"] for tool in tools.values()),
+        "tools": tools,
+        "upstream": {
+            "requests": limiter["requests"],
+            "requests_per_second": limiter["requests"] / elapsed if elapsed else 0.0,
+            "rate_limited": limiter["rate_limited"],
+            "global_rate_limited": limiter["global_rate_limited"],
+            "retries": limiter["retries"],
+            "routes": metrics.snapshot()["routes"]
+        },
+        "cache": {"hit_rate": saved / lookups if lookups else 0.0, "types": cache["types"]},
+        "fake_api": api.stats() if api else None
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Load test the Discord MCP tools against a fake Discord API")
+    parser.add_argument("--workers", type=int, default=20, help="concurrent workers issuing tool calls")
+    parser.add_argument("--calls", type=int, default=0, help="total tool calls to issue (0: use --duration)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run when --calls is 0")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated tool=weight pairs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--base-url", default=None, help="use this API instead of starting the fake in-process")
+    parser.add_argument("--channel-ids", default="", help="channels to use with --base-url")
+    parser.add_argument("--guild-id", default="0", help="guild to use with --base-url")
+    parser.add_argument("--output", default=None, help="write the JSON results to this file")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.calls:
+        args.duration = 0.0
+    if args.base_url and not args.channel_ids:
+        parser.error("--channel-ids is required with --base-url")
+
+    results = asyncio.run(run_load(args))
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        **results
+    }
+    for name, tool in report["tools"].items():
+        print(
+            f"{name:<18} {tool['calls']:>7} calls  p50 {tool['p50_seconds'] * 1000:8.2f} ms  "
+            f"p95 {tool['p95_seconds'] * 1000:8.2f} ms  p99 {tool['p99_seconds'] * 1000:8.2f} ms  "
+            f"{tool['errors']} errors",
+            file=sys.stderr
+        )
+    print(
+        f"{report['calls_per_second']:.1f} calls/s  {report['upstream']['requests']} upstream requests  "
+        f"{report['upstream']['rate_limited']} 429s  {report['upstream']['retries']} retries  "
+        f"cache hit rate {report['cache']['hit_rate']:.2f}",
+        file=sys.stderr
+    )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,416 @@
+"""
+Local Message Store
+
+SQLite copy of channel history with an FTS5 index over message content, so
+searches are answered locally instead of through the Discord API. Channels
+are synced incrementally: each channel keeps the newest message id it has
+seen and later syncs only fetch messages after it. Async callers go through
+MessageStore.run, which executes queries on the store's own thread so SQLite
+never blocks the event loop.
+"""
+
+import os
+import json
+import logging
+import time
+import sqlite3
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from discord_client import DiscordClient, snowflake_from_time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    author_id TEXT,
+    author TEXT,
+    content TEXT NOT NULL DEFAULT '',
+    timestamp TEXT,
+    edited_timestamp TEXT,
+    attachments INTEGER NOT NULL DEFAULT 0,
+    embeds INTEGER NOT NULL DEFAULT 0,
+    pinned INTEGER NOT NULL DEFAULT 0,
+    mentions TEXT NOT NULL DEFAULT '[]',
+    reply_to TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel_id, id);
+CREATE INDEX IF NOT EXISTS messages_author ON messages (author_id, id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    channel_id TEXT PRIMARY KEY,
+    last_message_id TEXT,
+    last_synced_at REAL
+);
+"""
+
+
+def default_store_path() -> str:
+    """Per-user data directory, so the store does not land in whatever directory the server starts from"""
+    base = os.getenv("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(base, "discord-mcp", "messages.db")
+
+
+def fts_query(query: str) -> str:
+    """Quote each term so user input cannot break FTS5 syntax; a trailing * keeps prefix matching"""
+    terms = []
+    for term in query.split():
+        prefix = term.endswith("*") and len(term) > 1
+        term = term.rstrip("*")
+        if term:
+            terms.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class MessageStore:
+    """Messages, their full-text index and per-channel sync cursors in one SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One thread owns the connection for async callers; the lock still guards direct calls
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="message-store")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    @classmethod
+    async def open(cls, path: str) -> "MessageStore":
+        """Create the store without blocking the event loop on file creation and schema setup"""
+        return await asyncio.to_thread(cls, path)
+
+    async def run(self, method: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run one of the store's methods on its thread and await the result"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(method, *args, **kwargs))
+
+    def close(self):
+        # Queued queries finish first
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
+
+    def upsert_messages(self, channel_id: str, messages: Iterable[Dict[str, Any]]) -> int:
+        rows = [
+            (
+                int(msg["id"]),
+                msg.get("channel_id") or channel_id,
+                msg.get("author", {}).get("id"),
+                msg.get("author", {}).get("username"),
+                msg.get("content") or "",
+                msg.get("timestamp"),
+                msg.get("edited_timestamp"),
+                len(msg.get("attachments", [])),
+                len(msg.get("embeds", [])),
+                int(bool(msg.get("pinned"))),
+                json.dumps([user["id"] for user in msg.get("mentions", [])]),
+                (msg.get("message_reference") or {}).get("message_id")
+            )
+            for msg in messages
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO messages (id, channel_id, author_id, author, content, timestamp, edited_timestamp,
+                                      attachments, embeds, pinned, mentions, reply_to)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    content = excluded.content, edited_timestamp = excluded.edited_timestamp,
+                    attachments = excluded.attachments, embeds = excluded.embeds,
+                    pinned = excluded.pinned, mentions = excluded.mentions
+                """,
+                rows
+            )
+        return len(rows)
+
+    def update_message(self, message: Dict[str, Any]) -> bool:
+        """Apply a partial edit (as in MESSAGE_UPDATE) to a stored message; unknown ids are ignored"""
+        changes = {}
+        if "content" in message:
+            changes["content"] = message["content"] or ""
+        if "edited_timestamp" in message:
+            changes["edited_timestamp"] = message["edited_timestamp"]
+        for field in ("attachments", "embeds"):
+            if field in message:
+                changes[field] = len(message[field])
+        if "pinned" in message:
+            changes["pinned"] = int(bool(message["pinned"]))
+        if "mentions" in message:
+            changes["mentions"] = json.dumps([user["id"] for user in message["mentions"]])
+        if not changes:
+            return False
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"UPDATE messages SET {', '.join(f'{column} = ?' for column in changes)} WHERE id = ?",
+                [*changes.values(), int(message["id"])]
+            )
+        return cursor.rowcount > 0
+
+    def delete_messages(self, message_ids: List[str]) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                "DELETE FROM messages WHERE id = ?", [(int(message_id),) for message_id in message_ids]
+            )
+        return cursor.rowcount
+
+    def get_cursor(self, channel_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_message_id FROM sync_state WHERE channel_id = ?", (channel_id,)
+            ).fetchone()
+        return row["last_message_id"] if row else None
+
+    def is_synced(self, channel_id: str) -> bool:
+        """Whether the channel finished its first sync; an empty channel is synced with no cursor"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM sync_state WHERE channel_id = ?", (channel_id,)).fetchone()
+        return row is not None
+
+    def set_cursor(self, channel_id: str, last_message_id: Optional[str]):
+        """Record a sync of the channel; the cursor only ever moves forward"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO sync_state (channel_id, last_message_id, last_synced_at) VALUES (?, ?, ?)
+                ON CONFLICT(channel_id) DO UPDATE SET
+                    last_message_id = CASE
+                        WHEN excluded.last_message_id IS NULL THEN last_message_id
+                        WHEN last_message_id IS NULL
+                             OR CAST(excluded.last_message_id AS INTEGER) > CAST(last_message_id AS INTEGER)
+                        THEN excluded.last_message_id
+                        ELSE last_message_id
+                    END,
+                    last_synced_at = excluded.last_synced_at
+                """,
+                (channel_id, last_message_id, time.time())
+            )
+
+    def synced_channels(self) -> List[str]:
+        with self._lock:
+            return [row["channel_id"] for row in self._conn.execute("SELECT channel_id FROM sync_state")]
+
+    def search(
+        self,
+        query: str = "",
+        channel_ids: Optional[List[str]] = None,
+        author_id: Optional[str] = None,
+        author: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        has_attachments: Optional[bool] = None,
+        has_embeds: Optional[bool] = None,
+        pinned: Optional[bool] = None,
+        mentions: Optional[str] = None,
+        limit: int = 25,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """Full-text search ranked by BM25, or newest first without a query, narrowed by the filters"""
+        where, params = [], []
+        match = fts_query(query)
+        if match:
+            where.append("messages_fts MATCH ?")
+            params.append(match)
+        if channel_ids:
+            where.append(f"m.channel_id IN ({', '.join('?' for _ in channel_ids)})")
+            params.extend(channel_ids)
+        if author_id:
+            where.append("m.author_id = ?")
+            params.append(author_id)
+        if author:
+            where.append("m.author = ? COLLATE NOCASE")
+            params.append(author)
+        # Snowflakes encode creation time, so date ranges use the primary key
+        if since:
+            where.append("m.id >= ?")
+            params.append(snowflake_from_time(since))
+        if until:
+            where.append("m.id < ?")
+            params.append(snowflake_from_time(until))
+        for column, value in (("attachments", has_attachments), ("embeds", has_embeds)):
+            if value is not None:
+                where.append(f"m.{column} {'>' if value else '='} 0")
+        if pinned is not None:
+            where.append("m.pinned = ?")
+            params.append(int(pinned))
+        if mentions:
+            where.append("EXISTS (SELECT 1 FROM json_each(m.mentions) WHERE json_each.value = ?)")
+            params.append(mentions)
+
+        if match:
+            sql = """
+                SELECT m.*, snippet(messages_fts, 0, '**', '**', '...', 16) AS snippet
+                FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+            """
+            order = "ORDER BY bm25(messages_fts)"
+        else:
+            sql = "SELECT m.*, NULL AS snippet FROM messages m"
+            order = "ORDER BY m.id DESC"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" {order} LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {
+                "id": str(row["id"]),
+                "channel_id": row["channel_id"],
+                "content": row["content"],
+                "snippet": row["snippet"],
+                "author": row["author"],
+                "author_id": row["author_id"],
+                "timestamp": row["timestamp"],
+                "edited_timestamp": row["edited_timestamp"],
+                "attachments": row["attachments"],
+                "embeds": row["embeds"],
+                "pinned": bool(row["pinned"]),
+                "mentions": json.loads(row["mentions"]),
+                "reply_to": row["reply_to"]
+            }
+            for row in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            channels = [
+                {
+                    "channel_id": row["channel_id"],
+                    "messages": row["messages"],
+                    "last_message_id": row["last_message_id"],
+                    "last_synced_at": row["last_synced_at"]
+                }
+                for row in self._conn.execute(
+                    """
+                    SELECT s.channel_id, s.last_message_id, s.last_synced_at,
+                           (SELECT COUNT(*) FROM messages m WHERE m.channel_id = s.channel_id) AS messages
+                    FROM sync_state s ORDER BY s.channel_id
+                    """
+                )
+            ]
+            total = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        return {"path": self.path, "messages": total, "channels": channels}
+
+
+class MessageSyncer:
+    """Keeps the store up to date with a set of channels"""
+
+    def __init__(self, client: DiscordClient, store: MessageStore, backfill_limit: int = 1000, channels: Iterable[str] = ()):
+        self.client = client
+        self.store = store
+        self.backfill_limit = backfill_limit
+        # Channels synced in earlier runs; see MessageSyncer.create
+        self.channels = set(channels)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Channels whose history gateway events have kept contiguous since their last sync
+        self.live_channels: Set[str] = set()
+        self.gateway_connected: Callable[[], bool] = lambda: False
+
+    @classmethod
+    async def create(cls, client: DiscordClient, store: MessageStore, backfill_limit: int = 1000) -> "MessageSyncer":
+        """Syncer that keeps tracking every channel the store has synced before"""
+        return cls(client, store, backfill_limit, await store.run(store.synced_channels))
+
+    def reset_live(self):
+        """A new gateway session may have missed events; live channels need one more REST sync"""
+        self.live_channels.clear()
+
+    async def apply_message(self, message: Dict[str, Any]):
+        """Store a message received from the gateway, advancing the cursor of live channels"""
+        channel_id = message["channel_id"]
+        # The gateway delivers every channel the bot can see; only tracked ones are stored
+        if channel_id not in self.channels:
+            return
+        await self.store.run(self.store.upsert_messages, channel_id, [message])
+        # Events of one session (resumes replay what was missed) are contiguous; a new session resets live_channels
+        if channel_id in self.live_channels:
+            await self.store.run(self.store.set_cursor, channel_id, message["id"])
+
+    async def sync_channel(self, channel_id: str) -> int:
+        """
+        Fetch messages newer than the channel's cursor. A channel seen for the
+        first time is backfilled with its newest backfill_limit messages.
+        Returns the number of messages stored.
+        """
+        self.channels.add(channel_id)
+        lock = self._locks.setdefault(channel_id, asyncio.Lock())
+        store = self.store
+        async with lock:
+            cursor = await store.run(store.get_cursor, channel_id)
+            stored = 0
+            batch: List[Dict[str, Any]] = []
+            # Without a cursor a synced channel was empty, so everything in it is new
+            if await store.run(store.is_synced, channel_id):
+                # Oldest first, so the cursor can advance after every batch
+                async for message in self.client.iter_messages(channel_id, after=cursor, oldest_first=True):
+                    batch.append(message)
+                    if len(batch) >= 100:
+                        stored += await store.run(store.upsert_messages, channel_id, batch)
+                        await store.run(store.set_cursor, channel_id, batch[-1]["id"])
+                        batch = []
+                if batch:
+                    stored += await store.run(store.upsert_messages, channel_id, batch)
+                    await store.run(store.set_cursor, channel_id, batch[-1]["id"])
+                else:
+                    await store.run(store.set_cursor, channel_id, None)
+                self._mark_live(channel_id)
+                return stored
+
+            newest: Optional[str] = None
+            async for message in self.client.iter_messages(channel_id, limit=self.backfill_limit):
+                newest = newest or message["id"]
+                batch.append(message)
+                if len(batch) >= 100:
+                    stored += await store.run(store.upsert_messages, channel_id, batch)
+                    batch = []
+            if batch:
+                stored += await store.run(store.upsert_messages, channel_id, batch)
+            # The cursor is only set once the backfill finished; an interrupted one starts over
+            await store.run(store.set_cursor, channel_id, newest)
+            self._mark_live(channel_id)
+            return stored
+
+    def _mark_live(self, channel_id: str):
+        if self.gateway_connected():
+            self.live_channels.add(channel_id)
+
+    async def sync_all(self) -> Dict[str, int]:
+        results = {}
+        for channel_id in sorted(self.channels):
+            if channel_id in self.live_channels and self.gateway_connected():
+                continue
+            try:
+                results[channel_id] = await self.sync_channel(channel_id)
+            except Exception as e:
+                logger.error("❌ Failed to sync channel %s: %s", channel_id, e)
+        return results
+
+    async def run(self, interval: float):
+        """Sync every tracked channel, then again every interval seconds, until cancelled"""
+        while True:
+            await self.sync_all()
+            await asyncio.sleep(interval)
+
@@ -0,0 +1,118 @@
+"""
+Discord Metadata Cache
+
+TTL + LRU cache for slowly changing Discord objects (the bot user, channels,
+guild members). Each resource type has its own TTL, and concurrent lookups of
+the same missing key share one upstream request instead of each sending
+their own.
+"""
+
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+DEFAULT_TTLS = {
+    "bot_user": 3600.0,
+    "channel": 300.0,
+    "guild_member": 60.0
+}
+
+
+class MetadataCache:
+    """Per-type TTLs, a shared LRU bound and in-flight coalescing for metadata GETs"""
+
+    def __init__(self, max_entries: int = 1000, ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._entries: "OrderedDict[Tuple[str, ...], Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, ...], "asyncio.Future[Any]"] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self.evictions = 0
+
+    def _count(self, kind: str, counter: str):
+        counters = self._counters.setdefault(kind, {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0})
+        counters[counter] += 1
+
+    async def get(self, kind: str, key: Tuple[str, ...], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached value for (kind, *key), fetching it once if missing or expired"""
+        cache_key = (kind, *key)
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(cache_key)
+                self._count(kind, "hits")
+                return entry[1]
+            del self._entries[cache_key]
+
+        pending = self._in_flight.get(cache_key)
+        if pending is not None:
+            self._count(kind, "coalesced")
+            # Shielded so one caller giving up does not cancel the fetch for the others
+            return await asyncio.shield(pending)
+
+        self._count(kind, "misses")
+        pending = asyncio.ensure_future(fetch())
+        self._in_flight[cache_key] = pending
+        pending.add_done_callback(lambda future: self._settle(cache_key, future))
+        return await asyncio.shield(pending)
+
+    def _settle(self, cache_key: Tuple[str, ...], future: "asyncio.Future[Any]"):
+        """Cache a finished fetch, unless it failed or was invalidated while in flight"""
+        if self._in_flight.get(cache_key) is not future:
+            return
+        del self._in_flight[cache_key]
+        if not future.cancelled() and future.exception() is None:
+            self._put(cache_key, future.result(), self.ttls.get(cache_key[0], 60.0))
+
+    def _put(self, cache_key: Tuple[str, ...], value: Any, ttl: float):
+        if ttl <= 0:
+            return
+        self._entries[cache_key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, kind: str, key: Tuple[str, ...], value: Any, ttl: Optional[float] = None):
+        """Store a value obtained elsewhere (e.g. a gateway event); ttl defaults to the kind's TTL"""
+        cache_key = (kind, *key)
+        # A fetch in flight would otherwise overwrite this with older data
+        self._in_flight.pop(cache_key, None)
+        self._put(cache_key, value, self.ttls.get(kind, 60.0) if ttl is None else ttl)
+
+    def invalidate(self, kind: str, *key: str):
+        """Drop one entry, or every entry of the kind when no key is given"""
+        if key:
+            removed = [(kind, *key)] if (kind, *key) in self._entries else []
+        else:
+            removed = [cache_key for cache_key in self._entries if cache_key[0] == kind]
+        for cache_key in removed:
+            del self._entries[cache_key]
+            self._count(kind, "invalidations")
+        # A fetch already in flight may return the old state; stop handing it out
+        for cache_key in list(self._in_flight):
+            if cache_key[0] == kind and (not key or cache_key[1:] == key):
+                del self._in_flight[cache_key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        by_type = {}
+        for kind in sorted(set(self.ttls) | set(self._counters)):
+            counters = self._counters.get(kind, {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0})
+            lookups = counters["hits"] + counters["misses"] + counters["coalesced"]
+            by_type[kind] = {
+                **counters,
+                "ttl_seconds": self.ttls.get(kind),
+                "entries": sum(1 for cache_key in self._entries if cache_key[0] == kind),
+                # Coalesced lookups did not cost an upstream request either
+                "hit_rate": (counters["hits"] + counters["coalesced"]) / lookups if lookups else 0.0
+            }
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "types": by_type
+        }
@@ -0,0 +1,240 @@
+"""
+Server Metrics
+
+Latency histograms per MCP tool and per Discord API route, plus the number
+of upstream requests each tool call made. Tools are wrapped with
+`track_tool`; DiscordClient reports every HTTP attempt (retries included)
+through `record_upstream`, which is attributed to the tool call running in
+the current context. Everything renders as JSON for the MCP resource and in
+the Prometheus text format.
+"""
+
+import re
+import time
+import functools
+import threading
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def route_label(method: str, path: str) -> str:
+    """Method and path with every id replaced, so routes stay a small label set"""
+    return f"{method.upper()} {_ID_SEGMENT.sub('/{id}', '/' + path.split('?', 1)[0].strip('/'))}"
+
+
+# The Prometheus helpers below are kept identical in Plagiarism_Detector/backend/metrics.py and
+# Discord_Bot/metrics.py; the two services are deployed separately, so neither imports the other.
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, rendered Prometheus style"""
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        buckets: Sequence[float],
+        label_names: Sequence[str] = (),
+        interpolate: bool = True
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = tuple(label_names)
+        # Whole-number observations (counts) should report bucket bounds, not fractions between them
+        self.interpolate = interpolate
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # One slot per bucket, then +Inf count and sum
+                series = self._series[label_values] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def _snapshot(self) -> Dict[Tuple[str, ...], List[float]]:
+        with self._lock:
+            return {labels: list(values) for labels, values in self._series.items()}
+
+    def quantile(self, q: float, *label_values: str) -> Optional[float]:
+        """Estimate a quantile, by linear interpolation inside its bucket unless disabled"""
+        return self._quantile(self._snapshot().get(label_values), q)
+
+    def _quantile(self, series: Optional[List[float]], q: float) -> Optional[float]:
+        if not series or not series[-2]:
+            return None
+        rank = q * series[-2]
+        previous_bound, previous_count = 0.0, 0.0
+        for bound, count in zip(self.buckets, series):
+            if count >= rank:
+                if count == previous_count or not self.interpolate:
+                    return bound
+                return previous_bound + (bound - previous_bound) * (rank - previous_count) / (count - previous_count)
+            previous_bound, previous_count = bound, count
+        return self.buckets[-1]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        summaries = {}
+        for label_values, series in sorted(self._snapshot().items()):
+            count = series[-2]
+            summaries[",".join(label_values)] = {
+                "count": int(count),
+                "mean": series[-1] / count if count else None,
+                "p50": self._quantile(series, 0.5),
+                "p95": self._quantile(series, 0.95),
+                "p99": self._quantile(series, 0.99)
+            }
+        return summaries
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values):
+                labels = _format_labels(self.label_names, label_values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {_format_value(count)}")
+            labels = _format_labels(self.label_names, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {_format_value(values[-2])}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_count{labels} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-1])}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    @property
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+def render_samples(name: str, help_text: str, metric_type: str, samples: List[Tuple[Dict[str, str], float]]) -> List[str]:
+    """Prometheus lines for a gauge or counter whose values are read from elsewhere"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(list(labels.keys()), list(labels.values()))} {_format_value(value)}")
+    return lines
+
+
+TOOL_SECONDS = Histogram("discord_mcp_tool_seconds", "MCP tool call latency", LATENCY_BUCKETS, ["tool", "status"])
+TOOL_UPSTREAM_CALLS = Histogram(
+    "discord_mcp_tool_upstream_calls", "Discord API requests (retries included) per tool call", COUNT_BUCKETS, ["tool"],
+    interpolate=False
+)
+UPSTREAM_SECONDS = Histogram(
+    "discord_api_request_seconds", "Discord API request latency per attempt", LATENCY_BUCKETS, ["route"]
+)
+UPSTREAM_RESPONSES = Counter("discord_api_responses_total", "Discord API responses by route and status", ["route", "status"])
+HISTOGRAMS = [TOOL_SECONDS, TOOL_UPSTREAM_CALLS, UPSTREAM_SECONDS]
+COUNTERS = [UPSTREAM_RESPONSES]
+
+
+class ToolCall:
+    """Upstream requests made while one tool call runs"""
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.upstream_calls = 0
+
+
+_current: ContextVar[Optional[ToolCall]] = ContextVar("tool_call", default=None)
+
+
+def record_upstream(method: str, path: str, status: str, seconds: float):
+    """Record one HTTP attempt against the route and the tool call in progress"""
+    route = route_label(method, path)
+    UPSTREAM_SECONDS.observe(seconds, route)
+    UPSTREAM_RESPONSES.inc(route, status)
+    tool_call = _current.get()
+    if tool_call is not None:
+        tool_call.upstream_calls += 1
+
+
+def track_tool(fn: Callable) -> Callable:
+    """Wrap an async MCP tool to record its latency, outcome and upstream request count"""
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        tool_call = ToolCall(fn.__name__)
+        token = _current.set(tool_call)
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = await fn(*args, **kwargs)
+            status = "ok"
+            return result
+        finally:
+            TOOL_SECONDS.observe(time.perf_counter() - start, fn.__name__, status)
+            TOOL_UPSTREAM_CALLS.observe(tool_call.upstream_calls, fn.__name__)
+            _current.reset(token)
+
+    return wrapper
+
+
+def snapshot() -> Dict[str, Any]:
+    """Tool and route summaries with estimated percentiles"""
+    responses: Dict[str, Dict[str, int]] = {}
+    for (route, status), value in UPSTREAM_RESPONSES.values.items():
+        responses.setdefault(route, {})[status] = int(value)
+    return {
+        "tools": TOOL_SECONDS.summary(),
+        "upstream_calls_per_tool_call": TOOL_UPSTREAM_CALLS.summary(),
+        "routes": {
+            route: {**latency, "responses": responses.get(route, {})}
+            for route, latency in UPSTREAM_SECONDS.summary().items()
+        }
+    }
+
+
+def render_prometheus(extra: Optional[List[str]] = None) -> str:
+    lines: List[str] = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for counter in COUNTERS:
+        lines.extend(counter.render())
+    lines.extend(extra or [])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,130 @@
+"""
+Batch Moderation
+
+Applies one moderation action to many messages or users. Message deletes are
+split into bulk-delete calls of up to 100 messages younger than 14 days;
+older messages, and groups too small for bulk delete, are deleted one by one.
+Every item gets its own result, so one failure does not abort the batch.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from discord_client import DiscordClient, snowflake_time
+
+BULK_DELETE_MAX = 100
+# Discord rejects bulk deletes of messages older than two weeks; keep a margin for clock skew
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+
+
+def _is_snowflake(value: str) -> bool:
+    # isdigit() also accepts characters such as "²" that int() rejects; snowflakes are unsigned 64-bit
+    return value.isascii() and value.isdecimal() and int(value) < 2 ** 64
+
+
+def _error(e: Exception) -> Dict[str, Any]:
+    if isinstance(e, httpx.HTTPStatusError):
+        try:
+            message = e.response.json().get("message", e.response.reason_phrase)
+        except ValueError:
+            message = e.response.reason_phrase
+        return {"success": False, "status_code": e.response.status_code, "error": message}
+    return {"success": False, "error": str(e)}
+
+
+class BatchModerator:
+    """Runs moderation actions over lists of targets with bounded concurrency"""
+
+    def __init__(self, client: DiscordClient, max_concurrency: int = 5):
+        self.client = client
+        self.max_concurrency = max(1, max_concurrency)
+        # Shared by every batch, so concurrent tool calls stay within the bound together
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _run_each(
+        self,
+        targets: List[str],
+        action: Callable[[str], Awaitable[Any]],
+        key: str
+    ) -> List[Dict[str, Any]]:
+        async def run(target: str) -> Dict[str, Any]:
+            async with self._semaphore:
+                try:
+                    await action(target)
+                    return {key: target, "success": True}
+                except Exception as e:
+                    return {key: target, **_error(e)}
+
+        return list(await asyncio.gather(*(run(target) for target in targets)))
+
+    async def delete_messages(self, channel_id: str, message_ids: List[str]) -> List[Dict[str, Any]]:
+        """Delete messages in one channel, bulk where Discord allows it; results follow the input order"""
+        results: Dict[str, Dict[str, Any]] = {}
+        recent, old = [], []
+        cutoff = datetime.now(timezone.utc) - BULK_DELETE_MAX_AGE
+        for message_id in dict.fromkeys(message_ids):
+            try:
+                if not _is_snowflake(message_id):
+                    raise ValueError(message_id)
+                is_recent = snowflake_time(message_id) > cutoff
+            except (ValueError, OverflowError):
+                results[message_id] = {"message_id": message_id, "success": False, "error": "Invalid message ID"}
+                continue
+            (recent if is_recent else old).append(message_id)
+
+        chunks = [recent[i:i + BULK_DELETE_MAX] for i in range(0, len(recent), BULK_DELETE_MAX)]
+        # Bulk delete needs at least two messages
+        singles = old + [chunk[0] for chunk in chunks if len(chunk) == 1]
+
+        async def bulk(chunk: List[str]) -> List[str]:
+            async with self._semaphore:
+                try:
+                    await self.client.delete_messages_bulk(channel_id, chunk)
+                except httpx.HTTPStatusError as e:
+                    # One unknown or too-old message fails the whole call with a 400; retry the chunk individually
+                    if e.response.status_code == 400:
+                        return chunk
+                    # Missing permissions or an unknown channel would fail every single delete too
+                    for message_id in chunk:
+                        results[message_id] = {"message_id": message_id, **_error(e), "method": "bulk"}
+                    return []
+            for message_id in chunk:
+                results[message_id] = {"message_id": message_id, "success": True, "method": "bulk"}
+            return []
+
+        def delete_one(message_id: str) -> Awaitable[Any]:
+            return self.client.delete_message(channel_id, message_id)
+
+        single_results, *fallbacks = await asyncio.gather(
+            self._run_each(singles, delete_one, "message_id"),
+            *(bulk(chunk) for chunk in chunks if len(chunk) > 1)
+        )
+        fallback = [message_id for chunk in fallbacks for message_id in chunk]
+        single_results += await self._run_each(fallback, delete_one, "message_id")
+        for result in single_results:
+            results[result["message_id"]] = {**result, "method": "single"}
+        return [results[message_id] for message_id in dict.fromkeys(message_ids)]
+
+    async def kick_users(self, guild_id: str, user_ids: List[str], reason: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self._run_each(
+            list(dict.fromkeys(user_ids)),
+            lambda user_id: self.client.remove_guild_member(guild_id, user_id, reason),
+            "user_id"
+        )
+
+    async def ban_users(self, guild_id: str, user_ids: List[str], reason: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self._run_each(
+            list(dict.fromkeys(user_ids)),
+            lambda user_id: self.client.ban_guild_member(guild_id, user_id, reason),
+            "user_id"
+        )
+
+    async def unban_users(self, guild_id: str, user_ids: List[str]) -> List[Dict[str, Any]]:
+        return await self._run_each(
+            list(dict.fromkeys(user_ids)),
+            lambda user_id: self.client.unban_guild_member(guild_id, user_id),
+            "user_id"
+        )
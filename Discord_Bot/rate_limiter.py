@@ -0,0 +1,276 @@
+"""
+Discord Rate Limiter
+
+Request scheduler for the Discord REST API. It learns rate-limit buckets
+from the X-RateLimit-* response headers, holds requests back while their
+bucket (or the global limit) is exhausted, retries 429s after the
+advertised retry_after, and caps the number of requests in flight.
+"""
+
+import re
+import math
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+# Path segments that are part of Discord's bucket key ("major parameters")
+_MAJOR_PARAMETERS = ("channels", "guilds", "webhooks")
+_SNOWFLAKE = re.compile(r"^\d+$")
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+RETRYABLE_STATUS_CODES = (500, 502, 503, 504)
+
+
+def route_key(method: str, path: str) -> str:
+    """Method plus path with minor ids replaced, e.g. DELETE /channels/123/messages/{id}"""
+    segments = path.split("?", 1)[0].strip("/").split("/")
+    keyed = []
+    for i, segment in enumerate(segments):
+        if _SNOWFLAKE.match(segment) and not (i > 0 and segments[i - 1] in _MAJOR_PARAMETERS):
+            keyed.append("{id}")
+        else:
+            keyed.append(segment)
+    return f"{method.upper()} /{'/'.join(keyed)}"
+
+
+def _major_parameters(path: str) -> str:
+    segments = path.split("?", 1)[0].strip("/").split("/")
+    return "/".join(
+        segments[i + 1] for i, segment in enumerate(segments[:-1]) if segment in _MAJOR_PARAMETERS
+    )
+
+
+class _Bucket:
+    """Known limit state of one rate-limit bucket"""
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        # 0.0 while the current window's reset time is not known yet
+        self.reset_at = 0.0
+        self.in_flight = 0
+        self.lock = asyncio.Lock()
+        # The first request to an unknown bucket goes alone; the rest wait for its headers
+        self.probing = False
+        self.learned = asyncio.Event()
+        self.updated = asyncio.Event()
+
+    def update(self, response: httpx.Response):
+        headers = response.headers
+        if "x-ratelimit-limit" in headers:
+            self.limit = int(headers["x-ratelimit-limit"])
+        if "x-ratelimit-remaining" in headers and "x-ratelimit-reset-after" in headers:
+            remaining = int(headers["x-ratelimit-remaining"])
+            if self.reset_at == 0.0:
+                # First response of a window: requests still in flight were sent after it
+                self.reset_at = time.monotonic() + float(headers["x-ratelimit-reset-after"])
+                self.remaining = remaining - self.in_flight
+            else:
+                # Responses arrive out of order; never hand back requests already reserved
+                self.remaining = min(self.remaining if self.remaining is not None else remaining, remaining)
+        # A 5xx or a 429 without bucket headers says nothing about the limits; probe again
+        if self.limit is not None or (response.status_code < 500 and response.status_code != 429):
+            self.learned.set()
+        self.updated.set()
+
+
+class RateLimiter:
+    """Per-bucket queues, a global request budget and bounded concurrency for Discord requests"""
+
+    def __init__(
+        self,
+        max_concurrency: int = 10,
+        global_rate: float = 50.0,
+        max_retries: int = 5,
+        max_retry_after: float = 60.0
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.global_rate = global_rate
+        self.max_retries = max(0, max_retries)
+        self.max_retry_after = max_retry_after
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._route_buckets: Dict[str, str] = {}
+        self._buckets: Dict[str, _Bucket] = {}
+        self._global_reset_at = 0.0
+        self._global_lock = asyncio.Lock()
+        # Theoretical arrival time of the next request at exactly global_rate per second
+        self._global_tat = 0.0
+        self.requests = 0
+        self.rate_limited = 0
+        self.global_rate_limited = 0
+        self.retries = 0
+
+    def _bucket(self, method: str, path: str) -> _Bucket:
+        route = route_key(method, path)
+        # Until Discord names the bucket, each route is its own bucket
+        bucket_id = f"{self._route_buckets.get(route, route)}:{_major_parameters(path)}"
+        bucket = self._buckets.get(bucket_id)
+        if bucket is None:
+            bucket = self._buckets[bucket_id] = _Bucket()
+        return bucket
+
+    async def _wait_global(self):
+        """
+        Honour a global 429 and stay under global_rate per second. Up to one
+        second's budget may go out at once; the slot is reserved under the
+        lock and waited for after releasing it, so callers sleep concurrently.
+        """
+        async with self._global_lock:
+            now = time.monotonic()
+            start = max(now, self._global_reset_at)
+            if self.global_rate > 0:
+                interval = 1.0 / self.global_rate
+                burst = max(1.0, self.global_rate)
+                tat = max(self._global_tat, start)
+                start = max(start, tat - (burst - 1) * interval)
+                self._global_tat = tat + interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _acquire(self, bucket: _Bucket):
+        """Wait in the bucket's queue until it has a request left, then reserve it"""
+        async with bucket.lock:
+            while not bucket.learned.is_set():
+                if not bucket.probing:
+                    bucket.probing = True
+                    bucket.in_flight += 1
+                    return
+                bucket.updated.clear()
+                await bucket.updated.wait()
+            while True:
+                now = time.monotonic()
+                if bucket.reset_at and bucket.reset_at <= now and bucket.limit is not None:
+                    # Window over; the next response tells us when the new one resets
+                    bucket.remaining = bucket.limit
+                    bucket.reset_at = 0.0
+                if bucket.remaining is None or bucket.remaining > 0:
+                    break
+                if bucket.reset_at:
+                    await asyncio.sleep(bucket.reset_at - now)
+                elif bucket.in_flight:
+                    bucket.updated.clear()
+                    await bucket.updated.wait()
+                else:
+                    bucket.remaining = bucket.limit
+            if bucket.remaining is not None:
+                bucket.remaining -= 1
+            bucket.in_flight += 1
+
+    def _retry_after(self, response: httpx.Response) -> float:
+        """Seconds to wait after a 429: body retry_after, then the Retry-After and reset-after headers, then 1s"""
+        try:
+            candidates = [response.json().get("retry_after")]
+        except (ValueError, AttributeError):
+            candidates = []
+        # Retry-After may also be an HTTP date, which is skipped like any other unparsable value
+        candidates += [response.headers.get("retry-after"), response.headers.get("x-ratelimit-reset-after")]
+        for candidate in candidates:
+            try:
+                retry_after = float(candidate)
+            except (ValueError, TypeError):
+                continue
+            if not math.isnan(retry_after):
+                return min(max(retry_after, 0.0), self.max_retry_after)
+        return min(1.0, self.max_retry_after)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        send: Callable[[], Awaitable[httpx.Response]]
+    ) -> httpx.Response:
+        """
+        Send a request through the scheduler. 429s are always retried (the
+        request was not processed); 5xx and connection errors only for
+        idempotent methods, so a POST is never sent twice.
+        """
+        method = method.upper()
+        attempt = 0
+        while True:
+            bucket = queued = self._bucket(method, path)
+            await self._acquire(bucket)
+            # A probe may have mapped this route onto a shared bucket while we queued
+            while self._bucket(method, path) is not bucket:
+                bucket.in_flight -= 1
+                bucket = self._bucket(method, path)
+                await self._acquire(bucket)
+            reserved = bucket
+            await self._wait_global()
+            try:
+                async with self._semaphore:
+                    self.requests += 1
+                    try:
+                        response = await send()
+                    except httpx.TransportError:
+                        if method not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+                            raise
+                        response = None
+            finally:
+                reserved.in_flight -= 1
+                reserved.updated.set()
+                # A failed probe hands over to the next queued request
+                queued.probing = False
+                queued.updated.set()
+
+            if response is not None:
+                bucket_hash = response.headers.get("x-ratelimit-bucket")
+                if bucket_hash:
+                    self._route_buckets[route_key(method, path)] = bucket_hash
+                    shared = self._bucket(method, path)
+                    if shared is not bucket:
+                        # Release requests still waiting on the provisional route bucket; after
+                        # _acquire they see the remap and queue on the shared bucket instead
+                        bucket.learned.set()
+                        bucket.updated.set()
+                        bucket = shared
+                bucket.update(response)
+
+                if response.status_code != 429:
+                    if (
+                        response.status_code not in RETRYABLE_STATUS_CODES
+                        or method not in IDEMPOTENT_METHODS
+                        or attempt >= self.max_retries
+                    ):
+                        return response
+                    delay = min(self.max_retry_after, 0.5 * (2 ** attempt))
+                else:
+                    if attempt >= self.max_retries:
+                        return response
+                    self.rate_limited += 1
+                    delay = self._retry_after(response)
+                    if response.headers.get("x-ratelimit-global") == "true" or self._is_global(response):
+                        self.global_rate_limited += 1
+                        self._global_reset_at = max(self._global_reset_at, time.monotonic() + delay)
+                        delay = 0.0
+                    elif response.headers.get("x-ratelimit-scope") != "shared":
+                        # Retry through the bucket queue, which now waits out the reset
+                        bucket.remaining = 0
+                        bucket.reset_at = max(bucket.reset_at, time.monotonic() + delay)
+                        delay = 0.0
+            else:
+                delay = min(self.max_retry_after, 0.5 * (2 ** attempt))
+
+            self.retries += 1
+            attempt += 1
+            if delay:
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _is_global(response: httpx.Response) -> bool:
+        try:
+            return bool(response.json().get("global"))
+        except (ValueError, AttributeError):
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "rate_limited": self.rate_limited,
+            "global_rate_limited": self.global_rate_limited,
+            "retries": self.retries,
+            "known_buckets": len(self._buckets),
+            "max_concurrency": self.max_concurrency,
+            "global_rate": self.global_rate
+        }
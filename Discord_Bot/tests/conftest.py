@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Bot modules are imported as top-level modules, as discord_server.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,91 @@
+import json
+import asyncio
+
+import websockets
+
+from gateway import HEARTBEAT, IDENTIFY, RESUME, GatewayListener
+
+
+class FakeGateway:
+    """Scripted gateway: identify, one event, drop; then resume, replay and close for good"""
+
+    def __init__(self):
+        self.url = ""
+        self.connections = 0
+        self.ops = []
+        self.resume_payload = None
+
+    async def handle(self, ws):
+        self.connections += 1
+        await ws.send(json.dumps({"op": 10, "d": {"heartbeat_interval": 100}}))
+        async for raw in ws:
+            payload = json.loads(raw)
+            self.ops.append(payload["op"])
+            if payload["op"] == HEARTBEAT:
+                await ws.send(json.dumps({"op": 11}))
+            elif payload["op"] == IDENTIFY:
+                await ws.send(json.dumps({"op": 0, "t": "READY", "s": 1, "d": {
+                    "session_id": "session", "resume_gateway_url": self.url, "user": {"id": "1", "username": "bot"}
+                }}))
+                await ws.send(json.dumps({"op": 0, "t": "MESSAGE_CREATE", "s": 2, "d": {"id": "10", "channel_id": "5"}}))
+                await asyncio.sleep(0.3)
+                await ws.close(code=4000)
+            elif payload["op"] == RESUME:
+                self.resume_payload = payload["d"]
+                await ws.send(json.dumps({"op": 0, "t": "MESSAGE_DELETE", "s": 3, "d": {"id": "10", "channel_id": "5"}}))
+                await ws.send(json.dumps({"op": 0, "t": "RESUMED", "s": 4, "d": {}}))
+                await asyncio.sleep(0.1)
+                # Authentication failed: a fatal code, so the listener stops
+                await ws.close(code=4004)
+
+
+def test_identify_dispatch_resume_and_fatal_close():
+    async def scenario():
+        gateway = FakeGateway()
+        async with websockets.serve(gateway.handle, "127.0.0.1", 0) as server:
+            gateway.url = "ws://127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+            url_lookups = []
+
+            async def get_url():
+                url_lookups.append(gateway.url)
+                return gateway.url
+
+            listener = GatewayListener("token", get_url)
+            events = []
+            connected_states = []
+
+            async def record(event_type, data):
+                events.append(event_type)
+
+            listener.add_handler(record)
+            listener.add_handler(lambda event_type, data: connected_states.append(listener.connected))
+            await asyncio.wait_for(listener.run(), timeout=10)
+            return gateway, listener, events, url_lookups, connected_states
+
+    gateway, listener, events, url_lookups, connected = asyncio.run(scenario())
+    assert events == ["READY", "MESSAGE_CREATE", "MESSAGE_DELETE", "RESUMED"]
+    assert gateway.connections == 2
+    # The resume goes to resume_gateway_url with the last sequence seen
+    assert len(url_lookups) == 1
+    assert gateway.resume_payload == {"token": "token", "session_id": "session", "seq": 2}
+    assert IDENTIFY in gateway.ops and RESUME in gateway.ops
+    assert connected[:2] == [True, True]
+    assert listener.stats()["reconnects"] == 1
+    assert [event["type"] for event in listener.recent_events(event_type="MESSAGE_DELETE")] == ["MESSAGE_DELETE"]
+    assert listener.recent_events()[1]["message_id"] == "10"
+
+
+def test_handler_errors_do_not_stop_dispatch():
+    async def scenario():
+        listener = GatewayListener("token", None)
+        seen = []
+
+        def broken(event_type, data):
+            raise RuntimeError("handler bug")
+
+        listener.add_handler(broken)
+        listener.add_handler(lambda event_type, data: seen.append(event_type))
+        await listener._dispatch("GUILD_CREATE", {"id": "1"})
+        return seen, listener.events_received
+
+    assert asyncio.run(scenario()) == (["GUILD_CREATE"], 1)
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+from discord_client import DiscordClient
+from fake_discord import FakeDiscordAPI
+from message_store import MessageStore, MessageSyncer, fts_query
+
+
+async def run_against_fake(scenario, store_path, **api_options):
+    api = await FakeDiscordAPI(latency=0, jitter=0, **api_options).start()
+    client = DiscordClient("token", api.base_url, global_rate=0)
+    store = await MessageStore.open(store_path)
+    try:
+        return await scenario(await MessageSyncer.create(client, store, backfill_limit=150), api)
+    finally:
+        store.close()
+        await client.close()
+        await api.stop()
+
+
+def test_backfill_then_incremental_sync(tmp_path):
+    async def scenario(syncer, api):
+        channel_id = api.channel_ids[0]
+        backfilled = await syncer.sync_channel(channel_id)
+        api._create_message(channel_id, {"content": "release candidate ready"})
+        before = api.requests
+        added = await syncer.sync_channel(channel_id)
+        store = syncer.store
+        hits = await store.run(store.search, "candidate", [channel_id])
+        return backfilled, added, api.requests - before, hits, await store.run(store.get_cursor, channel_id), api
+
+    backfilled, added, requests, hits, cursor, api = asyncio.run(
+        run_against_fake(scenario, str(tmp_path / "messages.db"), channels=1, messages_per_channel=300)
+    )
+    assert backfilled == 150
+    assert added == 1
+    # Only messages after the cursor are fetched
+    assert requests == 1
+    assert [hit["content"] for hit in hits] == ["release candidate ready"]
+    assert cursor == api.messages[api.channel_ids[0]][-1]["id"]
+
+
+def test_synced_channels_survive_a_restart(tmp_path):
+    path = str(tmp_path / "messages.db")
+
+    async def first(syncer, api):
+        await syncer.sync_channel(api.channel_ids[1])
+
+    async def second(syncer, api):
+        return syncer.channels
+
+    asyncio.run(run_against_fake(first, path, channels=2, messages_per_channel=10))
+    channels = asyncio.run(run_against_fake(second, path, channels=2, messages_per_channel=10))
+    assert channels == {"200000000000000001"}
+
+
+def test_gateway_messages_only_stored_for_tracked_channels(tmp_path):
+    async def scenario(syncer, api):
+        tracked, other = api.channel_ids
+        await syncer.sync_channel(tracked)
+        for channel_id in (tracked, other):
+            await syncer.apply_message({**api.messages[channel_id][0], "id": "1999999999999999999", "content": "live"})
+        store = syncer.store
+        return await store.run(store.search, "live"), await store.run(store.stats)
+
+    hits, stats = asyncio.run(run_against_fake(scenario, str(tmp_path / "messages.db"), channels=2, messages_per_channel=5))
+    assert [hit["channel_id"] for hit in hits] == ["200000000000000000"]
+    assert stats["messages"] == 6
+
+
+def test_store_queries_run_off_the_calling_thread(tmp_path):
+    async def scenario():
+        store = await MessageStore.open(str(tmp_path / "messages.db"))
+        try:
+            return await store.run(lambda: threading.current_thread().name)
+        finally:
+            store.close()
+
+    assert asyncio.run(scenario()).startswith("message-store")
+
+
+def test_fts_query_treats_operators_as_words():
+    assert fts_query("deploy OR x") == '"deploy" "OR" "x"'
+    assert fts_query("") == ""
@@ -0,0 +1,67 @@
+import asyncio
+
+from discord_client import DiscordClient
+from fake_discord import FakeDiscordAPI
+from metadata_cache import MetadataCache
+
+
+async def run_against_fake(scenario, cache_ttls=None):
+    api = await FakeDiscordAPI(channels=2, messages_per_channel=0, latency=0.05, jitter=0).start()
+    client = DiscordClient("token", api.base_url, global_rate=0, cache_ttls=cache_ttls)
+    try:
+        return await scenario(client, api)
+    finally:
+        await client.close()
+        await api.stop()
+
+
+def test_concurrent_lookups_share_one_request():
+    async def scenario(client, api):
+        channels = await asyncio.gather(*(client.get_channel_info(api.channel_ids[0]) for _ in range(10)))
+        await client.get_channel_info(api.channel_ids[0])
+        return channels, api.requests, client.cache_stats()
+
+    channels, requests, stats = asyncio.run(run_against_fake(scenario))
+    assert requests == 1
+    assert all(channel["id"] == "200000000000000000" for channel in channels)
+    assert (stats["types"]["channel"]["misses"], stats["types"]["channel"]["coalesced"], stats["types"]["channel"]["hits"]) == (1, 9, 1)
+
+
+def test_expired_and_invalidated_entries_are_fetched_again():
+    async def scenario(client, api):
+        await client.get_channel_info(api.channel_ids[0])
+        await client.get_bot_user()
+        await asyncio.sleep(0.15)
+        await client.get_channel_info(api.channel_ids[0])
+        client.metadata_cache.invalidate("bot_user")
+        await client.get_bot_user()
+        return api.requests
+
+    assert asyncio.run(run_against_fake(scenario, {"channel": 0.1})) == 4
+
+
+def test_set_during_a_fetch_wins_over_the_fetched_value():
+    async def scenario():
+        cache = MetadataCache()
+        release = asyncio.Event()
+
+        async def stale():
+            await release.wait()
+            return {"name": "old"}
+
+        lookup = asyncio.ensure_future(cache.get("channel", ("1",), stale))
+        await asyncio.sleep(0)
+        cache.set("channel", ("1",), {"name": "from gateway"})
+        release.set()
+        await lookup
+        return await cache.get("channel", ("1",), stale)
+
+    assert asyncio.run(scenario()) == {"name": "from gateway"}
+
+
+def test_lru_bound_evicts_the_oldest_entry():
+    cache = MetadataCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set("channel", (key,), key)
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"]) == (2, 1)
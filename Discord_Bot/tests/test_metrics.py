@@ -0,0 +1,24 @@
+import threading
+
+from metrics import Histogram, render_samples, route_label
+
+
+def test_observations_from_several_threads_are_all_counted():
+    histogram = Histogram("test_seconds", "Test latency", (0.1, 1.0), ["route"])
+
+    def observe():
+        for _ in range(10000):
+            histogram.observe(0.05, "GET /x")
+
+    threads = [threading.Thread(target=observe) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert histogram.summary()["GET /x"]["count"] == 40000
+    assert 'test_seconds_bucket{route="GET /x",le="0.1"} 40000' in histogram.render()
+
+
+def test_route_labels_hide_ids_and_label_values_are_escaped():
+    assert route_label("get", "/channels/123/messages?limit=5") == "GET /channels/{id}/messages"
+    assert render_samples("g", "Gauge", "gauge", [({"name": 'a "b"\n'}, 1)])[-1] == 'g{name="a \\"b\\"\\n"} 1'
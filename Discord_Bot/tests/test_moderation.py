@@ -0,0 +1,61 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from discord_client import DiscordClient, snowflake_time
+from fake_discord import FakeDiscordAPI
+from moderation import BatchModerator
+
+
+async def run_against_fake(scenario, **api_options):
+    api = await FakeDiscordAPI(latency=0, jitter=0, route_limit=1000, **api_options).start()
+    client = DiscordClient("token", api.base_url, global_rate=0)
+    try:
+        return await scenario(BatchModerator(client), api)
+    finally:
+        await client.close()
+        await api.stop()
+
+
+def test_recent_messages_go_in_bulk_chunks_and_old_ones_one_by_one():
+    async def scenario(moderator, api):
+        channel_id = api.channel_ids[0]
+        ids = [message["id"] for message in api.messages[channel_id]]
+        before = api.requests
+        results = await moderator.delete_messages(channel_id, ids + ["not-a-snowflake", ids[0]])
+        return ids, results, api.requests - before, api.messages[channel_id]
+
+    ids, results, requests, remaining = asyncio.run(run_against_fake(scenario, channels=1, messages_per_channel=300))
+    cutoff = datetime.now(timezone.utc) - timedelta(days=14)
+    recent = [message_id for message_id in ids if snowflake_time(message_id) > cutoff]
+    assert 100 < len(recent) < 200
+
+    # Duplicates are dropped and results follow the input order
+    assert [result["message_id"] for result in results] == ids + ["not-a-snowflake"]
+    assert results[-1] == {"message_id": "not-a-snowflake", "success": False, "error": "Invalid message ID"}
+    assert all(result["success"] for result in results[:-1])
+    methods = Counter(result["method"] for result in results[:-1])
+    assert methods == {"bulk": len(recent), "single": len(ids) - len(recent)}
+    # Two bulk chunks (100 and the rest) plus one request per old message
+    assert requests == 2 + len(ids) - len(recent)
+    assert remaining == []
+
+
+def test_a_lone_recent_message_is_deleted_singly():
+    async def scenario(moderator, api):
+        channel_id = api.channel_ids[0]
+        message = api._create_message(channel_id, {"content": "spam"})[1]
+        return await moderator.delete_messages(channel_id, [message["id"]])
+
+    results = asyncio.run(run_against_fake(scenario, channels=1, messages_per_channel=0))
+    assert results == [{"message_id": results[0]["message_id"], "success": True, "method": "single"}]
+
+
+def test_failures_are_reported_per_target():
+    async def scenario(moderator, api):
+        return await moderator.delete_messages(api.channel_ids[0], ["1999999999999999999"])
+
+    results = asyncio.run(run_against_fake(scenario, channels=1, messages_per_channel=0))
+    assert results == [{
+        "message_id": "1999999999999999999", "success": False, "status_code": 404, "error": "Unknown Message", "method": "single"
+    }]
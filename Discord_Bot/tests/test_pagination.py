@@ -0,0 +1,53 @@
+import asyncio
+
+from discord_client import DiscordClient
+from fake_discord import FakeDiscordAPI
+
+
+async def run_against_fake(scenario, **api_options):
+    api = await FakeDiscordAPI(latency=0, jitter=0, **api_options).start()
+    client = DiscordClient("token", api.base_url, global_rate=0)
+    try:
+        return await scenario(client, api)
+    finally:
+        await client.close()
+        await api.stop()
+
+
+async def collect(iterator):
+    return [message async for message in iterator]
+
+
+def test_history_past_one_page_is_complete_and_ordered():
+    async def scenario(client, api):
+        channel_id = api.channel_ids[0]
+        newest_first = await collect(client.iter_messages(channel_id))
+        before = api.requests
+        limited = await collect(client.iter_messages(channel_id, limit=150))
+        return api.messages[channel_id], newest_first, limited, api.requests - before
+
+    history, newest_first, limited, requests = asyncio.run(run_against_fake(scenario, channels=1, messages_per_channel=250))
+    assert [message["id"] for message in newest_first] == [message["id"] for message in reversed(history)]
+    assert [message["id"] for message in limited] == [message["id"] for message in newest_first[:150]]
+    # The second page asks for the 50 messages still needed, and nothing is fetched past the limit
+    assert requests == 2
+
+
+def test_oldest_first_between_cursors():
+    async def scenario(client, api):
+        history = api.messages[api.channel_ids[0]]
+        after, before = history[20]["id"], history[230]["id"]
+        return history, await collect(client.iter_messages(api.channel_ids[0], after=after, before=before, oldest_first=True))
+
+    history, window = asyncio.run(run_against_fake(scenario, channels=1, messages_per_channel=250))
+    assert [message["id"] for message in window] == [message["id"] for message in history[21:230]]
+
+
+def test_several_channels_are_read_with_bounded_parallelism():
+    async def scenario(client, api):
+        return await collect(client.iter_messages_multi(api.channel_ids, max_parallel=2, limit=120))
+
+    messages = asyncio.run(run_against_fake(scenario, channels=3, messages_per_channel=130))
+    assert len(messages) == 360
+    # The fake gives every channel the same message ids
+    assert len({(message["channel_id"], message["id"]) for message in messages}) == 360
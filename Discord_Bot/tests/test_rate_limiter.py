@@ -0,0 +1,57 @@
+import time
+import asyncio
+
+import httpx
+
+from discord_client import DiscordClient
+from fake_discord import FakeDiscordAPI
+from rate_limiter import RateLimiter
+
+
+async def run_against_fake(scenario, client_options=None, **api_options):
+    api = await FakeDiscordAPI(latency=0, jitter=0, **api_options).start()
+    client = DiscordClient("token", api.base_url, **(client_options or {}))
+    try:
+        return await scenario(client, api)
+    finally:
+        await client.close()
+        await api.stop()
+
+
+def test_route_buckets_queue_requests_instead_of_hitting_429s():
+    async def scenario(client, api):
+        channel_id = api.channel_ids[0]
+        started = time.monotonic()
+        results = await asyncio.gather(*(client.send_message(channel_id, f"message {i}") for i in range(12)))
+        return results, time.monotonic() - started, client.rate_limit_stats(), api
+
+    results, elapsed, stats, api = asyncio.run(
+        run_against_fake(scenario, {"global_rate": 0}, channels=1, messages_per_channel=0, route_limit=5, route_window=0.3)
+    )
+    assert len({message["id"] for message in results}) == 12
+    # 12 requests through 5-request windows need at least two resets
+    assert elapsed >= 0.5
+    # Only the first window can overrun, before the bucket limits are learned
+    assert stats["rate_limited"] <= 1
+    assert api.rate_limited == stats["rate_limited"]
+
+
+def test_global_budget_allows_one_second_burst_then_paces():
+    async def scenario(client, api):
+        started = time.monotonic()
+        await asyncio.gather(*(client.get_messages(channel_id, 1) for channel_id in api.channel_ids * 3))
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run_against_fake(scenario, {"global_rate": 20}, channels=10, messages_per_channel=1))
+    # 20 requests go out at once and the remaining 10 follow at 20 per second
+    assert 0.4 <= elapsed < 1.5
+
+
+def test_retry_after_prefers_the_body_and_survives_bad_headers():
+    limiter = RateLimiter()
+    request = httpx.Request("GET", "https://discord.test/api")
+    body = httpx.Response(429, json={"retry_after": 1.5}, headers={"Retry-After": "9"}, request=request)
+    assert limiter._retry_after(body) == 1.5
+    dated = httpx.Response(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT", "X-RateLimit-Reset-After": "2.5"}, request=request)
+    assert limiter._retry_after(dated) == 2.5
+    assert limiter._retry_after(httpx.Response(429, json={"retry_after": "nan"}, request=request)) == 1.0
@@ -0,0 +1,304 @@
+"""
+Benchmark Suite
+
+Generates synthetic corpora with planted copies and paraphrases, runs them
+through `analyze_texts` end to end and through each pipeline stage on its
+own, and reports throughput, p50/p99 latency, peak RSS and detection
+precision/recall as JSON. By default texts are embedded with a
+deterministic hashing encoder, so runs are offline and reproducible; pass
+--model to benchmark a real sentence-transformers model instead.
+
+    python benchmark.py --sizes 100,500,1000 --output results.json
+    python benchmark.py --sizes 1000 --compare results.json
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+import platform
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+# Benchmarks must not read or write the persistent cache and corpus
+os.environ.setdefault("EMBEDDING_CACHE_DIR", "")
+os.environ.setdefault("CORPUS_DIR", "")
+
+import numpy as np  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+FAKE_MODEL_NAME = "fake/hashing-encoder"
+
+
+class SyntheticCorpus:
+    """Random documents over a pseudo-word vocabulary, some of them copies or paraphrases of others"""
+
+    def __init__(
+        self,
+        size: int,
+        length: int = 200,
+        copy_rate: float = 0.05,
+        paraphrase_rate: float = 0.05,
+        paraphrase_strength: float = 0.3,
+        vocabulary_size: int = 5000,
+        seed: int = 0
+    ):
+        rng = np.random.default_rng(seed)
+        syllables = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "do", "gu", "hi", "be", "fo"]
+        words = set()
+        while len(words) < vocabulary_size:
+            words.add("".join(rng.choice(syllables, size=rng.integers(2, 5))))
+        self.vocabulary = sorted(words)
+        # Every word gets a synonym; the fake encoder maps both to the same dimension
+        self.synonyms = {word: word[::-1] + "x" for word in self.vocabulary}
+        self.canonical = {synonym: word for word, synonym in self.synonyms.items()}
+
+        self.texts: List[str] = []
+        self.sources: List[int] = []
+        self.kinds: List[str] = []
+        for i in range(size):
+            roll = rng.random()
+            if i > 0 and roll < copy_rate:
+                source = int(rng.integers(0, i))
+                self._add(self.texts[source], self.sources[source], "copy")
+            elif i > 0 and roll < copy_rate + paraphrase_rate:
+                source = int(rng.integers(0, i))
+                self._add(self._paraphrase(self.texts[source], paraphrase_strength, rng), self.sources[source], "paraphrase")
+            else:
+                self._add(self._sentences(list(rng.choice(self.vocabulary, size=length))), i, "original")
+
+    def _add(self, text: str, source: int, kind: str):
+        self.texts.append(text)
+        self.sources.append(source)
+        self.kinds.append(kind)
+
+    @staticmethod
+    def _sentences(words: List[str]) -> str:
+        sentences = [" ".join(words[i:i + 15]) for i in range(0, len(words), 15)]
+        return ". ".join(sentence.capitalize() for sentence in sentences) + "."
+
+    def _paraphrase(self, text: str, strength: float, rng: np.random.Generator) -> str:
+        """Swap words for synonyms, drop some and insert random ones"""
+        words = [word.strip(".").lower() for word in text.split()]
+        result = []
+        for word in words:
+            roll = rng.random()
+            if roll < strength / 3:
+                continue
+            result.append(self.synonyms.get(word, word) if roll < strength else word)
+            if rng.random() < strength / 3:
+                result.append(str(rng.choice(self.vocabulary)))
+        return self._sentences(result)
+
+    def true_pairs(self) -> Set[Tuple[int, int]]:
+        """Every pair of documents derived from the same original"""
+        groups: Dict[int, List[int]] = {}
+        for i, source in enumerate(self.sources):
+            groups.setdefault(source, []).append(i)
+        return {(a, b) for members in groups.values() for x, a in enumerate(members) for b in members[x + 1:]}
+
+
+class HashingEncoder:
+    """Deterministic signed bag-of-words encoder standing in for a SentenceTransformer"""
+
+    def __init__(self, dim: int = 384, canonical: Optional[Dict[str, str]] = None):
+        self.dim = dim
+        self.canonical = canonical or {}
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                word = word.strip(".,;:!?")
+                digest = zlib.crc32(self.canonical.get(word, word).encode("utf-8"))
+                embeddings[i, digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        return embeddings
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+
+def peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def time_runs(fn: Callable[[], Any], repeats: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    """Latency percentiles of repeated calls (setup runs untimed before each call)"""
+    latencies = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies)
+    return {
+        "p50_seconds": float(np.percentile(latencies, 50)),
+        "p99_seconds": float(np.percentile(latencies, 99)),
+        "mean_seconds": float(latencies.mean()),
+        "min_seconds": float(latencies.min())
+    }
+
+
+def detection_quality(found: List[Dict[str, Any]], truth: Set[Tuple[int, int]]) -> Dict[str, float]:
+    predicted = {(min(p["text1_index"], p["text2_index"]), max(p["text1_index"], p["text2_index"])) for p in found}
+    hits = len(predicted & truth)
+    return {
+        "true_pairs": len(truth),
+        "predicted_pairs": len(predicted),
+        "precision": hits / len(predicted) if predicted else 1.0,
+        "recall": hits / len(truth) if truth else 1.0
+    }
+
+
+def benchmark_size(main: Any, corpus: SyntheticCorpus, model_name: str, args: argparse.Namespace) -> Dict[str, Any]:
+    texts = corpus.texts
+    n = len(texts)
+    request = main.TextComparisonRequest(
+        texts=texts,
+        model_name=model_name,
+        include_matrix=args.include_matrix,
+        detection_mode=args.detection_mode
+    )
+    # Embeddings are recomputed on every run unless --warm-cache is given
+    clear_cache = None if args.warm_cache else main.embedding_cache.clear
+    main.get_embeddings(texts[:2], model_name, False)
+
+    end_to_end = time_runs(lambda: main.analyze_texts(request, accept=None), args.repeats, clear_cache)
+    end_to_end["texts_per_second"] = n / end_to_end["p50_seconds"]
+
+    embeddings = main.get_embeddings(texts, model_name, False)
+    normalized = main.normalize_embeddings(embeddings)
+    found = main.detect_plagiarism(normalized)
+    result = {
+        "similarity_matrix": main.calculate_similarity_matrix(normalized) if args.include_matrix else None,
+        "potential_plagiarism": found,
+        "model_used": model_name,
+        "passage_matches": None
+    }
+    stages = {
+        "embedding": time_runs(lambda: main.get_embeddings(texts, model_name, False), args.repeats, clear_cache),
+        "normalize": time_runs(lambda: main.normalize_embeddings(embeddings), args.repeats),
+        "similarity_matrix": time_runs(lambda: main.calculate_similarity_matrix(normalized), args.repeats),
+        "pair_detection": time_runs(lambda: main.detect_plagiarism(normalized), args.repeats),
+        "serialize_json": time_runs(lambda: main.render_result(result, "json", "float32", n), args.repeats)
+    }
+    stages["embedding"]["texts_per_second"] = n / stages["embedding"]["p50_seconds"]
+    stages["similarity_matrix"]["pairs_per_second"] = n * (n - 1) / 2 / stages["similarity_matrix"]["p50_seconds"]
+    if args.include_matrix:
+        packed = main.calculate_similarity_matrix(normalized, packed=True)
+        binary_result = dict(result, similarity_matrix=packed)
+        stages["serialize_raw"] = time_runs(lambda: main.render_result(binary_result, "raw", "float32", n), args.repeats)
+
+    if args.detection_mode == "semantic":
+        quality = detection_quality(found, corpus.true_pairs())
+    else:
+        quality = detection_quality(main.run_analysis(request)["potential_plagiarism"], corpus.true_pairs())
+    return {
+        "texts": n,
+        "planted": {kind: corpus.kinds.count(kind) for kind in ("original", "copy", "paraphrase")},
+        "end_to_end": end_to_end,
+        "stages": stages,
+        "detection": quality,
+        "peak_rss_bytes": peak_rss_bytes()
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Human-readable p50 ratios (current / baseline) for sizes present in both runs"""
+    lines = []
+    baseline_runs = {run["texts"]: run for run in baseline["runs"]}
+    for run in current["runs"]:
+        base = baseline_runs.get(run["texts"])
+        if base is None:
+            continue
+        timings = [("end_to_end", run["end_to_end"], base["end_to_end"])]
+        timings += [(name, stats, base["stages"][name]) for name, stats in run["stages"].items() if name in base["stages"]]
+        for name, stats, base_stats in timings:
+            ratio = stats["p50_seconds"] / base_stats["p50_seconds"] if base_stats["p50_seconds"] else float("inf")
+            lines.append(f"{run['texts']:>7} {name:<18} {base_stats['p50_seconds'] * 1000:10.2f} ms -> "
+                         f"{stats['p50_seconds'] * 1000:10.2f} ms  ({ratio:.2f}x)")
+    return lines
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark the plagiarism detection pipeline on synthetic corpora")
+    parser.add_argument("--sizes", default="100,500,1000", help="comma-separated corpus sizes")
+    parser.add_argument("--length", type=int, default=200, help="words per original document")
+    parser.add_argument("--copy-rate", type=float, default=0.05, help="share of documents that are exact copies")
+    parser.add_argument("--paraphrase-rate", type=float, default=0.05, help="share of documents that are paraphrases")
+    parser.add_argument("--paraphrase-strength", type=float, default=0.3, help="share of words changed in a paraphrase")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model", default=None, help="sentence-transformers model to use instead of the fake encoder")
+    parser.add_argument("--dim", type=int, default=384, help="embedding size of the fake encoder")
+    parser.add_argument("--detection-mode", default="semantic", choices=["semantic", "lexical", "hybrid"])
+    parser.add_argument("--include-matrix", action="store_true", help="return the similarity matrix from /analyze")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the embedding cache between runs")
+    parser.add_argument("--output", default=None, help="write the JSON results to this file")
+    parser.add_argument("--compare", default=None, help="baseline JSON results to compare against")
+    args = parser.parse_args()
+
+    import main
+    from model_loader import ModelLoader
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    corpora = [
+        SyntheticCorpus(size, args.length, args.copy_rate, args.paraphrase_rate, args.paraphrase_strength, seed=args.seed)
+        for size in sizes
+    ]
+    if args.model:
+        model_name = args.model
+    else:
+        model_name = FAKE_MODEL_NAME
+        # All corpora share the synonym table because it is derived from the same seed
+        encoder = HashingEncoder(args.dim, corpora[0].canonical if corpora else None)
+        main.model_loader = ModelLoader(lambda _: encoder)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": dict(vars(args), model=model_name, threshold=main.SIMILARITY_THRESHOLD),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "runs": []
+    }
+    for corpus in corpora:
+        run = benchmark_size(main, corpus, model_name, args)
+        report["runs"].append(run)
+        print(
+            f"{run['texts']:>7} texts  e2e p50 {run['end_to_end']['p50_seconds'] * 1000:9.2f} ms  "
+            f"p99 {run['end_to_end']['p99_seconds'] * 1000:9.2f} ms  "
+            f"{run['end_to_end']['texts_per_second']:9.1f} texts/s  "
+            f"precision {run['detection']['precision']:.3f}  recall {run['detection']['recall']:.3f}",
+            file=sys.stderr
+        )
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            for line in compare(report, json.load(f)):
+                print(line, file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    for scheduler in main.schedulers.values():
+        scheduler.close()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,478 @@
+"""
+Reference Corpus
+
+Persistent store of reference documents with per-model embedding indexes
+for top-k nearest-neighbour search. Each index keeps a contiguous matrix of
+normalized embeddings for exact brute-force search and can optionally build
+an IVF (inverted file) index for approximate search over large corpora.
+"""
+
+import os
+import json
+import uuid
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from similarity import normalize_embeddings
+from quantization import STORAGE_TYPES, QuantizedMatrix
+
+# Corpora smaller than this are always searched exactly
+IVF_MIN_SIZE = 10000
+
+
+class CorpusReadOnly(Exception):
+    """Raised when a read-only corpus is asked to change"""
+
+
+def _atomic_write_json(path: str, payload: Any):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class IVFIndex:
+    """Inverted file index: spherical k-means centroids with one posting list per centroid"""
+
+    def __init__(self, nlist: int):
+        self.nlist = nlist
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[List[int]] = []
+        self.trained_size = 0
+
+    def _assign(self, vectors: np.ndarray, block_size: int = 4096) -> np.ndarray:
+        assignments = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], block_size):
+            block = vectors[start:start + block_size]
+            assignments[start:start + block.shape[0]] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def train(self, vectors: np.ndarray, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        """Fit centroids on (a sample of) the vectors and rebuild all posting lists"""
+        rng = np.random.default_rng(seed)
+        n = vectors.shape[0]
+        nlist = max(1, min(self.nlist, n))
+        sample = vectors if n <= sample_size else vectors[rng.choice(n, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+        for _ in range(iterations):
+            self.centroids = centroids
+            assignments = self._assign(sample)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty clusters with random points so every list stays useful
+                sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()), replace=False)]
+            centroids = normalize_embeddings(sums)
+        self.centroids = centroids
+        self.lists = [[] for _ in range(nlist)]
+        self.add(np.arange(n), vectors)
+        self.trained_size = n
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray):
+        for row, cluster in zip(rows.tolist(), self._assign(vectors).tolist()):
+            self.lists[cluster].append(row)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Rows in the nprobe posting lists closest to the query"""
+        nprobe = max(1, min(nprobe, len(self.lists)))
+        probes = _top_k(self.centroids @ query, nprobe)
+        rows = [self.lists[p] for p in probes.tolist() if self.lists[p]]
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.asarray(r, dtype=np.int64) for r in rows])
+
+
+class CorpusIndex:
+    """
+    Normalized embedding matrix for one model, addressed by document id.
+
+    With a quantized storage type ("float16" or "int8") searches run on the
+    compact copy; the float32 matrix is then memory-mapped from disk (when
+    the index has a directory) and only read to re-rank the best candidates.
+    A read_only index maps its float32 matrix read-only whatever the storage,
+    so processes serving the same directory share its pages.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        storage: str = "float32",
+        rerank: bool = True,
+        rerank_factor: int = 4,
+        read_only: bool = False
+    ):
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown storage type: {storage}")
+        self.directory = directory
+        self.read_only = read_only
+        self.storage = storage
+        self.rerank = rerank
+        self.rerank_factor = max(1, rerank_factor)
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.matrix: Optional[np.ndarray] = None
+        self.quantized: Optional[QuantizedMatrix] = None
+        self.ivf: Optional[IVFIndex] = None
+        if directory:
+            self._load()
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    @property
+    def _memory_mapped(self) -> bool:
+        return bool(self.directory) and self.storage != "float32"
+
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, "vectors.npy")
+
+    def _load(self):
+        vectors_path = self._vectors_path()
+        ids_path = os.path.join(self.directory, "ids.json")
+        if not os.path.exists(vectors_path) or not os.path.exists(ids_path):
+            return
+        with open(ids_path, "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        # The file may hold spare capacity rows; only the first len(ids) are live
+        if self.read_only:
+            mmap_mode = "r"
+        else:
+            mmap_mode = "r+" if self._memory_mapped else None
+        self.matrix = np.load(vectors_path, mmap_mode=mmap_mode)
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        if self.storage != "float32":
+            self.quantized = QuantizedMatrix.from_vectors(self.vectors(), self.storage)
+
+    def save(self):
+        if not self.directory or self.read_only:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if isinstance(self.matrix, np.memmap):
+            # Rows were written in place; only the id list needs rewriting
+            self.matrix.flush()
+        else:
+            vectors_path = self._vectors_path()
+            tmp_path = vectors_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, self.vectors())
+            os.replace(tmp_path, vectors_path)
+        _atomic_write_json(os.path.join(self.directory, "ids.json"), self.ids)
+
+    def vectors(self) -> np.ndarray:
+        """The live rows of the float32 embedding matrix"""
+        if self.matrix is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self.matrix[:self.size]
+
+    def _allocate(self, capacity: int, dim: int):
+        """Replace the float32 matrix with a larger one, keeping the live rows"""
+        live = self.size if self.matrix is not None and self.matrix.shape[1] == dim else 0
+        if self._memory_mapped:
+            os.makedirs(self.directory, exist_ok=True)
+            vectors_path = self._vectors_path()
+            tmp_path = vectors_path + ".grow"
+            grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(capacity, dim))
+            for start in range(0, live, 8192):
+                grown[start:min(start + 8192, live)] = self.matrix[start:min(start + 8192, live)]
+            grown.flush()
+            os.replace(tmp_path, vectors_path)
+        else:
+            grown = np.empty((capacity, dim), dtype=np.float32)
+            if live:
+                grown[:live] = self.matrix[:live]
+        self.matrix = grown
+        if self.storage != "float32" and (self.quantized is None or self.quantized.dim != dim):
+            self.quantized = QuantizedMatrix(dim, self.storage)
+
+    def add(self, doc_ids: List[str], embeddings: np.ndarray):
+        normalized = normalize_embeddings(embeddings)
+        positions = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        new_ids = [doc_id for doc_id in positions if doc_id not in self.rows]
+        for doc_id, i in positions.items():
+            if doc_id in self.rows:
+                self.matrix[self.rows[doc_id]] = normalized[i]
+                if self.quantized is not None:
+                    self.quantized.set_row(self.rows[doc_id], normalized[i])
+        if not new_ids:
+            return
+        new_vectors = normalized[[positions[doc_id] for doc_id in new_ids]]
+        start = self.size
+        needed = start + len(new_ids)
+        if self.matrix is None or self.matrix.shape[1] != new_vectors.shape[1]:
+            self._allocate(max(needed, 64), new_vectors.shape[1])
+        elif needed > self.matrix.shape[0]:
+            # Grow geometrically so repeated small adds stay amortized O(1)
+            self._allocate(max(needed, self.matrix.shape[0] * 2), self.matrix.shape[1])
+        self.matrix[start:needed] = new_vectors
+        if self.quantized is not None:
+            self.quantized.append(new_vectors)
+        for offset, doc_id in enumerate(new_ids):
+            self.rows[doc_id] = start + offset
+        self.ids.extend(new_ids)
+        if self.ivf is not None:
+            self.ivf.add(np.arange(start, needed), new_vectors)
+
+    def remove(self, doc_ids: List[str]) -> bool:
+        """Drop documents from the index; returns whether any were present"""
+        removed = False
+        for doc_id in doc_ids:
+            row = self.rows.pop(doc_id, None)
+            if row is None:
+                continue
+            last = self.size - 1
+            if row != last:
+                # Move the last row into the hole to keep the matrix contiguous
+                moved_id = self.ids[last]
+                self.matrix[row] = self.matrix[last]
+                if self.quantized is not None:
+                    self.quantized.move_row(last, row)
+                self.ids[row] = moved_id
+                self.rows[moved_id] = row
+            self.ids.pop()
+            if self.quantized is not None:
+                self.quantized.pop()
+            removed = True
+        if removed:
+            # Row numbers changed, so the posting lists are rebuilt on next use
+            self.ivf = None
+        return removed
+
+    def _score(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Similarities of normalized queries to all rows (or `rows`), on the search representation"""
+        if self.quantized is not None:
+            return self.quantized.dot(queries, rows)
+        vectors = self.vectors() if rows is None else self.vectors()[rows]
+        return queries @ vectors.T
+
+    def memory_usage(self) -> Dict[str, Any]:
+        return {
+            "storage": self.storage,
+            "documents": self.size,
+            "search_bytes": self.quantized.nbytes if self.quantized is not None else self.size * 4 * (
+                self.matrix.shape[1] if self.matrix is not None else 0
+            ),
+            "float32_memory_mapped": isinstance(self.matrix, np.memmap)
+        }
+
+    def _ensure_ivf(self, nlist: Optional[int]):
+        n = self.size
+        if self.ivf is not None and nlist in (None, self.ivf.nlist) and n <= 2 * self.ivf.trained_size:
+            return
+        # Retrain once the corpus has doubled since the centroids were fitted
+        self.ivf = IVFIndex(nlist or max(1, int(4 * np.sqrt(n))))
+        self.ivf.train(self.vectors())
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int,
+        threshold: float,
+        approximate: bool = False,
+        nprobe: int = 8,
+        nlist: Optional[int] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Return, for each query, up to top_k (doc_id, similarity) pairs at or above threshold"""
+        results: List[List[Tuple[str, float]]] = []
+        if self.size == 0:
+            return [[] for _ in range(len(queries))]
+        normalized = normalize_embeddings(queries)
+        use_ivf = approximate and self.size >= IVF_MIN_SIZE
+        rerank = self.quantized is not None and self.rerank
+        if use_ivf:
+            self._ensure_ivf(nlist)
+        else:
+            # Exact search scores every query against the whole matrix in one pass
+            all_scores = self._score(normalized)
+        for q, query in enumerate(normalized):
+            if use_ivf:
+                rows = self.ivf.candidates(query, nprobe)
+                scores = self._score(query[None, :], rows)[0]
+            else:
+                rows = None
+                scores = all_scores[q]
+            best = _top_k(scores, top_k * self.rerank_factor if rerank else top_k)
+            matches = rows[best] if rows is not None else best
+            top_scores = scores[best]
+            if rerank:
+                # Re-score the shortlist with the float32 vectors (sorted rows keep memmap reads sequential)
+                matches = np.sort(matches)
+                exact = self.matrix[matches] @ query
+                best = _top_k(exact, top_k)
+                matches, top_scores = matches[best], exact[best]
+            keep = top_scores >= threshold
+            results.append([
+                (self.ids[row], float(score))
+                for row, score in zip(matches[keep].tolist(), top_scores[keep].tolist())
+            ])
+        return results
+
+
+class Corpus:
+    """
+    Reference documents plus lazily synchronized per-model embedding indexes.
+
+    A read_only corpus serves the documents and indexes found on disk as they
+    are: it rejects changes and does not index documents for new models.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        storage: str = "float32",
+        rerank: bool = True,
+        read_only: bool = False
+    ):
+        self.directory = directory or None
+        self.read_only = read_only
+        self.storage = storage
+        self.rerank = rerank
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.indexes: Dict[str, CorpusIndex] = {}
+        self._lock = threading.Lock()
+        if self.directory:
+            documents_path = os.path.join(self.directory, "documents.json")
+            if os.path.exists(documents_path):
+                with open(documents_path, "r", encoding="utf-8") as f:
+                    self.documents = json.load(f)
+
+    def _save_documents(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        _atomic_write_json(os.path.join(self.directory, "documents.json"), self.documents)
+
+    def _index(self, model_key: str) -> CorpusIndex:
+        index = self.indexes.get(model_key)
+        if index is None:
+            directory = None
+            if self.directory:
+                directory = os.path.join(self.directory, "indexes", model_key.replace("/", "__").replace(":", "_"))
+            index = CorpusIndex(directory, storage=self.storage, rerank=self.rerank, read_only=self.read_only)
+            self.indexes[model_key] = index
+        return index
+
+    def _remove_from_indexes(self, doc_ids: List[str]):
+        """Drop documents from every index, including persisted ones not loaded since startup"""
+        indexes = list(self.indexes.values())
+        root = os.path.join(self.directory, "indexes") if self.directory else None
+        if root and os.path.isdir(root):
+            loaded = {index.directory for index in indexes}
+            # An unloaded index would otherwise keep the old rows and be trusted by _sync later
+            indexes += [
+                CorpusIndex(directory, storage=self.storage, rerank=self.rerank)
+                for directory in (os.path.join(root, name) for name in sorted(os.listdir(root)))
+                if os.path.isdir(directory) and directory not in loaded
+            ]
+        for index in indexes:
+            if index.remove(doc_ids):
+                index.save()
+
+    def _sync(self, model_key: str, embed_fn: Callable[[List[str]], np.ndarray]) -> CorpusIndex:
+        """Bring a model's index in line with the stored documents"""
+        index = self._index(model_key)
+        if self.read_only:
+            return index
+        stale = [doc_id for doc_id in index.ids if doc_id not in self.documents]
+        missing = [doc_id for doc_id in self.documents if doc_id not in index.rows]
+        if stale:
+            index.remove(stale)
+        if missing:
+            index.add(missing, embed_fn([self.documents[doc_id]["text"] for doc_id in missing]))
+        if stale or missing:
+            index.save()
+        return index
+
+    def add_documents(
+        self,
+        documents: List[Dict[str, Any]],
+        model_key: str,
+        embed_fn: Callable[[List[str]], np.ndarray]
+    ) -> List[str]:
+        """Store documents and index them for model_key; returns their ids"""
+        if self.read_only:
+            raise CorpusReadOnly("The corpus is read-only")
+        with self._lock:
+            doc_ids = []
+            replaced = []
+            for document in documents:
+                doc_id = document.get("id") or uuid.uuid4().hex
+                if doc_id in self.documents:
+                    replaced.append(doc_id)
+                self.documents[doc_id] = {"text": document["text"], "metadata": document.get("metadata") or {}}
+                doc_ids.append(doc_id)
+            self._save_documents()
+            # Replaced documents need fresh embeddings in every index
+            if replaced:
+                self._remove_from_indexes(replaced)
+            self._sync(model_key, embed_fn)
+            return doc_ids
+
+    def remove_document(self, doc_id: str) -> bool:
+        if self.read_only:
+            raise CorpusReadOnly("The corpus is read-only")
+        with self._lock:
+            if self.documents.pop(doc_id, None) is None:
+                return False
+            self._save_documents()
+            self._remove_from_indexes([doc_id])
+            return True
+
+    def list_documents(self, offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+        with self._lock:
+            doc_ids = list(self.documents.keys())
+            page = doc_ids[offset:offset + limit]
+            return {
+                "total": len(doc_ids),
+                "documents": [
+                    {
+                        "id": doc_id,
+                        "length": len(self.documents[doc_id]["text"]),
+                        "metadata": self.documents[doc_id]["metadata"]
+                    }
+                    for doc_id in page
+                ]
+            }
+
+    def query(
+        self,
+        embeddings: np.ndarray,
+        model_key: str,
+        embed_fn: Callable[[List[str]], np.ndarray],
+        top_k: int,
+        threshold: float,
+        approximate: bool = False,
+        nprobe: int = 8
+    ) -> List[List[Dict[str, Any]]]:
+        """Top-k most similar stored documents for each query embedding"""
+        with self._lock:
+            index = self._sync(model_key, embed_fn)
+            hits = index.search(embeddings, top_k, threshold, approximate=approximate, nprobe=nprobe)
+            return [
+                [
+                    {"document_id": doc_id, "similarity": similarity, "metadata": self.documents[doc_id]["metadata"]}
+                    for doc_id, similarity in query_hits
+                    if doc_id in self.documents
+                ]
+                for query_hits in hits
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self.documents),
+                "read_only": self.read_only,
+                "indexes": {model_key: index.memory_usage() for model_key, index in self.indexes.items()}
+            }
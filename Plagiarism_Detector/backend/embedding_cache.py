@@ -0,0 +1,352 @@
+"""
+Embedding Cache
+
+Content-addressed cache for text embeddings. Entries are keyed by
+(model name, SHA-256 of the preprocessed text) and live in two tiers:
+a bounded in-memory LRU and an optional on-disk store made of a
+memory-mapped float32 matrix plus a JSON index, which survives restarts.
+The index is written in batches rather than on every store, and always
+before an evicted row is reused, so a crash can lose recent entries but
+never map a key to another text's vector. Rows a crash left outside both
+the index and the free list are reclaimed when the store is loaded.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from quantization import STORAGE_TYPES, quantize_int8, dequantize_int8
+
+
+def text_hash(text: str) -> str:
+    """Return the content hash used as the cache key for a text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _model_dirname(model_name: str) -> str:
+    """Turn a model name into a filesystem-safe directory name"""
+    return model_name.replace("/", "__").replace(":", "_")
+
+
+class _DiskStore:
+    """On-disk tier for a single model: a float32 memmap and an LRU-ordered index"""
+
+    def __init__(self, directory: str, max_entries: int, read_only: bool = False):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.read_only = read_only
+        self.data_path = os.path.join(directory, "embeddings.f32")
+        self.index_path = os.path.join(directory, "index.json")
+        self.dim: Optional[int] = None
+        self.capacity = 0
+        self.index: "OrderedDict[str, int]" = OrderedDict()
+        self.free_rows: List[int] = []
+        self.matrix: Optional[np.memmap] = None
+        # Entries added since the index was last written
+        self.dirty = 0
+        self.last_flush = time.monotonic()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path) or not os.path.exists(self.data_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dim = int(meta["dim"])
+            self.capacity = int(meta["capacity"])
+            self.index = OrderedDict((key, int(row)) for key, row in meta["entries"])
+            self.free_rows = [int(row) for row in meta.get("free_rows", [])]
+            # The file may have grown past the recorded capacity before a crash
+            self.capacity = max(self.capacity, os.path.getsize(self.data_path) // (self.dim * 4))
+            used = set(self.index.values()).union(self.free_rows)
+            # Rows handed out after the last flush belong to no entry; put them back on the free list
+            self.free_rows.extend(row for row in range(self.capacity - 1, -1, -1) if row not in used)
+            mode = "r" if self.read_only else "r+"
+            self.matrix = np.memmap(self.data_path, dtype=np.float32, mode=mode, shape=(self.capacity, self.dim))
+        except (OSError, ValueError, KeyError):
+            # A corrupt or partially written store is discarded rather than trusted
+            self.dim = None
+            self.capacity = 0
+            self.index = OrderedDict()
+            self.free_rows = []
+            self.matrix = None
+
+    def _grow(self, min_capacity: int):
+        new_capacity = max(min_capacity, self.capacity * 2, 1024)
+        new_capacity = min(new_capacity, self.max_entries)
+        if self.matrix is not None:
+            self.matrix.flush()
+            del self.matrix
+        os.makedirs(self.directory, exist_ok=True)
+        mode = "r+" if os.path.exists(self.data_path) else "w+"
+        if mode == "r+":
+            # Extend the backing file in place; existing rows keep their offsets
+            with open(self.data_path, "r+b") as f:
+                f.truncate(new_capacity * self.dim * 4)
+        self.matrix = np.memmap(self.data_path, dtype=np.float32, mode=mode, shape=(new_capacity, self.dim))
+        self.free_rows.extend(range(new_capacity - 1, self.capacity - 1, -1))
+        self.capacity = new_capacity
+        # Record the new capacity right away so the index always describes the whole file
+        self.flush()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row = self.index.get(key)
+        if row is None:
+            return None
+        self.index.move_to_end(key)
+        return np.array(self.matrix[row])
+
+    def put(self, key: str, vector: np.ndarray) -> int:
+        """Store a vector, returning how many entries were evicted to make room"""
+        if self.dim is None:
+            self.dim = int(vector.shape[0])
+        if vector.shape[0] != self.dim:
+            # Dimension mismatch means the model changed under the same name; start over
+            self.clear()
+            self.dim = int(vector.shape[0])
+        evicted = 0
+        if key in self.index:
+            row = self.index[key]
+            self.index.move_to_end(key)
+        else:
+            if not self.free_rows:
+                if self.capacity < self.max_entries:
+                    self._grow(self.capacity + 1)
+                else:
+                    evicted = self._reclaim()
+            row = self.free_rows.pop()
+            self.index[key] = row
+            self.dirty += 1
+        self.matrix[row] = vector
+        return evicted
+
+    def _reclaim(self) -> int:
+        """Evict a batch of the oldest entries and persist the index before their rows are reused"""
+        count = min(len(self.index), max(1, self.max_entries // 100))
+        for _ in range(count):
+            _, row = self.index.popitem(last=False)
+            self.free_rows.append(row)
+        # On disk the old keys still point at these rows; drop them there before overwriting
+        self.flush()
+        return count
+
+    def flush(self):
+        if self.matrix is None or self.read_only:
+            return
+        self.matrix.flush()
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "dim": self.dim,
+                "capacity": self.capacity,
+                "entries": list(self.index.items()),
+                "free_rows": self.free_rows,
+            }, f)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = 0
+        self.last_flush = time.monotonic()
+
+    def clear(self):
+        if self.matrix is not None:
+            del self.matrix
+        self.matrix = None
+        self.dim = None
+        self.capacity = 0
+        self.index = OrderedDict()
+        self.free_rows = []
+        for path in (self.data_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+class EmbeddingCache:
+    """
+    Two-tier (memory LRU + memory-mapped disk) embedding cache shared by all models.
+
+    memory_dtype selects how the in-memory tier stores vectors: float32, or
+    float16 / int8 (with a per-vector scale) to fit more entries in the
+    same memory. The disk tier always keeps float32.
+
+    With disk_read_only the disk tier is only read: several worker processes
+    can then map the same files and share their pages, while new embeddings
+    stay in each process's memory tier.
+
+    The disk index is written once flush_every new entries or flush_interval
+    seconds have accumulated; call flush() at shutdown to persist the rest.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        memory_size: int = 10000,
+        disk_size: int = 100000,
+        memory_dtype: str = "float32",
+        disk_read_only: bool = False,
+        flush_every: int = 1000,
+        flush_interval: float = 30.0
+    ):
+        if memory_dtype not in STORAGE_TYPES:
+            raise ValueError(f"Unknown memory dtype: {memory_dtype}")
+        self.cache_dir = cache_dir or None
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.memory_dtype = memory_dtype
+        self.disk_read_only = disk_read_only
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._memory: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        self._disk: Dict[str, _DiskStore] = {}
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _disk_store(self, model_name: str) -> Optional[_DiskStore]:
+        if not self.cache_dir or self.disk_size <= 0:
+            return None
+        store = self._disk.get(model_name)
+        if store is None:
+            store = _DiskStore(
+                os.path.join(self.cache_dir, _model_dirname(model_name)), self.disk_size, read_only=self.disk_read_only
+            )
+            self._disk[model_name] = store
+        return store
+
+    def _encode(self, vector: np.ndarray) -> Any:
+        if self.memory_dtype == "int8":
+            codes, scales = quantize_int8(vector.reshape(1, -1))
+            return codes[0], scales[0]
+        if self.memory_dtype == "float16":
+            return vector.astype(np.float16)
+        return vector
+
+    def _decode(self, stored: Any) -> np.ndarray:
+        if self.memory_dtype == "int8":
+            codes, scale = stored
+            return dequantize_int8(codes.reshape(1, -1), np.array([scale], dtype=np.float32))[0]
+        return stored.astype(np.float32, copy=False)
+
+    def _remember(self, key: Tuple[str, str], vector: np.ndarray):
+        if self.memory_size <= 0:
+            return
+        self._memory[key] = self._encode(vector)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """Look up a single preprocessed text, checking memory then disk"""
+        key = (model_name, text_hash(text))
+        with self._lock:
+            return self._get_locked(key)
+
+    def _get_locked(self, key: Tuple[str, str]) -> Optional[np.ndarray]:
+        stored = self._memory.get(key)
+        if stored is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return self._decode(stored)
+        store = self._disk_store(key[0])
+        if store is not None:
+            vector = store.get(key[1])
+            if vector is not None:
+                self.disk_hits += 1
+                self._remember(key, vector)
+                return vector
+        self.misses += 1
+        return None
+
+    def put_many(self, model_name: str, texts: List[str], embeddings: np.ndarray):
+        """Store embeddings for preprocessed texts in both tiers"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            store = None if self.disk_read_only else self._disk_store(model_name)
+            for text, vector in zip(texts, embeddings):
+                digest = text_hash(text)
+                self._remember((model_name, digest), vector)
+                if store is not None:
+                    self.evictions += store.put(digest, vector)
+            if store is not None and store.dirty and (
+                store.dirty >= self.flush_every or time.monotonic() - store.last_flush >= self.flush_interval
+            ):
+                store.flush()
+
+    def flush(self):
+        """Write every disk store's pending entries to its index"""
+        with self._lock:
+            if self.disk_read_only:
+                return
+            for store in self._disk.values():
+                if store.dirty:
+                    store.flush()
+
+    def get_or_compute(
+        self,
+        model_name: str,
+        texts: List[str],
+        compute_fn: Callable[[List[str]], np.ndarray]
+    ) -> np.ndarray:
+        """Return embeddings for preprocessed texts, calling compute_fn only for unseen ones"""
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: "OrderedDict[str, List[int]]" = OrderedDict()
+        with self._lock:
+            for i, text in enumerate(texts):
+                if text in missing:
+                    # Duplicate of a text already queued for computation
+                    missing[text].append(i)
+                    continue
+                vector = self._get_locked((model_name, text_hash(text)))
+                if vector is None:
+                    missing[text] = [i]
+                else:
+                    results[i] = vector
+        if missing:
+            missing_texts = list(missing.keys())
+            computed = np.asarray(compute_fn(missing_texts), dtype=np.float32)
+            self.put_many(model_name, missing_texts, computed)
+            for vector, positions in zip(computed, missing.values()):
+                for i in positions:
+                    results[i] = vector
+        return np.vstack(results).astype(np.float32, copy=False)
+
+    def clear(self):
+        """Drop every cached embedding from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if not self.disk_read_only:
+                # Shared read-only files belong to whoever wrote them; only the handles are dropped
+                for store in self._disk.values():
+                    store.clear()
+            self._disk.clear()
+            self.memory_hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, object]:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_size_limit": self.memory_size,
+                "memory_dtype": self.memory_dtype,
+                "disk_entries": {name: len(store) for name, store in self._disk.items()},
+                "disk_size_limit": self.disk_size if self.cache_dir else 0,
+                "disk_read_only": self.disk_read_only,
+            }
@@ -0,0 +1,128 @@
+"""
+Inference Scheduler
+
+Serves encode requests for one SentenceTransformer from a single worker
+thread. Texts from concurrent requests are gathered into micro-batches
+(bounded by a maximum batch size and a maximum wait time), encoded with one
+model.encode call, and each caller receives its own slice of the result.
+"""
+
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_STOP = object()
+
+
+class InferenceScheduler:
+    """Micro-batching front end for a single sentence-transformers model"""
+
+    def __init__(self, model: Any, max_batch_size: int = 64, max_wait_ms: float = 5.0, name: str = ""):
+        self.model = model
+        self.name = name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.texts_encoded = 0
+        self.largest_batch = 0
+        self.batch_size_counts: Dict[int, int] = {}
+        self.encode_seconds = 0.0
+        self._worker = threading.Thread(target=self._run, name=f"inference-{name or id(self)}", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queue texts for encoding; the future resolves to their embeddings"""
+        future: Future = Future()
+        if not texts:
+            future.set_result(np.empty((0, 0), dtype=np.float32))
+            return future
+        self._queue.put((list(texts), future))
+        return future
+
+    def encode(self, texts: List[str], timeout: Optional[float] = None) -> np.ndarray:
+        """Blocking encode that shares a batch with concurrent callers"""
+        return self.submit(texts).result(timeout)
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._worker.join(timeout=5)
+
+    def _collect(self, first: Tuple[List[str], Future]) -> Tuple[List[Tuple[List[str], Future]], bool]:
+        """Gather queued requests behind `first` until the batch is full or the wait expires"""
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            if size + len(item[0]) > self.max_batch_size:
+                # Would overflow: run it at the head of the next batch instead
+                self._run_batch(batch)
+                batch, size = [item], len(item[0])
+                deadline = time.monotonic() + self.max_wait
+                continue
+            batch.append(item)
+            size += len(item[0])
+        return batch, False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch, stop = self._collect(item)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch: List[Tuple[List[str], Future]]):
+        batch = [(texts, future) for texts, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        started = time.perf_counter()
+        try:
+            embeddings = np.asarray(self.model.encode(texts, batch_size=min(len(texts), self.max_batch_size)))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - started
+        offset = 0
+        for request_texts, future in batch:
+            future.set_result(embeddings[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+        with self._stats_lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.texts_encoded += len(texts)
+            self.largest_batch = max(self.largest_batch, len(texts))
+            self.batch_size_counts[len(texts)] = self.batch_size_counts.get(len(texts), 0) + 1
+            self.encode_seconds += elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "requests": self.requests,
+                "batches": self.batches,
+                "texts_encoded": self.texts_encoded,
+                "mean_batch_size": self.texts_encoded / self.batches if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+                "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+                "encode_seconds": self.encode_seconds,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0
+            }
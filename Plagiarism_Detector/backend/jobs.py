@@ -0,0 +1,242 @@
+"""
+Analysis Jobs
+
+Background execution of large comparison batches. A job embeds its texts in
+chunks, compares them block by block, and publishes every detected pair as
+soon as its block is done, so clients can poll progress or stream pairs
+instead of holding one HTTP request open for the whole analysis. Finished
+results are kept as NumPy arrays and serialized only when they are fetched.
+"""
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from similarity import normalize_embeddings, iter_similar_pairs, full_similarity_matrix
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+# Rough size of one pair dict with its int and float values
+PAIR_BYTES = 300
+
+
+class JobCancelled(Exception):
+    """Raised inside a job runner when the job has been cancelled"""
+
+
+class JobLimitExceeded(Exception):
+    """Raised when too many jobs are already queued"""
+
+
+class Job:
+    """State, progress and detected pairs of one analysis job"""
+
+    def __init__(self, total_texts: int):
+        self.id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.total_texts = total_texts
+        self.texts_embedded = 0
+        self.total_blocks = 0
+        self.blocks_compared = 0
+        self.pairs: List[Dict[str, Any]] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self._cancelled = threading.Event()
+        self._changed = threading.Condition()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    def update(self, **fields):
+        """Set progress fields and wake up any streaming readers"""
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self._changed.notify_all()
+
+    def add_pairs(self, pairs: List[Dict[str, Any]]):
+        with self._changed:
+            self.pairs.extend(pairs)
+            self.blocks_compared += 1
+            self._changed.notify_all()
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._changed:
+            if self.status == QUEUED:
+                self.status = CANCELLED
+                self.finished_at = time.time()
+            self._changed.notify_all()
+
+    def iter_pairs(self, heartbeat: float = 15.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Yield pairs as they are detected until the job finishes. None is
+        yielded after `heartbeat` seconds without news so streams stay alive.
+        """
+        sent = 0
+        while True:
+            timed_out = False
+            with self._changed:
+                if sent == len(self.pairs) and self.status not in FINISHED_STATES:
+                    timed_out = not self._changed.wait(heartbeat)
+                pending = self.pairs[sent:]
+                finished = self.status in FINISHED_STATES
+            if timed_out and not pending:
+                yield None
+            for pair in pending:
+                yield pair
+            sent += len(pending)
+            if finished and sent == len(self.pairs):
+                return
+
+    def retained_bytes(self) -> int:
+        """Approximate memory held by the pairs and the similarity matrix"""
+        with self._changed:
+            matrix = (self.result or {}).get("similarity_matrix")
+            return len(self.pairs) * PAIR_BYTES + (matrix.nbytes if isinstance(matrix, np.ndarray) else 0)
+
+    def progress(self) -> Dict[str, Any]:
+        with self._changed:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "error": self.error,
+                "texts_embedded": self.texts_embedded,
+                "total_texts": self.total_texts,
+                "blocks_compared": self.blocks_compared,
+                "total_blocks": self.total_blocks,
+                "pairs_found": len(self.pairs),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at
+            }
+
+
+def run_comparison(
+    job: Job,
+    texts: List[str],
+    embed_fn: Callable[[List[str]], np.ndarray],
+    threshold: float,
+    block_size: int,
+    include_matrix: bool,
+    embed_chunk_size: int = 256
+) -> Dict[str, Any]:
+    """Embed texts in chunks and publish above-threshold pairs block by block; the matrix stays a float32 array"""
+    chunks = []
+    for start in range(0, len(texts), embed_chunk_size):
+        job.check_cancelled()
+        chunks.append(np.asarray(embed_fn(texts[start:start + embed_chunk_size]), dtype=np.float32))
+        job.update(texts_embedded=min(start + embed_chunk_size, len(texts)))
+    normalized = normalize_embeddings(np.vstack(chunks))
+    job.update(total_blocks=-(-len(texts) // max(1, block_size)))
+
+    for rows, cols, sims in iter_similar_pairs(normalized, threshold, block_size):
+        job.check_cancelled()
+        job.add_pairs([
+            {"text1_index": i, "text2_index": j, "similarity": similarity}
+            for i, j, similarity in zip(rows.tolist(), cols.tolist(), sims.tolist())
+        ])
+
+    job.check_cancelled()
+    return {
+        "similarity_matrix": full_similarity_matrix(normalized, block_size) if include_matrix else None,
+        "potential_plagiarism": list(job.pairs)
+    }
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded worker pool and keeps recent finished jobs around,
+    dropping the oldest once there are more than max_finished_jobs of them or
+    their results hold more than max_finished_bytes.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_jobs: int = 2,
+        max_queued_jobs: int = 16,
+        max_finished_jobs: int = 100,
+        max_finished_bytes: int = 512 * 1024 * 1024
+    ):
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_queued_jobs = max_queued_jobs
+        self.max_finished_jobs = max_finished_jobs
+        self.max_finished_bytes = max_finished_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="analysis-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, total_texts: int, runner: Callable[[Job], Dict[str, Any]]) -> Job:
+        """Queue runner(job); its return value becomes the job result"""
+        with self._lock:
+            waiting = sum(1 for job in self._jobs.values() if job.status == QUEUED)
+            if waiting >= self.max_queued_jobs:
+                raise JobLimitExceeded(f"Too many queued jobs (limit {self.max_queued_jobs})")
+            job = Job(total_texts)
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, runner)
+        return job
+
+    def _run(self, job: Job, runner: Callable[[Job], Dict[str, Any]]):
+        if job.cancelled:
+            return
+        job.update(status=RUNNING, started_at=time.time())
+        try:
+            result = runner(job)
+            job.update(status=COMPLETED, result=result, finished_at=time.time())
+        except JobCancelled:
+            job.update(status=CANCELLED, finished_at=time.time())
+        except Exception as e:
+            job.update(status=FAILED, error=str(getattr(e, "detail", e)), finished_at=time.time())
+        with self._lock:
+            self._prune()
+
+    def _prune(self):
+        finished = [(job_id, job.retained_bytes()) for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        count, retained = len(finished), sum(size for _, size in finished)
+        for job_id, size in finished:
+            if count <= self.max_finished_jobs and retained <= self.max_finished_bytes:
+                break
+            del self._jobs[job_id]
+            count -= 1
+            retained -= size
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.progress() for job in jobs]
+
+    def shutdown(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel()
+        self._executor.shutdown(wait=False)
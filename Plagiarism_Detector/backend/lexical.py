@@ -0,0 +1,167 @@
+"""
+Lexical Pre-Filter
+
+MinHash signatures over word shingles plus LSH banding. Candidate pairs of
+near-duplicate texts are found in roughly linear time, so verbatim copying
+can be flagged without a transformer, or used to limit which pairs the
+embedding comparison has to look at.
+"""
+
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from embedding_cache import text_hash
+
+# Prime just above 2**32; with 32-bit a and x, a * x still fits in uint64
+_PRIME = np.uint64(4294967311)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+def shingle_hashes(text: str, shingle_size: int = 3) -> np.ndarray:
+    """32-bit hashes of the word shingles of a preprocessed text"""
+    words = text.lower().split()
+    if len(words) < shingle_size:
+        # Too short for word shingles: fall back to character shingles
+        joined = " ".join(words)
+        shingles = {joined[i:i + 4] for i in range(max(1, len(joined) - 3))}
+    else:
+        shingles = {" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+class MinHashLSH:
+    """MinHash signature generator with a per-text signature cache and LSH banding"""
+
+    def __init__(
+        self,
+        num_perm: int = 128,
+        bands: int = 32,
+        shingle_size: int = 3,
+        cache_size: int = 50000,
+        seed: int = 1
+    ):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+        self.cache_size = cache_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2**32, size=num_perm, dtype=np.uint64)
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def approximate_threshold(self) -> float:
+        """Jaccard similarity at which a pair has ~50% chance of becoming a candidate"""
+        return (1.0 / self.bands) ** (1.0 / self.rows_per_band)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of one preprocessed text, cached by content hash"""
+        key = text_hash(text)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return cached
+            self.cache_misses += 1
+        hashes = shingle_hashes(text, self.shingle_size)
+        if hashes.size == 0:
+            signature = np.full(self.num_perm, int(_MAX_HASH), dtype=np.uint32)
+        else:
+            permuted = ((hashes[:, None] * self._a[None, :]) % _PRIME + self._b[None, :]) % _PRIME
+            signature = (permuted & _MAX_HASH).min(axis=0).astype(np.uint32)
+        with self._lock:
+            self._cache[key] = signature
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return signature
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        return np.vstack([self.signature(text) for text in texts])
+
+    def candidate_pairs(self, signatures: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Pairs (i < j) sharing at least one LSH band bucket, in row-major order"""
+        n = signatures.shape[0]
+        codes = []
+        for band in range(self.bands):
+            columns = signatures[:, band * self.rows_per_band:(band + 1) * self.rows_per_band]
+            # One opaque key per row of the band, so rows can be grouped with a 1-D unique
+            keys = np.ascontiguousarray(columns).view(np.dtype((np.void, columns.dtype.itemsize * columns.shape[1])))
+            _, labels = np.unique(keys.ravel(), return_inverse=True)
+            # Stable sort keeps each bucket's members in ascending order, so pairs come out as i < j
+            order = np.argsort(labels, kind="stable")
+            starts = np.flatnonzero(np.diff(labels[order], prepend=-1))
+            sizes = np.diff(starts, append=n)
+            for start, size in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist()):
+                members = order[start:start + size]
+                upper_rows, upper_cols = np.triu_indices(size, k=1)
+                codes.append(members[upper_rows] * n + members[upper_cols])
+        if not codes:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        # Sort and drop repeats; similar texts share many bands, so most codes are repeats
+        pair_codes = np.sort(np.concatenate(codes))
+        pair_codes = pair_codes[np.concatenate(([True], pair_codes[1:] != pair_codes[:-1]))]
+        return pair_codes // n, pair_codes % n
+
+    @staticmethod
+    def estimate_jaccard(signatures: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """Estimated Jaccard similarity: share of equal MinHash values"""
+        if rows.size == 0:
+            return np.empty(0, dtype=np.float32)
+        return (signatures[rows] == signatures[cols]).mean(axis=1).astype(np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "num_perm": self.num_perm,
+                "bands": self.bands,
+                "approximate_threshold": self.approximate_threshold,
+                "signature_cache_entries": len(self._cache),
+                "signature_cache_hits": self.cache_hits,
+                "signature_cache_misses": self.cache_misses
+            }
+
+
+def sample_pairs(n: int, rate: float, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Uniformly sample about rate * n(n-1)/2 distinct pairs (i < j)"""
+    total = n * (n - 1) // 2
+    count = int(round(total * max(0.0, min(rate, 1.0))))
+    if count == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    rng = np.random.default_rng(seed)
+    # Sample linear indices into the upper triangle and map them back to (i, j)
+    linear = np.sort(rng.choice(total, size=count, replace=False))
+    rows = (n - 2 - np.floor(np.sqrt(-8 * linear + 4 * n * (n - 1) - 7) / 2.0 - 0.5)).astype(np.int64)
+    cols = (linear + rows + 1 - n * (n - 1) // 2 + (n - rows) * ((n - rows) - 1) // 2).astype(np.int64)
+    return rows, cols
+
+
+def classify_pairs(
+    processed_texts: List[str],
+    rows: np.ndarray,
+    cols: np.ndarray,
+    lexical_similarities: np.ndarray,
+    lexical_threshold: float
+) -> List[str]:
+    """Label each pair as an exact copy, a near duplicate, or neither ("semantic")"""
+    labels = []
+    for i, j, similarity in zip(rows.tolist(), cols.tolist(), lexical_similarities.tolist()):
+        if processed_texts[i] == processed_texts[j]:
+            labels.append("exact")
+        elif similarity >= lexical_threshold:
+            labels.append("near_duplicate")
+        else:
+            labels.append("semantic")
+    return labels
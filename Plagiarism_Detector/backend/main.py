@@ -1,13 +1,40 @@
 import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+# Taken before the remaining imports so startup-to-ready time covers them
+PROCESS_STARTED_AT = time.monotonic()
+
 from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import numpy as np
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-import openai
+from embedding_cache import EmbeddingCache
+from model_loader import ModelLoader, load_sentence_transformer, warm_up_sentence_transformer
+from openai_embeddings import OpenAIEmbeddingClient, OpenAIEmbeddingError
+from corpus import Corpus, CorpusReadOnly
+from passages import detect_passage_plagiarism
+from inference import InferenceScheduler
+from lexical import MinHashLSH, sample_pairs, classify_pairs
+from jobs import Job, JobManager, JobLimitExceeded, run_comparison
+from sessions import AnalysisSession, SessionManager
+from similarity import normalize_embeddings, find_similar_pairs, full_similarity_matrix
+from serialization import BINARY_FORMATS, negotiate_format, packed_upper_triangle, render_result
+from metrics import (
+    ENCODE_BATCH_SIZE, REQUEST_SECONDS, get_profile, profile_if_requested, record_texts, render_histograms,
+    render_samples, stage, start_request, trace_memory
+)
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
 # Load environment variables
 load_dotenv()
@@ -28,39 +55,194 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Set OpenAI API key if available
+# OpenAI API key, if available
 openai_api_key = os.getenv("OPENAI_API_KEY")
-if openai_api_key:
-    openai.api_key = openai_api_key
 
-# Load models
-models = {
-    "sentence-transformers/all-MiniLM-L6-v2": None,
-    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2": None
-}
+# Opt-in debugging aids: per-request sampling profiles (X-Profile: 1) and tracemalloc peak memory
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+METRICS_TRACE_MEMORY = os.getenv("METRICS_TRACE_MEMORY", "false").lower() == "true"
+
+# Number of serving processes (set by serve.py); shared files are opened read-only when several workers map them
+SERVING_WORKERS = int(os.getenv("SERVING_WORKERS", 1))
+CORPUS_READ_ONLY_DETAIL = (
+    f"The corpus is read-only while serve.py runs {SERVING_WORKERS} worker processes. "
+    "Add or remove documents with a single process (`uvicorn main:app`, or WORKERS=1 python serve.py), "
+    "then restart serve.py so the workers map the updated indexes."
+)
+
+# Available models
+models = [
+    "sentence-transformers/all-MiniLM-L6-v2",
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+]
+
+# Each model is loaded and warmed once; PRELOAD_MODELS are loaded in the background at startup
+model_loader = ModelLoader(load_sentence_transformer, warm_up_sentence_transformer, started_at=PROCESS_STARTED_AT)
+PRELOAD_MODELS = [
+    name.strip() for name in os.getenv("PRELOAD_MODELS", "sentence-transformers/all-MiniLM-L6-v2").split(",") if name.strip()
+]
+
+# Micro-batching schedulers, one per loaded sentence-transformers model
+schedulers: Dict[str, InferenceScheduler] = {}
+schedulers_lock = threading.Lock()
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", 64))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", 5))
 
 # Similarity threshold from environment or default
 SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", 0.8))
 
+# Number of rows compared per matmul; bounds peak memory to block size x N
+SIMILARITY_BLOCK_SIZE = int(os.getenv("SIMILARITY_BLOCK_SIZE", 1024))
+# Most merged passage spans returned per passage-mode request
+MAX_PASSAGE_MATCHES = int(os.getenv("MAX_PASSAGE_MATCHES", 1000))
+
+# MinHash/LSH lexical stage; LEXICAL_THRESHOLD is an estimated Jaccard similarity
+LEXICAL_THRESHOLD = float(os.getenv("LEXICAL_THRESHOLD", 0.5))
+lexical_index = MinHashLSH(
+    num_perm=int(os.getenv("MINHASH_PERMUTATIONS", 128)),
+    bands=int(os.getenv("MINHASH_BANDS", 32))
+)
+
+# Most random pairs hybrid mode may sample per request; pairs are scored in chunks of HYBRID_PAIR_CHUNK
+HYBRID_MAX_SAMPLED_PAIRS = int(os.getenv("HYBRID_MAX_SAMPLED_PAIRS", 1000000))
+HYBRID_PAIR_CHUNK = 65536
+
+# Embedding cache shared by the sentence-transformers and OpenAI paths
+embedding_cache = EmbeddingCache(
+    cache_dir=os.getenv("EMBEDDING_CACHE_DIR", ".embedding_cache"),
+    memory_size=int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", 10000)),
+    disk_size=int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", 100000)),
+    memory_dtype=os.getenv("EMBEDDING_CACHE_MEMORY_DTYPE", "float32"),
+    disk_read_only=SERVING_WORKERS > 1,
+    flush_every=int(os.getenv("EMBEDDING_CACHE_FLUSH_EVERY", 1000)),
+    flush_interval=float(os.getenv("EMBEDDING_CACHE_FLUSH_SECONDS", 30))
+)
+
+OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Batched async client for the OpenAI embeddings endpoint (OPENAI_BASE_URL can point at a stub server)
+openai_client = OpenAIEmbeddingClient(
+    openai_api_key,
+    model=OPENAI_EMBEDDING_MODEL,
+    base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+    max_batch_tokens=int(os.getenv("OPENAI_MAX_BATCH_TOKENS", 100000)),
+    max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", 4)),
+    max_retries=int(os.getenv("OPENAI_MAX_RETRIES", 5)),
+    timeout=float(os.getenv("OPENAI_TIMEOUT", 60))
+)
+
+# Background analysis jobs
+job_manager = JobManager(
+    max_concurrent_jobs=int(os.getenv("MAX_CONCURRENT_JOBS", 2)),
+    max_queued_jobs=int(os.getenv("MAX_QUEUED_JOBS", 16)),
+    max_finished_bytes=int(float(os.getenv("JOB_RESULTS_BUDGET_MB", 512)) * 1024 * 1024)
+)
+
+# Incremental analysis sessions, evicted when idle past the TTL or over the memory budget
+session_manager = SessionManager(
+    max_memory_bytes=int(float(os.getenv("SESSION_MEMORY_BUDGET_MB", 512)) * 1024 * 1024),
+    idle_ttl_seconds=float(os.getenv("SESSION_IDLE_TTL_SECONDS", 3600))
+)
+SESSION_SWEEP_SECONDS = float(os.getenv("SESSION_SWEEP_SECONDS", 60))
+
+# Reference corpus persisted next to the embedding cache
+corpus = Corpus(
+    os.getenv("CORPUS_DIR", ".corpus"),
+    storage=os.getenv("CORPUS_VECTOR_STORAGE", "float32"),
+    rerank=os.getenv("CORPUS_RERANK", "true").lower() == "true",
+    read_only=SERVING_WORKERS > 1
+)
+
 # Request and response models
 class TextComparisonRequest(BaseModel):
     texts: List[str]
     model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
     use_openai: bool = False
+    include_matrix: bool = True
+    mode: str = "document"
+    passage_window: int = 3
+    passage_stride: int = 1
+    detection_mode: str = "semantic"
+    hybrid_sample_rate: float = 0.0
+    response_format: Optional[str] = None
+    matrix_dtype: str = "float32"
 
 class SimilarityResult(BaseModel):
-    similarity_matrix: List[List[float]]
+    similarity_matrix: Optional[List[List[float]]] = None
     potential_plagiarism: List[Dict[str, Any]]
     model_used: str
+    passage_matches: Optional[List[Dict[str, Any]]] = None
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str
+    error: Optional[str] = None
+    texts_embedded: int
+    total_texts: int
+    blocks_compared: int
+    total_blocks: int
+    pairs_found: int
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[SimilarityResult] = None
+
+class SessionText(BaseModel):
+    text: str
+    id: Optional[str] = None
+
+class SessionCreateRequest(BaseModel):
+    texts: List[SessionText] = []
+    model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    use_openai: bool = False
+    threshold: Optional[float] = None
+
+class SessionTextsRequest(BaseModel):
+    texts: List[SessionText]
+
+class CorpusDocument(BaseModel):
+    text: str
+    id: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+
+class CorpusAddRequest(BaseModel):
+    documents: List[CorpusDocument]
+    model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    use_openai: bool = False
+
+class CorpusQueryRequest(BaseModel):
+    texts: List[str]
+    model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    use_openai: bool = False
+    top_k: int = 5
+    threshold: Optional[float] = None
+    approximate: bool = False
+    nprobe: int = 16
 
 def load_model(model_name: str):
     """Load and cache the specified model"""
-    if model_name not in models or models[model_name] is None:
-        try:
-            models[model_name] = SentenceTransformer(model_name)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Failed to load model: {str(e)}")
-    return models[model_name]
+    try:
+        return model_loader.get(model_name)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to load model: {str(e)}")
+
+def get_scheduler(model_name: str) -> InferenceScheduler:
+    """Get (or create) the micro-batching scheduler that owns the model"""
+    scheduler = schedulers.get(model_name)
+    if scheduler is None:
+        # Loading happens outside schedulers_lock so different models load in parallel
+        model = load_model(model_name)
+        with schedulers_lock:
+            scheduler = schedulers.get(model_name)
+            if scheduler is None:
+                scheduler = InferenceScheduler(
+                    model,
+                    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+                    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+                    name=model_name
+                )
+                schedulers[model_name] = scheduler
+    return scheduler
 
 def preprocess_text(text: str) -> str:
     """Basic text preprocessing"""
@@ -70,48 +252,213 @@ def preprocess_text(text: str) -> str:
 
 def get_embeddings_sentence_transformers(texts: List[str], model_name: str) -> np.ndarray:
     """Generate embeddings using sentence-transformers"""
-    model = load_model(model_name)
-    processed_texts = [preprocess_text(text) for text in texts]
-    embeddings = model.encode(processed_texts)
-    return embeddings
+    with stage("preprocess"):
+        processed_texts = [preprocess_text(text) for text in texts]
+
+    def encode(missing_texts: List[str]) -> np.ndarray:
+        # Only texts not found in the cache reach the model, batched with concurrent requests
+        with stage("model_load"):
+            scheduler = get_scheduler(model_name)
+        ENCODE_BATCH_SIZE.observe(len(missing_texts), "sentence-transformers")
+        with stage("encode"):
+            return scheduler.encode(missing_texts)
+
+    with stage("embeddings"):
+        return embedding_cache.get_or_compute(model_name, processed_texts, encode)
 
 def get_embeddings_openai(texts: List[str]) -> np.ndarray:
     """Generate embeddings using OpenAI's API"""
     if not openai_api_key:
         raise HTTPException(status_code=400, detail="OpenAI API key not configured")
     
-    processed_texts = [preprocess_text(text) for text in texts]
+    with stage("preprocess"):
+        processed_texts = [preprocess_text(text) for text in texts]
+
+    def encode(missing_texts: List[str]) -> np.ndarray:
+        ENCODE_BATCH_SIZE.observe(len(missing_texts), "openai")
+        with stage("encode"):
+            return openai_client.embed(missing_texts)
+
     try:
-        response = openai.embeddings.create(
-            input=processed_texts,
-            model="text-embedding-ada-002"
-        )
-        embeddings = np.array([item.embedding for item in response.data])
-        return embeddings
+        # Only uncached texts are sent, split into token-bounded batches that run concurrently
+        with stage("embeddings"):
+            return embedding_cache.get_or_compute(f"openai:{OPENAI_EMBEDDING_MODEL}", processed_texts, encode)
+    except OpenAIEmbeddingError as e:
+        status_code = 502 if e.status_code is None or e.status_code >= 500 else e.status_code
+        raise HTTPException(status_code=status_code, detail=f"OpenAI API error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OpenAI API error: {str(e)}")
 
-def calculate_similarity_matrix(embeddings: np.ndarray) -> List[List[float]]:
-    """Calculate pairwise cosine similarity between embeddings"""
-    similarity = cosine_similarity(embeddings)
-    # Convert to Python list for JSON serialization
-    return similarity.tolist()
+def get_embeddings(texts: List[str], model_name: str, use_openai: bool) -> np.ndarray:
+    """Generate embeddings with the requested backend"""
+    if use_openai:
+        return get_embeddings_openai(texts)
+    return get_embeddings_sentence_transformers(texts, model_name)
+
+def describe_model(model_name: str, use_openai: bool) -> str:
+    """Human-readable name of the embedding backend"""
+    if use_openai:
+        return f"OpenAI: {OPENAI_EMBEDDING_MODEL}"
+    return f"Sentence-Transformers: {model_name}"
 
-def detect_plagiarism(similarity_matrix: List[List[float]], threshold: float = SIMILARITY_THRESHOLD) -> List[Dict[str, Any]]:
+def embedding_model_key(model_name: str, use_openai: bool) -> str:
+    """Key identifying the embedding space a vector belongs to"""
+    return f"openai:{OPENAI_EMBEDDING_MODEL}" if use_openai else model_name
+
+def calculate_similarity_matrix(normalized_embeddings: np.ndarray, packed: bool = False) -> np.ndarray:
+    """Calculate pairwise cosine similarity between normalized embeddings"""
+    if packed:
+        # Binary formats only carry the upper triangle, so never build the full matrix for them
+        return packed_upper_triangle(normalized_embeddings, SIMILARITY_BLOCK_SIZE)
+    return full_similarity_matrix(normalized_embeddings, SIMILARITY_BLOCK_SIZE)
+
+def detect_plagiarism(normalized_embeddings: np.ndarray, threshold: float = SIMILARITY_THRESHOLD) -> List[Dict[str, Any]]:
     """Detect potential plagiarism based on similarity threshold"""
-    potential_plagiarism = []
-    
-    for i in range(len(similarity_matrix)):
-        for j in range(i+1, len(similarity_matrix)):  # Only check upper triangle to avoid duplicates
-            similarity = similarity_matrix[i][j]
-            if similarity >= threshold:
-                potential_plagiarism.append({
-                    "text1_index": i,
-                    "text2_index": j,
-                    "similarity": similarity
-                })
-    
-    return potential_plagiarism
+    rows, cols, similarities = find_similar_pairs(normalized_embeddings, threshold, SIMILARITY_BLOCK_SIZE)
+    return [
+        {
+            "text1_index": i,
+            "text2_index": j,
+            "similarity": similarity
+        }
+        for i, j, similarity in zip(rows.tolist(), cols.tolist(), similarities.tolist())
+    ]
+
+def validate_comparison_request(request: TextComparisonRequest):
+    if not request.texts or len(request.texts) < 2:
+        raise HTTPException(status_code=400, detail="At least two texts are required for comparison")
+    if request.mode not in ("document", "passage"):
+        raise HTTPException(status_code=400, detail=f"Unknown analysis mode: {request.mode}")
+    if request.detection_mode not in ("semantic", "lexical", "hybrid"):
+        raise HTTPException(status_code=400, detail=f"Unknown detection mode: {request.detection_mode}")
+    if request.mode == "passage" and request.detection_mode != "semantic":
+        raise HTTPException(status_code=400, detail="Passage mode only supports semantic detection")
+    if request.detection_mode == "hybrid":
+        if not 0.0 <= request.hybrid_sample_rate <= 1.0:
+            raise HTTPException(status_code=400, detail="hybrid_sample_rate must be between 0 and 1")
+        n = len(request.texts)
+        sampled = round(request.hybrid_sample_rate * n * (n - 1) / 2)
+        if sampled > HYBRID_MAX_SAMPLED_PAIRS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"hybrid_sample_rate would sample {sampled} pairs (limit {HYBRID_MAX_SAMPLED_PAIRS}); "
+                       f"lower it or use semantic detection"
+            )
+    if request.detection_mode in ("lexical", "hybrid"):
+        # The default include_matrix=true is ignored, but asking for it explicitly is an error
+        if request.include_matrix and "include_matrix" in request.model_fields_set:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{request.detection_mode.capitalize()} detection does not compute a similarity matrix"
+            )
+
+def analyze_passages(request: TextComparisonRequest, model_used: str) -> Dict[str, Any]:
+    """Passage mode: compare sentence windows across texts and score documents from the matches"""
+    with stage("passage_detection"):
+        result = detect_passage_plagiarism(
+            request.texts,
+            lambda passages: get_embeddings(passages, request.model_name, request.use_openai),
+            SIMILARITY_THRESHOLD,
+            window_size=request.passage_window,
+            stride=request.passage_stride,
+            block_size=SIMILARITY_BLOCK_SIZE,
+            max_matches=MAX_PASSAGE_MATCHES
+        )
+    return {
+        "similarity_matrix": result["similarity_matrix"] if request.include_matrix else None,
+        "potential_plagiarism": result["potential_plagiarism"],
+        "model_used": model_used,
+        "passage_matches": result["passage_matches"]
+    }
+
+def analyze_lexical(request: TextComparisonRequest) -> Dict[str, Any]:
+    """Lexical-only mode: MinHash/LSH near-duplicate detection without any embedding model"""
+    with stage("preprocess"):
+        processed_texts = [preprocess_text(text) for text in request.texts]
+    with stage("minhash"):
+        signatures = lexical_index.signatures(processed_texts)
+    with stage("lsh_candidates"):
+        rows, cols = lexical_index.candidate_pairs(signatures)
+    similarities = lexical_index.estimate_jaccard(signatures, rows, cols)
+    keep = similarities >= LEXICAL_THRESHOLD
+    rows, cols, similarities = rows[keep], cols[keep], similarities[keep]
+    labels = classify_pairs(processed_texts, rows, cols, similarities, LEXICAL_THRESHOLD)
+    return {
+        # An N x N Jaccard matrix would undo the LSH speed-up, so only candidate pairs are scored
+        "similarity_matrix": None,
+        "potential_plagiarism": [
+            {"text1_index": i, "text2_index": j, "similarity": similarity, "match_type": label}
+            for i, j, similarity, label in zip(rows.tolist(), cols.tolist(), similarities.tolist(), labels)
+        ],
+        "model_used": f"MinHash/LSH ({lexical_index.num_perm} permutations, {lexical_index.bands} bands)"
+    }
+
+def analyze_hybrid(request: TextComparisonRequest, model_used: str) -> Dict[str, Any]:
+    """Hybrid mode: embed and compare only LSH candidates plus a random sample of other pairs"""
+    n = len(request.texts)
+    with stage("preprocess"):
+        processed_texts = [preprocess_text(text) for text in request.texts]
+    with stage("minhash"):
+        signatures = lexical_index.signatures(processed_texts)
+    with stage("lsh_candidates"):
+        lsh_rows, lsh_cols = lexical_index.candidate_pairs(signatures)
+    sample_rows, sample_cols = sample_pairs(n, request.hybrid_sample_rate)
+    pair_codes = np.unique(np.concatenate([lsh_rows * n + lsh_cols, sample_rows * n + sample_cols]))
+    rows, cols = pair_codes // n, pair_codes % n
+
+    pairs = []
+    if pair_codes.size:
+        # Only texts that take part in a candidate pair are embedded
+        involved = np.unique(np.concatenate([rows, cols]))
+        positions = np.full(n, -1, dtype=np.int64)
+        positions[involved] = np.arange(involved.size)
+        embeddings = get_embeddings([request.texts[i] for i in involved.tolist()], request.model_name, request.use_openai)
+        with stage("pair_detection"):
+            normalized = normalize_embeddings(embeddings)
+            similarities = np.empty(rows.size, dtype=np.float32)
+            # Chunked so the gathered row pairs stay at HYBRID_PAIR_CHUNK x dim
+            for start in range(0, rows.size, HYBRID_PAIR_CHUNK):
+                chunk = slice(start, start + HYBRID_PAIR_CHUNK)
+                similarities[chunk] = np.einsum(
+                    "ij,ij->i", normalized[positions[rows[chunk]]], normalized[positions[cols[chunk]]]
+                )
+        keep = similarities >= SIMILARITY_THRESHOLD
+        rows, cols, similarities = rows[keep], cols[keep], similarities[keep]
+        lexical_similarities = lexical_index.estimate_jaccard(signatures, rows, cols)
+        labels = classify_pairs(processed_texts, rows, cols, lexical_similarities, LEXICAL_THRESHOLD)
+        pairs = [
+            {
+                "text1_index": i,
+                "text2_index": j,
+                "similarity": similarity,
+                "lexical_similarity": lexical_similarity,
+                "match_type": label
+            }
+            for i, j, similarity, lexical_similarity, label in zip(
+                rows.tolist(), cols.tolist(), similarities.tolist(), lexical_similarities.tolist(), labels
+            )
+        ]
+    return {
+        "similarity_matrix": None,
+        "potential_plagiarism": pairs,
+        "model_used": f"{model_used} (hybrid with MinHash/LSH)"
+    }
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Time every request and attach the stages it recorded as a Server-Timing header"""
+    profile = PROFILING_ENABLED and request.headers.get("x-profile") == "1"
+    request_metrics = start_request(profile)
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(time.perf_counter() - request_metrics.started, getattr(route, "path", "unmatched"))
+    if request_metrics.stages:
+        response.headers["Server-Timing"] = request_metrics.server_timing()
+    if request_metrics.peak_memory is not None:
+        response.headers["X-Peak-Traced-Memory"] = str(request_metrics.peak_memory)
+    if request_metrics.profile_id:
+        response.headers["X-Profile-Id"] = request_metrics.profile_id
+    return response
 
 @app.get("/")
 def read_root():
@@ -121,42 +468,418 @@ def read_root():
 def get_available_models():
     """Get list of available embedding models"""
     return {
-        "sentence_transformers": list(models.keys()),
-        "openai": ["text-embedding-ada-002"] if openai_api_key else []
+        "sentence_transformers": models,
+        "openai": [OPENAI_EMBEDDING_MODEL] if openai_api_key else []
+    }
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Get embedding cache hit/miss counters and sizes"""
+    return embedding_cache.stats()
+
+@app.delete("/cache")
+def clear_cache():
+    """Drop all cached embeddings"""
+    embedding_cache.clear()
+    return {"message": "Embedding cache cleared"}
+
+@app.get("/lexical/stats")
+def get_lexical_stats():
+    """Get MinHash/LSH settings and signature cache counters"""
+    return lexical_index.stats()
+
+@app.get("/inference/stats")
+def get_inference_stats():
+    """Get queue depth and batch-size statistics for each model scheduler"""
+    return {model_name: scheduler.stats() for model_name, scheduler in schedulers.items()}
+
+@app.get("/openai/stats")
+def get_openai_stats():
+    """Get batching, retry and token counters of the OpenAI embeddings client"""
+    return openai_client.stats()
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text-format metrics for this process"""
+    lines = render_histograms()
+    scheduler_stats = {model_name: scheduler.stats() for model_name, scheduler in schedulers.items()}
+    lines += render_samples(
+        "inference_queue_depth", "Texts waiting for the model scheduler", "gauge",
+        [({"model": name}, stats["queue_depth"]) for name, stats in scheduler_stats.items()]
+    )
+    lines += render_samples(
+        "inference_batches_total", "Micro-batches encoded, by batch size", "counter",
+        [
+            ({"model": name, "size": str(size)}, count)
+            for name, stats in scheduler_stats.items()
+            for size, count in stats["batch_size_counts"].items()
+        ]
+    )
+    lines += render_samples(
+        "inference_encode_seconds_total", "Time spent in model.encode", "counter",
+        [({"model": name}, stats["encode_seconds"]) for name, stats in scheduler_stats.items()]
+    )
+    cache_stats = embedding_cache.stats()
+    lines += render_samples(
+        "embedding_cache_lookups_total", "Embedding cache lookups by result", "counter",
+        [
+            ({"result": "memory_hit"}, cache_stats["memory_hits"]),
+            ({"result": "disk_hit"}, cache_stats["disk_hits"]),
+            ({"result": "miss"}, cache_stats["misses"])
+        ]
+    )
+    openai_stats = openai_client.stats()
+    lines += render_samples(
+        "openai_embedding_retries_total", "Retried OpenAI embedding batches", "counter", [({}, openai_stats["retries"])]
+    )
+    if resource is not None:
+        # ru_maxrss is KiB on Linux
+        lines += render_samples(
+            "process_max_resident_memory_bytes", "Peak resident set size of this process", "gauge",
+            [({}, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)]
+        )
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profiles/{profile_id}")
+def get_request_profile(profile_id: str):
+    """Collapsed stacks sampled during a request sent with X-Profile: 1"""
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found")
+    return PlainTextResponse(profile)
+
+@app.get("/ready")
+def get_readiness():
+    """Readiness probe: 200 once every preloaded model is loaded and warmed up, 503 before"""
+    status = model_loader.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.on_event("startup")
+def start_model_preload():
+    model_loader.preload(PRELOAD_MODELS, on_loaded=get_scheduler)
+
+@app.on_event("startup")
+def start_session_sweeper():
+    session_manager.start_sweeper(SESSION_SWEEP_SECONDS)
+
+@app.on_event("shutdown")
+def stop_background_work():
+    job_manager.shutdown()
+    session_manager.close()
+    for scheduler in schedulers.values():
+        scheduler.close()
+    openai_client.close()
+    embedding_cache.flush()
+
+def run_analysis(request: TextComparisonRequest, packed_matrix: bool = False) -> Dict[str, Any]:
+    """Run the requested analysis; the similarity matrix is left as a NumPy array"""
+    model_used = describe_model(request.model_name, request.use_openai)
+    
+    if request.mode == "passage":
+        return analyze_passages(request, model_used)
+    if request.detection_mode == "lexical":
+        return analyze_lexical(request)
+    if request.detection_mode == "hybrid":
+        return analyze_hybrid(request, model_used)
+    
+    # Generate embeddings
+    embeddings = get_embeddings(request.texts, request.model_name, request.use_openai)
+    
+    with stage("normalize"):
+        normalized = normalize_embeddings(embeddings)
+    
+    # Calculate similarity matrix only when the caller wants it
+    similarity_matrix = None
+    if request.include_matrix:
+        with stage("similarity_matrix"):
+            similarity_matrix = calculate_similarity_matrix(normalized, packed_matrix)
+    
+    # Detect potential plagiarism
+    with stage("pair_detection"):
+        plagiarism_results = detect_plagiarism(normalized)
+    
+    return {
+        "similarity_matrix": similarity_matrix,
+        "potential_plagiarism": plagiarism_results,
+        "model_used": model_used
     }
 
 @app.post("/analyze", response_model=SimilarityResult)
-def analyze_texts(request: TextComparisonRequest):
+def analyze_texts(request: TextComparisonRequest, accept: Optional[str] = Header(None)):
     """Analyze texts for similarity and detect potential plagiarism"""
-    if not request.texts or len(request.texts) < 2:
-        raise HTTPException(status_code=400, detail="At least two texts are required for comparison")
+    validate_comparison_request(request)
+    response_format = negotiate_format(request.response_format, accept)
+    if request.detection_mode in ("lexical", "hybrid") and response_format in ("raw", "npy"):
+        raise HTTPException(
+            status_code=400,
+            detail=f"The {response_format} format carries only the similarity matrix, "
+                   f"which {request.detection_mode} detection does not compute"
+        )
+    if response_format == "pairs":
+        request = request.model_copy(update={"include_matrix": False})
     
+    record_texts(request.texts)
     try:
-        # Generate embeddings
-        if request.use_openai:
-            embeddings = get_embeddings_openai(request.texts)
-            model_used = "OpenAI: text-embedding-ada-002"
-        else:
-            embeddings = get_embeddings_sentence_transformers(request.texts, request.model_name)
-            model_used = f"Sentence-Transformers: {request.model_name}"
-        
-        # Calculate similarity matrix
-        similarity_matrix = calculate_similarity_matrix(embeddings)
-        
-        # Detect potential plagiarism
-        plagiarism_results = detect_plagiarism(similarity_matrix)
-        
-        return {
-            "similarity_matrix": similarity_matrix,
-            "potential_plagiarism": plagiarism_results,
-            "model_used": model_used
-        }
+        with trace_memory(METRICS_TRACE_MEMORY), profile_if_requested():
+            result = run_analysis(request, packed_matrix=response_format in BINARY_FORMATS)
+            result.setdefault("passage_matches", None)
+            with stage("serialize"):
+                return render_result(result, response_format, request.matrix_dtype, len(request.texts))
     
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=f"Error during analysis: {str(e)}")
 
+def run_analysis_job(job: Job, request: TextComparisonRequest) -> Dict[str, Any]:
+    """Job runner: the same analysis as /analyze, publishing progress as it goes"""
+    if request.mode == "passage" or request.detection_mode != "semantic":
+        # These modes finish in a single pass, so pairs are published all at once
+        result = run_analysis(request)
+        if result["similarity_matrix"] is not None:
+            result["similarity_matrix"] = np.asarray(result["similarity_matrix"], dtype=np.float32)
+        job.update(texts_embedded=len(request.texts), total_blocks=1)
+        job.add_pairs(result["potential_plagiarism"])
+        return result
+    model_used = describe_model(request.model_name, request.use_openai)
+    result = run_comparison(
+        job,
+        request.texts,
+        lambda texts: get_embeddings(texts, request.model_name, request.use_openai),
+        SIMILARITY_THRESHOLD,
+        SIMILARITY_BLOCK_SIZE,
+        request.include_matrix
+    )
+    result["model_used"] = model_used
+    return result
+
+def get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+def submit_job(request: TextComparisonRequest):
+    """Start an analysis in the background and return its job id"""
+    validate_comparison_request(request)
+    # Finished jobs are kept in memory, so they carry a matrix only when it is asked for
+    if "include_matrix" not in request.model_fields_set:
+        request = request.model_copy(update={"include_matrix": False})
+    n = len(request.texts)
+    if request.include_matrix and n * n * 4 > job_manager.max_finished_bytes:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A {n}x{n} similarity matrix exceeds the job results budget; "
+                   f"leave include_matrix off and stream the pairs instead"
+        )
+    try:
+        job = job_manager.submit(len(request.texts), lambda job: run_analysis_job(job, request))
+    except JobLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job.progress()
+
+@app.get("/jobs")
+def list_jobs():
+    """List active and recently finished jobs"""
+    return job_manager.list()
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+def get_job(job_id: str):
+    """Get job progress, plus the full result once it has completed"""
+    job = get_job_or_404(job_id)
+    status = job.progress()
+    result = job.result
+    if result is not None and result["similarity_matrix"] is not None:
+        result = {**result, "similarity_matrix": result["similarity_matrix"].tolist()}
+    status["result"] = result
+    return status
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(
+    job_id: str,
+    format: Optional[str] = None,
+    matrix_dtype: str = "float32",
+    accept: Optional[str] = Header(None)
+):
+    """Get a completed job's result in any /analyze response format"""
+    job = get_job_or_404(job_id)
+    if job.result is None:
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' is {job.status}, not completed")
+    result = {**job.result, "passage_matches": job.result.get("passage_matches")}
+    return render_result(result, negotiate_format(format, accept), matrix_dtype, job.total_texts)
+
+@app.delete("/jobs/{job_id}", response_model=JobStatus)
+def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    job = get_job_or_404(job_id)
+    job.cancel()
+    return job.progress()
+
+@app.get("/jobs/{job_id}/stream")
+def stream_job_pairs(job_id: str, format: str = "ndjson"):
+    """Stream detected pairs as NDJSON lines or server-sent events while the job runs"""
+    job = get_job_or_404(job_id)
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail=f"Unknown stream format: {format}")
+
+    def ndjson():
+        for pair in job.iter_pairs():
+            yield json.dumps(pair if pair is not None else {"event": "heartbeat"}) + "\n"
+        yield json.dumps({"event": "end", **job.progress()}) + "\n"
+
+    def sse():
+        for pair in job.iter_pairs():
+            # Comment lines keep proxies from closing an idle stream
+            yield f"event: pair\ndata: {json.dumps(pair)}\n\n" if pair is not None else ": keepalive\n\n"
+        yield f"event: end\ndata: {json.dumps(job.progress())}\n\n"
+
+    if format == "sse":
+        return StreamingResponse(sse(), media_type="text/event-stream")
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@contextmanager
+def locked_session_or_404(session_id: str):
+    """Hold the session's lock for the request; 404 if it is gone, including evicted while waiting"""
+    with session_manager.locked(session_id) as session:
+        if session is None:
+            raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found")
+        yield session
+
+def upsert_session_texts(session: AnalysisSession, texts: List[SessionText]) -> Dict[str, Any]:
+    """Add or replace texts (by id) and return the pairs that changed; the caller holds session.lock"""
+    text_ids = [item.id or uuid.uuid4().hex for item in texts]
+    changes = session.upsert(list(zip(text_ids, [item.text for item in texts])), SIMILARITY_BLOCK_SIZE)
+    return {"session_id": session.id, "text_ids": text_ids, "changes": changes}
+
+@app.post("/sessions")
+def create_session(request: SessionCreateRequest):
+    """Start an analysis session, optionally with an initial set of texts"""
+    session = session_manager.create(
+        lambda texts: get_embeddings(texts, request.model_name, request.use_openai),
+        request.threshold if request.threshold is not None else SIMILARITY_THRESHOLD,
+        describe_model(request.model_name, request.use_openai)
+    )
+    try:
+        with session.lock:
+            upsert_session_texts(session, request.texts)
+            result = {**session.summary(), "pairs": session.all_pairs()}
+    except Exception:
+        session_manager.delete(session.id)
+        raise
+    session_manager.evict(keep=session.id)
+    return result
+
+@app.get("/sessions")
+def list_sessions():
+    """List analysis sessions"""
+    return session_manager.list()
+
+@app.get("/sessions/stats")
+def get_session_stats():
+    """Get session count, memory use and eviction counters"""
+    return session_manager.stats()
+
+@app.get("/sessions/{session_id}")
+def get_session(session_id: str):
+    """Get a session's texts and all of its current pairs"""
+    with locked_session_or_404(session_id) as session:
+        return {**session.summary(), "pairs": session.all_pairs()}
+
+@app.post("/sessions/{session_id}/texts")
+def upsert_session(session_id: str, request: SessionTextsRequest):
+    """Add texts, or replace texts whose id already exists; only their rows are recomputed"""
+    with locked_session_or_404(session_id) as session:
+        result = upsert_session_texts(session, request.texts)
+    session_manager.evict(keep=session_id)
+    return result
+
+@app.delete("/sessions/{session_id}/texts/{text_id}")
+def remove_session_text(session_id: str, text_id: str):
+    """Remove a text from a session and return the pairs that disappeared"""
+    with locked_session_or_404(session_id) as session:
+        if text_id not in session.rows:
+            raise HTTPException(status_code=404, detail=f"Text '{text_id}' not found in session")
+        changes = session.remove([text_id])
+    return {"session_id": session.id, "text_ids": [text_id], "changes": changes}
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    """Discard a session"""
+    if not session_manager.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found")
+    return {"deleted": session_id}
+
+@app.post("/corpus/documents")
+def add_corpus_documents(request: CorpusAddRequest):
+    """Add (or replace) reference documents and index them for the requested model"""
+    if not request.documents:
+        raise HTTPException(status_code=400, detail="At least one document is required")
+    try:
+        doc_ids = corpus.add_documents(
+            [document.model_dump() for document in request.documents],
+            embedding_model_key(request.model_name, request.use_openai),
+            lambda texts: get_embeddings(texts, request.model_name, request.use_openai)
+        )
+        return {"added": doc_ids, "total": corpus.stats()["documents"]}
+    except CorpusReadOnly:
+        raise HTTPException(status_code=409, detail=CORPUS_READ_ONLY_DETAIL)
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Error adding documents: {str(e)}")
+
+@app.get("/corpus/documents")
+def list_corpus_documents(offset: int = 0, limit: int = 100):
+    """List stored reference documents"""
+    return corpus.list_documents(offset, limit)
+
+@app.get("/corpus/stats")
+def get_corpus_stats():
+    """Get document counts and per-model index storage"""
+    return corpus.stats()
+
+@app.delete("/corpus/documents/{doc_id}")
+def remove_corpus_document(doc_id: str):
+    """Remove a reference document from the corpus and all indexes"""
+    try:
+        removed = corpus.remove_document(doc_id)
+    except CorpusReadOnly:
+        raise HTTPException(status_code=409, detail=CORPUS_READ_ONLY_DETAIL)
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Document '{doc_id}' not found")
+    return {"removed": doc_id}
+
+@app.post("/corpus/query")
+def query_corpus(request: CorpusQueryRequest):
+    """Find the top-k most similar corpus documents for each text"""
+    if not request.texts:
+        raise HTTPException(status_code=400, detail="At least one text is required")
+    if request.top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k must be at least 1")
+    try:
+        embeddings = get_embeddings(request.texts, request.model_name, request.use_openai)
+        matches = corpus.query(
+            embeddings,
+            embedding_model_key(request.model_name, request.use_openai),
+            lambda texts: get_embeddings(texts, request.model_name, request.use_openai),
+            top_k=request.top_k,
+            threshold=SIMILARITY_THRESHOLD if request.threshold is None else request.threshold,
+            approximate=request.approximate,
+            nprobe=request.nprobe
+        )
+        return {
+            "results": [
+                {"text_index": i, "matches": text_matches}
+                for i, text_matches in enumerate(matches)
+            ],
+            "model_used": describe_model(request.model_name, request.use_openai)
+        }
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Error querying corpus: {str(e)}")
+
 if __name__ == "__main__":
     import uvicorn
     host = os.getenv("HOST", "0.0.0.0")
@@ -0,0 +1,248 @@
+"""
+Request Metrics
+
+Per-stage latency histograms, request size histograms and an opt-in
+sampling profiler for the analysis hot path. Stages are timed with the
+`stage()` context manager; timings go both to process-wide histograms
+(rendered in the Prometheus text format) and to the current request, whose
+stages become its Server-Timing header.
+"""
+
+import sys
+import time
+import uuid
+import threading
+import tracemalloc
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+LENGTH_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+BYTES_BUCKETS = tuple(2 ** power for power in range(20, 34, 1))
+
+
+# The Prometheus helpers below are kept identical in Plagiarism_Detector/backend/metrics.py and
+# Discord_Bot/metrics.py; the two services are deployed separately, so neither imports the other.
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels, rendered Prometheus style"""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = tuple(label_names)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # One slot per bucket, then +Inf count and sum
+                series = self._series[label_values] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values):
+                labels = _format_labels(self.label_names, label_values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {_format_value(count)}")
+            labels = _format_labels(self.label_names, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {_format_value(values[-2])}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_count{labels} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-1])}")
+        return lines
+
+
+def render_samples(name: str, help_text: str, metric_type: str, samples: List[Tuple[Dict[str, str], float]]) -> List[str]:
+    """Prometheus lines for a gauge or counter whose values are read from elsewhere"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(list(labels.keys()), list(labels.values()))} {_format_value(value)}")
+    return lines
+
+
+STAGE_SECONDS = Histogram("analyze_stage_seconds", "Time spent in each analysis stage", LATENCY_BUCKETS, ["stage"])
+REQUEST_SECONDS = Histogram("http_request_seconds", "Request latency by route", LATENCY_BUCKETS, ["route"])
+TEXTS_PER_REQUEST = Histogram("analyze_texts_per_request", "Number of texts per analysis request", COUNT_BUCKETS)
+TEXT_LENGTH = Histogram("analyze_text_length_chars", "Length of each analyzed text in characters", LENGTH_BUCKETS)
+ENCODE_BATCH_SIZE = Histogram(
+    "embedding_encode_batch_texts", "Texts per encode call that missed the embedding cache", COUNT_BUCKETS, ["backend"]
+)
+PEAK_MEMORY = Histogram(
+    "analyze_peak_traced_memory_bytes", "Peak Python/NumPy memory traced during a request", BYTES_BUCKETS
+)
+HISTOGRAMS = [STAGE_SECONDS, REQUEST_SECONDS, TEXTS_PER_REQUEST, TEXT_LENGTH, ENCODE_BATCH_SIZE, PEAK_MEMORY]
+
+
+class RequestMetrics:
+    """Stages recorded while handling one request"""
+
+    def __init__(self, profile: bool = False):
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+        self.profile = profile
+        self.profile_id: Optional[str] = None
+        self.peak_memory: Optional[int] = None
+
+    def server_timing(self) -> str:
+        """Server-Timing header value; repeated stages are summed"""
+        totals: "OrderedDict[str, float]" = OrderedDict()
+        for name, seconds in self.stages:
+            totals[name] = totals.get(name, 0.0) + seconds
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in totals.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+def start_request(profile: bool = False) -> RequestMetrics:
+    request_metrics = RequestMetrics(profile)
+    _current.set(request_metrics)
+    return request_metrics
+
+
+def current_request() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block into the stage histogram and the current request's Server-Timing"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, name)
+        request_metrics = _current.get()
+        if request_metrics is not None:
+            request_metrics.stages.append((name, elapsed))
+
+
+def record_texts(texts: List[str]):
+    TEXTS_PER_REQUEST.observe(len(texts))
+    for text in texts:
+        TEXT_LENGTH.observe(len(text))
+
+
+@contextmanager
+def trace_memory(enabled: bool) -> Iterator[None]:
+    """
+    Record the peak traced allocation size of the block. tracemalloc is
+    process-wide, so concurrent requests inflate each other's peaks.
+    """
+    if not enabled:
+        yield
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        yield
+    finally:
+        peak = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+        PEAK_MEMORY.observe(peak)
+        request_metrics = _current.get()
+        if request_metrics is not None:
+            request_metrics.peak_memory = peak
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval and counts collapsed stacks"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+_profiles: "OrderedDict[str, str]" = OrderedDict()
+_profiles_lock = threading.Lock()
+MAX_PROFILES = 20
+
+
+@contextmanager
+def profile_if_requested(interval: float = 0.005) -> Iterator[None]:
+    """Sample the calling thread while the block runs, if the current request asked for it"""
+    request_metrics = _current.get()
+    if request_metrics is None or not request_metrics.profile:
+        yield
+        return
+    profiler = SamplingProfiler(threading.get_ident(), interval)
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        profile_id = uuid.uuid4().hex
+        with _profiles_lock:
+            _profiles[profile_id] = profiler.collapsed()
+            while len(_profiles) > MAX_PROFILES:
+                _profiles.popitem(last=False)
+        request_metrics.profile_id = profile_id
+
+
+def get_profile(profile_id: str) -> Optional[str]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def render_histograms() -> List[str]:
+    lines: List[str] = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return lines
@@ -0,0 +1,145 @@
+"""
+Model Loader
+
+Loads each embedding model exactly once, however many requests ask for it at
+the same time, and warms it with a dummy encode before handing it out. The
+configured models can be preloaded on a background thread at startup so the
+server reports ready only once they are warm.
+"""
+
+import sys
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def load_sentence_transformer(model_name: str) -> Any:
+    # Imported on first use: torch and sentence-transformers dominate import time
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def set_torch_threads(count: int):
+    """Set the intra-op thread count if torch has been imported"""
+    torch = sys.modules.get("torch")
+    if torch is not None and count > 0:
+        torch.set_num_threads(count)
+
+
+def warm_up_sentence_transformer(model: Any):
+    """One dummy encode so the first real request does not pay for lazy initialization"""
+    model.encode(["Warm-up sentence for the embedding model."])
+
+
+class ModelLoader:
+    """Per-model load locks, warmup, and load timing for a set of models"""
+
+    def __init__(
+        self,
+        load_fn: Callable[[str], Any],
+        warmup_fn: Optional[Callable[[Any], None]] = None,
+        started_at: Optional[float] = None
+    ):
+        self.load_fn = load_fn
+        self.warmup_fn = warmup_fn
+        self._models: Dict[str, Any] = {}
+        self._unwarmed: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self.preload_models: List[str] = []
+        self.started_at = started_at if started_at is not None else time.monotonic()
+        self.ready_at: Optional[float] = None
+        self._preload_thread: Optional[threading.Thread] = None
+
+    def _lock_for(self, model_name: str) -> threading.Lock:
+        with self._locks_lock:
+            lock = self._locks.get(model_name)
+            if lock is None:
+                lock = self._locks[model_name] = threading.Lock()
+                self._status.setdefault(model_name, {"state": PENDING})
+            return lock
+
+    def get(self, model_name: str) -> Any:
+        """Return the warmed model, loading it if no other thread has yet"""
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+        with self._lock_for(model_name):
+            # Another thread may have finished loading while this one waited
+            model = self._models.get(model_name)
+            if model is not None:
+                return model
+            self._status[model_name] = {"state": LOADING}
+            start = time.monotonic()
+            try:
+                model = self._unwarmed.pop(model_name, None)
+                if model is None:
+                    model = self.load_fn(model_name)
+                loaded = time.monotonic()
+                if self.warmup_fn is not None:
+                    self.warmup_fn(model)
+            except Exception as e:
+                # Not cached: the next request retries the load
+                self._status[model_name] = {"state": FAILED, "error": str(e)}
+                raise
+            warmed = time.monotonic()
+            self._status[model_name] = {
+                "state": READY,
+                "load_seconds": round(loaded - start, 3),
+                "warmup_seconds": round(warmed - loaded, 3)
+            }
+            self._models[model_name] = model
+            logger.info("Model %s loaded in %.2fs, warmed up in %.2fs", model_name, loaded - start, warmed - loaded)
+            return model
+
+    def load_weights(self, model_name: str):
+        """Load a model without warming it up, e.g. in a parent process before forking workers"""
+        with self._lock_for(model_name):
+            if model_name not in self._models and model_name not in self._unwarmed:
+                start = time.monotonic()
+                self._unwarmed[model_name] = self.load_fn(model_name)
+                logger.info("Model %s weights loaded in %.2fs", model_name, time.monotonic() - start)
+
+    def preload(self, model_names: List[str], on_loaded: Optional[Callable[[str], None]] = None):
+        """Load and warm models one after another on a background thread"""
+        self.preload_models = list(model_names)
+        for model_name in self.preload_models:
+            self._lock_for(model_name)
+
+        def run():
+            for model_name in self.preload_models:
+                try:
+                    self.get(model_name)
+                    if on_loaded is not None:
+                        on_loaded(model_name)
+                except Exception as e:
+                    logger.error("Preloading model %s failed: %s", model_name, e)
+            if self.ready:
+                self.ready_at = time.monotonic()
+                logger.info("Ready %.2fs after startup", self.ready_at - self.started_at)
+
+        self._preload_thread = threading.Thread(target=run, name="model-preload", daemon=True)
+        self._preload_thread.start()
+
+    @property
+    def ready(self) -> bool:
+        return all(name in self._models for name in self.preload_models)
+
+    def status(self) -> Dict[str, Any]:
+        with self._locks_lock:
+            models = {name: dict(status) for name, status in self._status.items()}
+        return {
+            "ready": self.ready,
+            "preload_models": self.preload_models,
+            "models": models,
+            "startup_to_ready_seconds": round(self.ready_at - self.started_at, 3) if self.ready_at else None
+        }
@@ -0,0 +1,239 @@
+"""
+OpenAI Embeddings Client
+
+Async client for the OpenAI embeddings endpoint. Inputs are split into
+batches by an estimated token budget, batches are sent concurrently up to a
+fixed limit, 429 and 5xx responses are retried with exponential backoff
+(honouring retry-after), and embeddings are reassembled in input order.
+Requests run on one background event loop shared by all callers, so the
+concurrency limit and connection pool apply across requests.
+"""
+
+import random
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+RETRY_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class OpenAIEmbeddingError(Exception):
+    """Raised when a batch fails permanently or runs out of retries"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Delay requested by the server, from retry-after-ms or retry-after (seconds)"""
+    for header, scale in (("retry-after-ms", 1000.0), ("retry-after", 1.0)):
+        value = response.headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) / scale)
+        except ValueError:
+            # HTTP-date values are rare for this API; fall back to backoff
+            return None
+    return None
+
+
+class OpenAIEmbeddingClient:
+    """Token-aware batching, bounded concurrency and retries for /embeddings"""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        model: str = "text-embedding-ada-002",
+        base_url: str = "https://api.openai.com/v1",
+        max_batch_tokens: int = 100000,
+        max_batch_inputs: int = 2048,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        timeout: float = 60.0
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.max_batch_tokens = max(1, max_batch_tokens)
+        self.max_batch_inputs = max(1, max_batch_inputs)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        # Loaded on first use: tiktoken may download its BPE file, which must not block or break startup
+        self._encoding = None
+        self._encoding_loaded = False
+        self._encoding_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.retries = 0
+        self.failures = 0
+        self.texts_embedded = 0
+        self.estimated_tokens = 0
+
+    def _get_encoding(self):
+        if not self._encoding_loaded:
+            with self._encoding_lock:
+                if not self._encoding_loaded:
+                    if tiktoken is not None:
+                        try:
+                            try:
+                                self._encoding = tiktoken.encoding_for_model(self.model)
+                            except KeyError:
+                                self._encoding = tiktoken.get_encoding("cl100k_base")
+                        except Exception as e:
+                            # Offline or firewalled: the byte estimate is good enough for batching
+                            logger.warning("tiktoken encoding unavailable, estimating tokens: %s", e)
+                    self._encoding_loaded = True
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        """Token count with tiktoken, or a ~4 bytes per token estimate without it"""
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text))
+        return max(1, len(text.encode("utf-8")) // 4 + 1)
+
+    def make_batches(self, token_counts: List[int]) -> List[Tuple[int, int]]:
+        """(start, end) ranges of consecutive texts that fit the token and input limits"""
+        batches = []
+        start = 0
+        tokens = 0
+        for i, count in enumerate(token_counts):
+            if i > start and (tokens + count > self.max_batch_tokens or i - start >= self.max_batch_inputs):
+                batches.append((start, i))
+                start, tokens = i, 0
+            tokens += count
+        if start < len(token_counts):
+            batches.append((start, len(token_counts)))
+        return batches
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._start_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(target=loop.run_forever, name="openai-embeddings", daemon=True)
+                    self._thread.start()
+                    self._loop = loop
+        return self._loop
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        # Full jitter keeps concurrent batches from retrying in lockstep
+        return random.uniform(0, delay)
+
+    async def _post_batch(self, texts: List[str]) -> np.ndarray:
+        attempt = 0
+        while True:
+            retry_after = None
+            async with self._semaphore:
+                try:
+                    response = await self._client.post(
+                        f"{self.base_url}/embeddings",
+                        json={"input": texts, "model": self.model}
+                    )
+                except (httpx.TransportError, httpx.TimeoutException) as e:
+                    error = OpenAIEmbeddingError(f"{type(e).__name__}: {e}")
+                else:
+                    if response.status_code == 200:
+                        data = sorted(response.json()["data"], key=lambda item: item["index"])
+                        return np.array([item["embedding"] for item in data], dtype=np.float32)
+                    error = OpenAIEmbeddingError(
+                        f"HTTP {response.status_code}: {response.text[:500]}", response.status_code
+                    )
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        raise error
+                    retry_after = _retry_after_seconds(response)
+            if attempt >= self.max_retries:
+                raise error
+            with self._stats_lock:
+                self.retries += 1
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts on the running loop; results follow the input order"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else {},
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Tokenizing (and loading the encoding on first use) is CPU-bound; keep it off the event loop
+        token_counts = await asyncio.to_thread(lambda: [self.count_tokens(text) for text in texts])
+        batches = self.make_batches(token_counts)
+        with self._stats_lock:
+            self.requests += 1
+            self.batches += len(batches)
+        tasks = [asyncio.ensure_future(self._post_batch(texts[start:end])) for start, end in batches]
+        try:
+            results = await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            with self._stats_lock:
+                self.failures += 1
+            raise
+        with self._stats_lock:
+            self.texts_embedded += len(texts)
+            self.estimated_tokens += sum(token_counts)
+        if not results:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.vstack(results)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Blocking wrapper for worker threads; the batches still run concurrently"""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self.aembed(list(texts)), loop).result()
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        # The semaphore is bound to the stopped loop; aembed creates a new one with the next client
+        self._loop = self._client = self._semaphore = None
+
+    def stats(self) -> Dict[str, object]:
+        with self._stats_lock:
+            return {
+                "model": self.model,
+                "base_url": self.base_url,
+                "requests": self.requests,
+                "batches": self.batches,
+                "retries": self.retries,
+                "failures": self.failures,
+                "texts_embedded": self.texts_embedded,
+                "estimated_tokens": self.estimated_tokens,
+                "max_concurrency": self.max_concurrency,
+                "max_batch_tokens": self.max_batch_tokens,
+                "tokenizer": "tiktoken" if self._encoding is not None else ("estimate" if self._encoding_loaded else "not loaded")
+            }
@@ -0,0 +1,196 @@
+"""
+Passage-Level Detection
+
+Splits texts into sliding windows of sentences, embeds every distinct
+passage once, and compares passages across documents in row blocks. A single
+matmul per block yields both the cross-document passage matches and the
+per-document-pair maxima used for the document-level scores. Matching
+windows that overlap or adjoin in both texts are merged into one span, so a
+copied paragraph is reported once rather than once per window pair.
+"""
+
+import re
+import heapq
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from similarity import normalize_embeddings
+
+_SENTENCE_PATTERN = re.compile(r"[^.!?\n]+(?:[.!?]+|\n+|$)")
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Return (start, end) character offsets of the sentences in text"""
+    spans = []
+    for match in _SENTENCE_PATTERN.finditer(text):
+        segment = match.group()
+        stripped = segment.strip()
+        if not stripped:
+            continue
+        start = match.start() + (len(segment) - len(segment.lstrip()))
+        spans.append((start, start + len(stripped)))
+    return spans
+
+
+def _passage_windows(text: str, window_size: int, stride: int) -> List[Tuple[int, int, int, int]]:
+    """(first sentence, last sentence, start, end) of each sliding window"""
+    sentences = split_sentences(text)
+    if not sentences:
+        return [(0, 0, 0, len(text))]
+    window_size = max(1, window_size)
+    stride = max(1, stride)
+    if len(sentences) <= window_size:
+        return [(0, len(sentences) - 1, sentences[0][0], sentences[-1][1])]
+    windows = []
+    last_start = len(sentences) - window_size
+    for i in range(0, last_start + 1, stride):
+        windows.append((i, i + window_size - 1, sentences[i][0], sentences[i + window_size - 1][1]))
+    if (last_start % stride) != 0:
+        # Make sure the tail of the text is always covered
+        windows.append((last_start, len(sentences) - 1, sentences[last_start][0], sentences[-1][1]))
+    return windows
+
+
+def split_passages(text: str, window_size: int = 3, stride: int = 1) -> List[Tuple[int, int]]:
+    """Return (start, end) offsets of sliding windows of window_size sentences"""
+    return [(start, end) for _, _, start, end in _passage_windows(text, window_size, stride)]
+
+
+def merge_passage_matches(
+    windows: List[Tuple[int, int, int, int, int]],
+    rows: List[int],
+    cols: List[int],
+    sims: List[float]
+) -> List[Dict[str, Any]]:
+    """
+    Merge window matches per text pair into spans. A match joins a span when
+    its windows overlap or adjoin the span's sentences in both texts; the
+    span keeps the best similarity and counts the window pairs it absorbed.
+    Matches must be ordered by first window, as the row-block scan emits them.
+    """
+    # Per text pair: [last sentence in text 1, first and last sentence in text 2, span] of spans still growing
+    open_spans: Dict[Tuple[int, int], List[List[Any]]] = {}
+    merged: List[Dict[str, Any]] = []
+    for i, j, similarity in zip(rows, cols, sims):
+        doc1, first1, last1, start1, end1 = windows[i]
+        doc2, first2, last2, start2, end2 = windows[j]
+        candidates = open_spans.setdefault((doc1, doc2), [])
+        # Spans that end before the sentence preceding this window can no longer grow
+        candidates[:] = [entry for entry in candidates if entry[0] >= first1 - 1]
+        for entry in candidates:
+            if entry[1] - 1 <= last2 and first2 <= entry[2] + 1:
+                entry[0], entry[1], entry[2] = max(entry[0], last1), min(entry[1], first2), max(entry[2], last2)
+                span = entry[3]
+                span["text1_end"] = max(span["text1_end"], end1)
+                span["text2_start"] = min(span["text2_start"], start2)
+                span["text2_end"] = max(span["text2_end"], end2)
+                span["similarity"] = max(span["similarity"], similarity)
+                span["matched_windows"] += 1
+                break
+        else:
+            span = {
+                "text1_index": doc1,
+                "text1_start": start1,
+                "text1_end": end1,
+                "text2_index": doc2,
+                "text2_start": start2,
+                "text2_end": end2,
+                "similarity": similarity,
+                "matched_windows": 1
+            }
+            candidates.append([last1, first2, last2, span])
+            merged.append(span)
+    return merged
+
+
+def detect_passage_plagiarism(
+    texts: List[str],
+    embed_fn: Callable[[List[str]], np.ndarray],
+    threshold: float,
+    window_size: int = 3,
+    stride: int = 1,
+    block_size: int = 1024,
+    max_matches: int = 1000
+) -> Dict[str, Any]:
+    """
+    Compare passages across texts.
+
+    Returns a dict with the document-level similarity matrix (max passage
+    similarity per pair), document pairs with coverage scores, and the
+    best max_matches merged passage spans with character offsets.
+    """
+    spans: List[Tuple[int, int, int, int, int]] = []
+    for doc, text in enumerate(texts):
+        spans.extend((doc, *window) for window in _passage_windows(text, window_size, stride))
+
+    # Identical passages (e.g. boilerplate shared by several texts) are embedded once
+    unique_index: Dict[str, int] = {}
+    chunk_to_unique = np.empty(len(spans), dtype=np.int64)
+    for i, (doc, _, _, start, end) in enumerate(spans):
+        chunk_to_unique[i] = unique_index.setdefault(" ".join(texts[doc][start:end].split()), len(unique_index))
+    unique_embeddings = normalize_embeddings(embed_fn(list(unique_index.keys())))
+    chunks = unique_embeddings[chunk_to_unique]
+
+    n_docs = len(texts)
+    chunk_docs = np.array([span[0] for span in spans], dtype=np.int64)
+    # Chunks are laid out document by document, so each document is a contiguous column range
+    doc_starts = np.searchsorted(chunk_docs, np.arange(n_docs))
+    chunk_counts = np.bincount(chunk_docs, minlength=n_docs)
+
+    doc_matrix = np.full((n_docs, n_docs), -1.0, dtype=np.float32)
+    matched_chunks = np.zeros((n_docs, n_docs), dtype=np.int64)
+    pair_rows, pair_cols, pair_sims = [], [], []
+
+    for start in range(0, len(spans), max(1, block_size)):
+        block = chunks[start:start + block_size] @ chunks.T
+        block_docs = chunk_docs[start:start + block.shape[0]]
+
+        # Best match of every chunk in this block against each document
+        per_doc = np.maximum.reduceat(block, doc_starts, axis=1)
+        np.maximum.at(doc_matrix, block_docs, per_doc)
+        np.add.at(matched_chunks, block_docs, per_doc >= threshold)
+
+        # Cross-document passage pairs, upper triangle only
+        mask = block >= threshold
+        mask &= chunk_docs[None, :] > block_docs[:, None]
+        rows, cols = np.nonzero(mask)
+        if rows.size:
+            pair_rows.append(rows + start)
+            pair_cols.append(cols)
+            pair_sims.append(block[rows, cols])
+
+    np.fill_diagonal(doc_matrix, 1.0)
+    doc_matrix = np.maximum(doc_matrix, doc_matrix.T)
+
+    passage_matches = []
+    if pair_rows:
+        merged = merge_passage_matches(
+            spans,
+            np.concatenate(pair_rows).tolist(),
+            np.concatenate(pair_cols).tolist(),
+            np.concatenate(pair_sims).tolist()
+        )
+        # Keep only the best spans; nlargest also returns them sorted
+        passage_matches = heapq.nlargest(max(0, max_matches), merged, key=lambda match: match["similarity"])
+
+    # Coverage: share of each document's passages that match something in the other
+    coverage = matched_chunks / np.maximum(chunk_counts, 1)[:, None]
+    document_pairs = []
+    doc_rows, doc_cols = np.nonzero(np.triu(doc_matrix >= threshold, k=1))
+    for i, j in zip(doc_rows.tolist(), doc_cols.tolist()):
+        document_pairs.append({
+            "text1_index": i,
+            "text2_index": j,
+            "similarity": float(doc_matrix[i, j]),
+            "text1_coverage": float(coverage[i, j]),
+            "text2_coverage": float(coverage[j, i])
+        })
+
+    return {
+        "similarity_matrix": doc_matrix,
+        "potential_plagiarism": document_pairs,
+        "passage_matches": passage_matches,
+        "passage_count": len(spans),
+        "unique_passage_count": len(unique_index)
+    }
@@ -0,0 +1,254 @@
+"""
+Quantized Embeddings
+
+Scalar quantization of normalized embeddings for compact storage. Vectors
+can be kept as float32, float16, or int8 codes with one float32 scale per
+vector (4x smaller than float32). Similarities are computed directly on the
+stored representation, block by block, so the float32 matrix is never
+rebuilt in memory.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+STORAGE_TYPES = ("float32", "float16", "int8")
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization: vector ~= codes * scale"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize_int8(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * scales[:, None]
+
+
+class QuantizedMatrix:
+    """Growable matrix of vectors held as float32, float16 or int8 + per-row scale"""
+
+    def __init__(self, dim: int, storage: str = "int8", capacity: int = 64):
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown storage type: {storage}")
+        self.dim = dim
+        self.storage = storage
+        self.size = 0
+        dtype = {"float32": np.float32, "float16": np.float16, "int8": np.int8}[storage]
+        self.data = np.empty((capacity, dim), dtype=dtype)
+        self.scales = np.ones(capacity, dtype=np.float32) if storage == "int8" else None
+
+    @classmethod
+    def from_vectors(cls, vectors: np.ndarray, storage: str = "int8", block_size: int = 8192) -> "QuantizedMatrix":
+        matrix = cls(vectors.shape[1] if vectors.ndim == 2 else 0, storage, capacity=max(64, vectors.shape[0]))
+        for start in range(0, vectors.shape[0], block_size):
+            # Blocks keep the float32 working set small when reading from a memmap
+            matrix.append(np.asarray(vectors[start:start + block_size], dtype=np.float32))
+        return matrix
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.storage == "int8":
+            return quantize_int8(vectors)
+        return vectors.astype(self.data.dtype), None
+
+    def _reserve(self, needed: int):
+        if needed <= self.data.shape[0]:
+            return
+        capacity = max(needed, self.data.shape[0] * 2)
+        grown = np.empty((capacity, self.dim), dtype=self.data.dtype)
+        grown[:self.size] = self.data[:self.size]
+        self.data = grown
+        if self.scales is not None:
+            scales = np.ones(capacity, dtype=np.float32)
+            scales[:self.size] = self.scales[:self.size]
+            self.scales = scales
+
+    def append(self, vectors: np.ndarray):
+        codes, scales = self._encode(vectors)
+        self._reserve(self.size + codes.shape[0])
+        self.data[self.size:self.size + codes.shape[0]] = codes
+        if scales is not None:
+            self.scales[self.size:self.size + codes.shape[0]] = scales
+        self.size += codes.shape[0]
+
+    def set_row(self, row: int, vector: np.ndarray):
+        codes, scales = self._encode(vector.reshape(1, -1))
+        self.data[row] = codes[0]
+        if scales is not None:
+            self.scales[row] = scales[0]
+
+    def move_row(self, source: int, target: int):
+        self.data[target] = self.data[source]
+        if self.scales is not None:
+            self.scales[target] = self.scales[source]
+
+    def pop(self):
+        self.size -= 1
+
+    def rows(self, indices: np.ndarray) -> np.ndarray:
+        """Dequantized float32 copies of the given rows"""
+        block = self.data[indices].astype(np.float32)
+        if self.scales is not None:
+            block *= self.scales[indices][:, None]
+        return block
+
+    def dot(self, queries: np.ndarray, indices: Optional[np.ndarray] = None, block_size: int = 8192) -> np.ndarray:
+        """
+        Scores of float32 queries against stored rows (all rows, or `indices`).
+
+        int8 rows are multiplied as widened codes and the per-row scale is
+        applied to the products, so no dequantized matrix is materialized.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        n = self.size if indices is None else len(indices)
+        scores = np.empty((queries.shape[0], n), dtype=np.float32)
+        for start in range(0, n, block_size):
+            end = min(start + block_size, n)
+            selector = slice(start, end) if indices is None else indices[start:end]
+            block = self.data[selector].astype(np.float32)
+            scores[:, start:end] = queries @ block.T
+            if self.scales is not None:
+                scores[:, start:end] *= self.scales[selector][None, :]
+        return scores
+
+    @property
+    def nbytes(self) -> int:
+        total = self.size * self.dim * self.data.itemsize
+        if self.scales is not None:
+            total += self.size * 4
+        return total
+
+
+def measure_recall(
+    vectors: np.ndarray,
+    thresholds: Tuple[float, ...] = (0.6, 0.7, 0.8, 0.9),
+    storages: Tuple[str, ...] = ("float16", "int8")
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Compare above-threshold pairs found on quantized vectors with the
+    float32 ground truth. Returns recall and precision per storage type and
+    threshold, plus the maximum absolute similarity error.
+    """
+    from similarity import normalize_embeddings
+
+    normalized = normalize_embeddings(vectors)
+    exact = normalized @ normalized.T
+    upper = np.triu_indices(normalized.shape[0], k=1)
+    exact_pairs = exact[upper]
+    report: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for storage in storages:
+        quantized = QuantizedMatrix.from_vectors(normalized, storage)
+        approx_pairs = quantized.dot(normalized)[upper]
+        per_threshold: Dict[str, Dict[str, float]] = {}
+        for threshold in thresholds:
+            truth = exact_pairs >= threshold
+            found = approx_pairs >= threshold
+            hits = int(np.sum(truth & found))
+            per_threshold[f"{threshold:.2f}"] = {
+                "true_pairs": int(truth.sum()),
+                "recall": hits / truth.sum() if truth.sum() else 1.0,
+                "precision": hits / found.sum() if found.sum() else 1.0
+            }
+        report[storage] = {
+            "thresholds": per_threshold,
+            "max_abs_error": float(np.max(np.abs(approx_pairs - exact_pairs))) if exact_pairs.size else 0.0,
+            "bytes_per_vector": quantized.nbytes / max(quantized.size, 1)
+        }
+    return report
+
+
+def measure_search_recall(
+    vectors: np.ndarray,
+    top_k: int = 10,
+    queries: int = 100,
+    storages: Tuple[str, ...] = ("float16", "int8")
+) -> Dict[str, Dict[str, float]]:
+    """
+    Top-k search recall against exact float32 search, with and without
+    re-ranking. The last `queries` vectors are the queries and the rest form
+    the index, as in a reference corpus.
+    """
+    from corpus import CorpusIndex
+
+    queries = max(1, min(queries, vectors.shape[0] - 1))
+    documents, query_vectors = vectors[:-queries], vectors[-queries:]
+    doc_ids = [str(i) for i in range(documents.shape[0])]
+
+    def search(storage: str, rerank: bool) -> List[List[Tuple[str, float]]]:
+        index = CorpusIndex(storage=storage, rerank=rerank)
+        index.add(doc_ids, documents)
+        return index.search(query_vectors, top_k, threshold=-1.0)
+
+    exact = search("float32", False)
+    report: Dict[str, Dict[str, float]] = {}
+    for storage in storages:
+        for rerank in (False, True):
+            found = search(storage, rerank)
+            hits = sum(
+                len({doc_id for doc_id, _ in truth} & {doc_id for doc_id, _ in result})
+                for truth, result in zip(exact, found)
+            )
+            exact_scores = [dict(truth) for truth in exact]
+            errors = [
+                abs(score - scores[doc_id])
+                for result, scores in zip(found, exact_scores)
+                for doc_id, score in result if doc_id in scores
+            ]
+            report[f"{storage}{' + rerank' if rerank else ''}"] = {
+                "recall": hits / sum(len(truth) for truth in exact),
+                "max_abs_score_error": max(errors) if errors else 0.0
+            }
+    return report
+
+
+def _synthetic_embeddings(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clusters of noisy copies, so pair similarities spread across the 0.5-1.0 range"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, count // 5), dim)).astype(np.float32)
+    members = centers[np.arange(count) % centers.shape[0]]
+    noise_scale = rng.uniform(0.1, 1.2, size=(count, 1)).astype(np.float32)
+    return members + noise_scale * rng.normal(size=(count, dim)).astype(np.float32)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure pair recall of quantized embeddings against float32")
+    parser.add_argument("--model", help="sentence-transformers model used to embed --texts")
+    parser.add_argument("--texts", help="file with one text per line")
+    parser.add_argument(
+        "--sentences", action="store_true",
+        help="split the whole --texts file into sentences (8+ words, de-duplicated) instead of reading lines"
+    )
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic clustered embeddings instead")
+    parser.add_argument("--dim", type=int, default=384, help="dimension of synthetic embeddings")
+    parser.add_argument("--top-k", type=int, default=0, help="measure top-k search recall (with re-ranking) instead of pairs")
+    parser.add_argument("--queries", type=int, default=100, help="vectors held out as queries for --top-k")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        embeddings = _synthetic_embeddings(args.synthetic, args.dim)
+    else:
+        if not args.model or not args.texts:
+            parser.error("--model and --texts are required unless --synthetic is given")
+        from sentence_transformers import SentenceTransformer
+
+        with open(args.texts, "r", encoding="utf-8") as f:
+            if args.sentences:
+                from passages import split_sentences
+
+                content = " ".join(f.read().split())
+                sentences = (content[start:end] for start, end in split_sentences(content))
+                texts = list(dict.fromkeys(sentence for sentence in sentences if len(sentence.split()) >= 8))
+            else:
+                texts = [line.strip() for line in f if line.strip()]
+        embeddings = SentenceTransformer(args.model).encode(texts)
+
+    import json
+    if args.top_k:
+        print(json.dumps(measure_search_recall(embeddings, args.top_k, args.queries), indent=2))
+    else:
+        print(json.dumps(measure_recall(embeddings), indent=2))
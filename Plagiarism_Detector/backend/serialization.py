@@ -0,0 +1,121 @@
+"""
+Response Serialization
+
+Content negotiation for analysis results. JSON stays the default (encoded
+with orjson when it is installed); compact formats ship the similarity
+matrix as a packed upper triangle of float32/float16 values, either as raw
+bytes, as a .npy file, or inside a msgpack envelope with the pairs.
+"""
+
+import io
+import json
+from typing import Any, Dict, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from similarity import iter_similarity_blocks
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+RESPONSE_FORMATS = ("json", "pairs", "raw", "npy", "msgpack")
+BINARY_FORMATS = ("raw", "npy", "msgpack")
+MATRIX_DTYPES = {"float32": np.float32, "float16": np.float16}
+
+_ACCEPT_FORMATS = {
+    "application/octet-stream": "raw",
+    "application/x-npy": "npy",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.msgpack": "msgpack",
+}
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """Pick a response format from the request field, falling back to the Accept header"""
+    if requested:
+        if requested not in RESPONSE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unknown response format: {requested}")
+        return requested
+    for media_type in (accept or "").split(","):
+        fmt = _ACCEPT_FORMATS.get(media_type.split(";")[0].strip().lower())
+        if fmt:
+            return fmt
+    return "json"
+
+
+def packed_upper_triangle(normalized: np.ndarray, block_size: int) -> np.ndarray:
+    """Row-major strictly-upper-triangle similarities, built block by block without the full matrix"""
+    n = normalized.shape[0]
+    packed = np.empty(n * (n - 1) // 2, dtype=np.float32)
+    offset = 0
+    for row_start, _, block in iter_similarity_blocks(normalized, block_size, upper_only=True):
+        for local_row in range(block.shape[0]):
+            row = block[local_row, local_row + 1:]
+            packed[offset:offset + row.size] = row
+            offset += row.size
+    return packed
+
+
+def pack_matrix(matrix: np.ndarray) -> np.ndarray:
+    """Packed upper triangle of a full square matrix (packed input is returned as is)"""
+    if matrix.ndim == 1:
+        return matrix
+    return matrix[np.triu_indices(matrix.shape[0], k=1)]
+
+
+def render_result(result: Dict[str, Any], fmt: str, matrix_dtype: str, text_count: int) -> Response:
+    """Serialize an analysis result dict in the negotiated format"""
+    if matrix_dtype not in MATRIX_DTYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown matrix dtype: {matrix_dtype}")
+    matrix = result.get("similarity_matrix")
+
+    if fmt in ("json", "pairs"):
+        payload = dict(result)
+        if fmt == "pairs":
+            payload["similarity_matrix"] = None
+        if orjson is not None:
+            return Response(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY), media_type="application/json")
+        if isinstance(payload.get("similarity_matrix"), np.ndarray):
+            payload["similarity_matrix"] = payload["similarity_matrix"].tolist()
+        return Response(json.dumps(payload), media_type="application/json")
+
+    packed = None
+    if matrix is not None:
+        packed = np.ascontiguousarray(pack_matrix(np.asarray(matrix)), dtype=MATRIX_DTYPES[matrix_dtype])
+    headers = {
+        "X-Text-Count": str(text_count),
+        "X-Matrix-Layout": "upper-triangle",
+        "X-Matrix-Dtype": matrix_dtype,
+        "X-Model-Used": result["model_used"],
+        "X-Pairs-Found": str(len(result["potential_plagiarism"]))
+    }
+
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise HTTPException(status_code=406, detail="msgpack is not installed on the server")
+        envelope = {key: value for key, value in result.items() if key != "similarity_matrix"}
+        envelope["similarity_matrix"] = None if packed is None else {
+            "layout": "upper-triangle",
+            "dtype": matrix_dtype,
+            "size": text_count,
+            "data": packed.tobytes()
+        }
+        return Response(msgpack.packb(envelope, use_bin_type=True), media_type="application/msgpack", headers=headers)
+
+    if packed is None:
+        raise HTTPException(status_code=400, detail=f"The {fmt} format requires include_matrix")
+    if fmt == "npy":
+        buffer = io.BytesIO()
+        np.save(buffer, packed)
+        return Response(buffer.getvalue(), media_type="application/x-npy", headers=headers)
+    return Response(packed.tobytes(), media_type="application/octet-stream", headers=headers)
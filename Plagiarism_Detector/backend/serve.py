@@ -0,0 +1,87 @@
+"""
+Production Server
+
+Runs the API in several pre-forked worker processes. The models in
+PRELOAD_MODELS are loaded once in the parent before forking, so workers
+share the weight pages copy-on-write instead of loading one copy each; the
+embedding cache disk tier and corpus indexes are mapped read-only and shared
+through the page cache. Each worker is limited to THREADS_PER_WORKER
+intra-op threads so WORKERS x threads does not oversubscribe the CPU.
+
+With WORKERS greater than 1 the shared files are never written:
+  - the corpus is read-only, so POST /corpus/documents and
+    DELETE /corpus/documents/{id} return 409;
+  - new embeddings stay in each worker's memory tier and are not added to
+    the embedding cache disk tier.
+Build the corpus and warm the disk cache with a single process
+(`uvicorn main:app`, or WORKERS=1 python serve.py), then restart serve.py
+so the workers map the updated files.
+
+    python serve.py
+"""
+
+import os
+import argparse
+import multiprocessing
+
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # Configuration comes from the environment; parsing only serves --help
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+
+load_dotenv()
+
+CPU_COUNT = multiprocessing.cpu_count()
+WORKERS = max(1, int(os.getenv("WORKERS", CPU_COUNT)))
+THREADS_PER_WORKER = max(1, int(os.getenv("THREADS_PER_WORKER", max(1, CPU_COUNT // WORKERS))))
+
+# OpenMP/BLAS pools size themselves from these when numpy and torch are imported
+for _variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+    os.environ.setdefault(_variable, str(THREADS_PER_WORKER))
+# Tells main.py to open shared files read-only; WORKERS alone does not, so `uvicorn main:app` stays writable
+os.environ["SERVING_WORKERS"] = str(WORKERS)
+
+from gunicorn.app.base import BaseApplication  # noqa: E402
+
+import main  # noqa: E402
+from model_loader import set_torch_threads  # noqa: E402
+
+
+def post_fork(server, worker):
+    set_torch_threads(THREADS_PER_WORKER)
+
+
+class Server(BaseApplication):
+    """Gunicorn application serving main.app with uvicorn workers"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return main.app
+
+
+if __name__ == "__main__":
+    if main.PRELOAD_MODELS:
+        import torch
+        # Load weights single-threaded: an OpenMP pool started before fork is not usable in the children
+        torch.set_num_threads(1)
+        for model_name in main.PRELOAD_MODELS:
+            main.model_loader.load_weights(model_name)
+
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", 8000))
+    Server({
+        "bind": f"{host}:{port}",
+        "workers": WORKERS,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "post_fork": post_fork,
+        "timeout": int(os.getenv("WORKER_TIMEOUT", 120))
+    }).run()
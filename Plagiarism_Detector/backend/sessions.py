@@ -0,0 +1,273 @@
+"""
+Analysis Sessions
+
+Server-side state for iterative editing workflows. A session keeps the
+normalized embeddings of a text set and its above-threshold pairs, keyed by
+stable text ids. Adding, replacing or removing texts embeds only the changed
+texts, recomputes only their rows of the similarity matrix, and reports
+which pairs were added, removed or changed. Idle sessions are evicted when
+the total memory used by sessions exceeds a budget, and a background sweep
+drops sessions idle past the TTL even when no requests arrive.
+"""
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from similarity import normalize_embeddings
+
+# Rough per-pair bookkeeping cost (dict entry, tuple key, adjacency sets)
+_PAIR_BYTES = 200
+
+
+def _pair_key(a: str, b: str) -> Tuple[str, str]:
+    return (a, b) if a < b else (b, a)
+
+
+class AnalysisSession:
+    """Embeddings and detected pairs of one editable text set"""
+
+    def __init__(self, embed_fn: Callable[[List[str]], np.ndarray], threshold: float, model_used: str):
+        self.id = uuid.uuid4().hex
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.model_used = model_used
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.texts: Dict[str, str] = {}
+        # Kept up to date under the lock, so memory_bytes never iterates over texts being changed
+        self.text_bytes = 0
+        self.matrix: Optional[np.ndarray] = None
+        self.pairs: Dict[Tuple[str, str], float] = {}
+        self.neighbours: Dict[str, Set[str]] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def memory_bytes(self) -> int:
+        """Approximate size; safe to call without the lock while an update runs"""
+        matrix = self.matrix
+        matrix_bytes = matrix.nbytes if matrix is not None else 0
+        return matrix_bytes + self.text_bytes + len(self.pairs) * _PAIR_BYTES
+
+    def _store_rows(self, text_ids: List[str], normalized: np.ndarray):
+        """Write vectors for existing ids in place and append new ids, growing geometrically"""
+        new_ids = [text_id for text_id in text_ids if text_id not in self.rows]
+        needed = self.size + len(new_ids)
+        if self.matrix is None or self.matrix.shape[1] != normalized.shape[1]:
+            self.matrix = np.empty((max(needed, 16), normalized.shape[1]), dtype=np.float32)
+        elif needed > self.matrix.shape[0]:
+            grown = np.empty((max(needed, self.matrix.shape[0] * 2), self.matrix.shape[1]), dtype=np.float32)
+            grown[:self.size] = self.matrix[:self.size]
+            self.matrix = grown
+        for text_id in new_ids:
+            self.rows[text_id] = len(self.ids)
+            self.ids.append(text_id)
+            self.neighbours[text_id] = set()
+        for text_id, vector in zip(text_ids, normalized):
+            self.matrix[self.rows[text_id]] = vector
+
+    def _drop_pairs(self, text_ids: List[str]) -> Dict[Tuple[str, str], float]:
+        """Remove and return every pair involving the given texts"""
+        dropped = {}
+        for text_id in text_ids:
+            for other in self.neighbours.get(text_id, ()):
+                key = _pair_key(text_id, other)
+                if key in self.pairs:
+                    dropped[key] = self.pairs.pop(key)
+                    if other not in text_ids:
+                        self.neighbours[other].discard(text_id)
+            if text_id in self.neighbours:
+                self.neighbours[text_id] = set()
+        return dropped
+
+    def _compute_pairs(self, text_ids: List[str], block_size: int):
+        """Score the rows of the given texts against every row and record above-threshold pairs"""
+        live = self.matrix[:self.size]
+        rows = np.array([self.rows[text_id] for text_id in text_ids], dtype=np.int64)
+        for start in range(0, rows.size, block_size):
+            block_rows = rows[start:start + block_size]
+            sims = live[block_rows] @ live.T
+            sims[np.arange(block_rows.size), block_rows] = -np.inf
+            hit_rows, hit_cols = np.nonzero(sims >= self.threshold)
+            for local, col, similarity in zip(hit_rows.tolist(), hit_cols.tolist(), sims[hit_rows, hit_cols].tolist()):
+                a, b = self.ids[int(block_rows[local])], self.ids[col]
+                self.pairs[_pair_key(a, b)] = similarity
+                self.neighbours[a].add(b)
+                self.neighbours[b].add(a)
+
+    @staticmethod
+    def _diff(
+        before: Dict[Tuple[str, str], float],
+        after: Dict[Tuple[str, str], float]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        def pair(key: Tuple[str, str], similarity: float) -> Dict[str, Any]:
+            return {"text1_id": key[0], "text2_id": key[1], "similarity": similarity}
+
+        return {
+            "added": [pair(key, sim) for key, sim in after.items() if key not in before],
+            "removed": [pair(key, sim) for key, sim in before.items() if key not in after],
+            "updated": [
+                pair(key, sim) for key, sim in after.items()
+                if key in before and abs(before[key] - sim) > 1e-6
+            ]
+        }
+
+    def upsert(self, texts: List[Tuple[str, str]], block_size: int) -> Dict[str, List[Dict[str, Any]]]:
+        """Add new texts and replace existing ones; only their rows are recomputed"""
+        latest = dict(texts)
+        changed = [text_id for text_id, text in latest.items() if self.texts.get(text_id) != text]
+        if not changed:
+            return self._diff({}, {})
+        embeddings = self.embed_fn([latest[text_id] for text_id in changed])
+        before = self._drop_pairs(changed)
+        self._store_rows(changed, normalize_embeddings(embeddings))
+        for text_id in changed:
+            self.text_bytes += len(latest[text_id]) - len(self.texts.get(text_id, ""))
+            self.texts[text_id] = latest[text_id]
+        self._compute_pairs(changed, block_size)
+        after = {key: self.pairs[key] for text_id in changed for key in
+                 (_pair_key(text_id, other) for other in self.neighbours[text_id])}
+        return self._diff(before, after)
+
+    def remove(self, text_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        present = [text_id for text_id in text_ids if text_id in self.rows]
+        before = self._drop_pairs(present)
+        for text_id in present:
+            row = self.rows.pop(text_id)
+            last = self.size - 1
+            if row != last:
+                # Move the last row into the hole to keep the matrix contiguous
+                moved_id = self.ids[last]
+                self.matrix[row] = self.matrix[last]
+                self.ids[row] = moved_id
+                self.rows[moved_id] = row
+            self.ids.pop()
+            self.text_bytes -= len(self.texts.pop(text_id))
+            del self.neighbours[text_id]
+        return self._diff(before, {})
+
+    def all_pairs(self) -> List[Dict[str, Any]]:
+        return [
+            {"text1_id": a, "text2_id": b, "similarity": similarity}
+            for (a, b), similarity in sorted(self.pairs.items(), key=lambda item: -item[1])
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "model_used": self.model_used,
+            "threshold": self.threshold,
+            "text_ids": list(self.ids),
+            "pairs_found": len(self.pairs),
+            "memory_bytes": self.memory_bytes(),
+            "created_at": self.created_at,
+            "idle_seconds": time.monotonic() - self.last_used
+        }
+
+
+class SessionManager:
+    """Keeps sessions in LRU order and evicts idle ones past a TTL or a total memory budget"""
+
+    def __init__(self, max_memory_bytes: int = 512 * 1024 * 1024, idle_ttl_seconds: float = 3600.0):
+        self.max_memory_bytes = max_memory_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._sessions: "OrderedDict[str, AnalysisSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+
+    def start_sweeper(self, interval: float):
+        """Evict in the background every `interval` seconds, so idle sessions expire without new writes"""
+        if interval <= 0 or self._sweeper is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                self.evict()
+
+        self._sweeper = threading.Thread(target=run, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def close(self):
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=5)
+
+    def create(self, embed_fn: Callable[[List[str]], np.ndarray], threshold: float, model_used: str) -> AnalysisSession:
+        session = AnalysisSession(embed_fn, threshold, model_used)
+        with self._lock:
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[AnalysisSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    @contextmanager
+    def locked(self, session_id: str) -> Iterator[Optional[AnalysisSession]]:
+        """Hold a session's lock; yields None if the session does not exist or was evicted meanwhile"""
+        session = self.get(session_id)
+        if session is None:
+            yield None
+            return
+        with session.lock:
+            # Eviction skips locked sessions, but it may have run before the lock was taken
+            with self._lock:
+                current = self._sessions.get(session_id)
+            yield session if current is session else None
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def evict(self, keep: Optional[str] = None):
+        """Drop expired sessions, then least recently used ones until the budget fits"""
+        now = time.monotonic()
+        with self._lock:
+            for session_id, session in list(self._sessions.items()):
+                if session_id == keep or session.lock.locked():
+                    continue
+                if now - session.last_used > self.idle_ttl_seconds:
+                    del self._sessions[session_id]
+                    self.evictions += 1
+            total = sum(session.memory_bytes() for session in self._sessions.values())
+            for session_id, session in list(self._sessions.items()):
+                if total <= self.max_memory_bytes:
+                    break
+                # Sessions in the middle of an update are skipped rather than pulled from under the caller
+                if session_id == keep or session.lock.locked():
+                    continue
+                total -= session.memory_bytes()
+                del self._sessions[session_id]
+                self.evictions += 1
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return [session.summary() for session in sessions]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "sessions": len(sessions),
+            "memory_bytes": sum(session.memory_bytes() for session in sessions),
+            "max_memory_bytes": self.max_memory_bytes,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,95 @@
+"""
+Similarity Engine
+
+Block-wise cosine similarity over L2-normalized embeddings. Rows are
+compared in blocks with a single matmul each, and above-threshold pairs are
+extracted with vectorized masking, so peak memory is bounded by
+block_size x N rather than N x N.
+"""
+
+from typing import Iterator, Tuple
+
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 1024
+
+
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """Return a contiguous float32 copy of embeddings with unit-length rows"""
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    # Zero vectors stay zero, matching sklearn's cosine_similarity behaviour
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def iter_similarity_blocks(
+    normalized: np.ndarray,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    upper_only: bool = False
+) -> Iterator[Tuple[int, int, np.ndarray]]:
+    """
+    Yield (row_start, col_start, block) for consecutive row blocks.
+
+    When upper_only is set, each block only covers columns from row_start
+    onwards, which is all that is needed for symmetric pair detection.
+    """
+    n = normalized.shape[0]
+    block_size = max(1, block_size)
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        col_start = start if upper_only else 0
+        yield start, col_start, normalized[start:end] @ normalized[col_start:].T
+
+
+def iter_similar_pairs(
+    normalized: np.ndarray,
+    threshold: float,
+    block_size: int = DEFAULT_BLOCK_SIZE
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Yield (rows, cols, similarities) for each row block, covering every
+    pair i < j with similarity >= threshold. Blocks without matches yield
+    empty arrays so callers can track progress.
+    """
+    for row_start, col_start, block in iter_similarity_blocks(normalized, block_size, upper_only=True):
+        mask = block >= threshold
+        # Drop the diagonal and anything below it inside this block
+        local_rows = np.arange(block.shape[0])[:, None] + row_start
+        local_cols = np.arange(block.shape[1])[None, :] + col_start
+        mask &= local_cols > local_rows
+        block_rows, block_cols = np.nonzero(mask)
+        yield block_rows + row_start, block_cols + col_start, block[block_rows, block_cols]
+
+
+def find_similar_pairs(
+    normalized: np.ndarray,
+    threshold: float,
+    block_size: int = DEFAULT_BLOCK_SIZE
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find all pairs (i, j) with i < j and similarity >= threshold.
+
+    Returns parallel arrays (rows, cols, similarities) in row-major order.
+    """
+    rows, cols, sims = [], [], []
+    for block_rows, block_cols, block_sims in iter_similar_pairs(normalized, threshold, block_size):
+        if block_rows.size:
+            rows.append(block_rows)
+            cols.append(block_cols)
+            sims.append(block_sims)
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(sims)
+
+
+def full_similarity_matrix(normalized: np.ndarray, block_size: int = DEFAULT_BLOCK_SIZE) -> np.ndarray:
+    """Materialize the full N x N similarity matrix, block by block"""
+    n = normalized.shape[0]
+    matrix = np.empty((n, n), dtype=np.float32)
+    for row_start, _, block in iter_similarity_blocks(normalized, block_size):
+        matrix[row_start:row_start + block.shape[0]] = block
+    return matrix
@@ -0,0 +1,43 @@
+import numpy as np
+
+from corpus import Corpus
+
+VECTORS = {
+    "old text": np.array([1.0, 0.0, 0.0], dtype=np.float32),
+    "new text": np.array([0.0, 1.0, 0.0], dtype=np.float32),
+    "other text": np.array([0.0, 0.0, 1.0], dtype=np.float32),
+}
+
+
+def embed(texts):
+    return np.stack([VECTORS[text] for text in texts])
+
+
+def query(corpus, text, model_key="model-a"):
+    return [match["document_id"] for match in corpus.query(embed([text]), model_key, embed, top_k=5, threshold=0.9)[0]]
+
+
+def test_replace_after_reload_reembeds_unloaded_indexes(tmp_path):
+    corpus = Corpus(str(tmp_path))
+    corpus.add_documents([{"id": "a", "text": "old text"}], "model-a", embed)
+    corpus.add_documents([{"id": "b", "text": "other text"}], "model-b", embed)
+
+    # After a restart no index is loaded; replacing "a" must still drop its old rows everywhere
+    corpus = Corpus(str(tmp_path))
+    corpus.add_documents([{"id": "a", "text": "new text"}], "model-b", embed)
+    assert query(corpus, "new text", "model-b") == ["a"]
+    assert query(corpus, "old text", "model-b") == []
+
+    corpus = Corpus(str(tmp_path))
+    assert query(corpus, "new text") == ["a"]
+    assert query(corpus, "old text") == []
+
+
+def test_remove_after_reload_drops_persisted_rows(tmp_path):
+    corpus = Corpus(str(tmp_path))
+    corpus.add_documents([{"id": "a", "text": "old text"}], "model-a", embed)
+
+    corpus = Corpus(str(tmp_path))
+    assert corpus.remove_document("a")
+    corpus = Corpus(str(tmp_path))
+    assert corpus._index("model-a").size == 0
@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, _DiskStore
+
+
+def vector(value, dim=4):
+    return np.full(dim, value, dtype=np.float32)
+
+
+def test_get_or_compute_only_embeds_unseen_texts_once():
+    cache = EmbeddingCache()
+    calls = []
+
+    def compute(texts):
+        calls.append(list(texts))
+        return np.stack([vector(len(text)) for text in texts])
+
+    first = cache.get_or_compute("model", ["a", "bb", "a"], compute)
+    second = cache.get_or_compute("model", ["bb", "ccc"], compute)
+    assert calls == [["a", "bb"], ["ccc"]]
+    assert np.array_equal(first[2], vector(1))
+    assert np.array_equal(second[0], vector(2))
+
+
+def test_int8_memory_tier_round_trips_approximately():
+    cache = EmbeddingCache(memory_dtype="int8")
+    original = np.linspace(-1, 1, 16, dtype=np.float32)
+    cache.put_many("model", ["text"], original[None, :])
+    assert np.allclose(cache.get("model", "text"), original, atol=1 / 127)
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), memory_size=0)
+    cache.put_many("org/model", ["a", "b"], np.stack([vector(1), vector(2)]))
+    cache.flush()
+
+    cache = EmbeddingCache(str(tmp_path), memory_size=0)
+    assert np.array_equal(cache.get("org/model", "b"), vector(2))
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_unflushed_rows_are_reclaimed_after_a_crash(tmp_path):
+    store = _DiskStore(str(tmp_path), max_entries=10000)
+    for i in range(1500):
+        store.put(f"key-{i}", vector(2))
+    del store
+    # An index written before the file grew: it knows neither the new rows nor the ones handed out since
+    with open(tmp_path / "index.json", "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    meta.update(capacity=1024, entries=[["kept", 0]], free_rows=[])
+    with open(tmp_path / "index.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    store = _DiskStore(str(tmp_path), max_entries=10000)
+    assert store.capacity == 2048
+    assert sorted(store.free_rows) == list(range(1, 2048))
+    capacity = store.capacity
+    for i in range(capacity - 1):
+        store.put(f"new-{i}", vector(3))
+    assert store.capacity == capacity
+    assert np.array_equal(store.get("kept"), vector(2))
+
+
+def test_full_disk_tier_evicts_oldest_entries(tmp_path):
+    store = _DiskStore(str(tmp_path), max_entries=4)
+    for i in range(6):
+        store.put(f"key-{i}", vector(i))
+    assert len(store) == 4
+    assert store.get("key-0") is None
+    assert np.array_equal(store.get("key-5"), vector(5))
@@ -0,0 +1,64 @@
+import threading
+
+import numpy as np
+
+from inference import InferenceScheduler
+
+
+class RecordingModel:
+    """Encodes a text as its length and records the size of every batch"""
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, batch_size):
+        self.batches.append(len(texts))
+        return np.array([[len(text)] for text in texts], dtype=np.float32)
+
+
+def test_concurrent_requests_share_a_batch_and_get_their_own_rows():
+    model = RecordingModel()
+    scheduler = InferenceScheduler(model, max_batch_size=64, max_wait_ms=200)
+    try:
+        results = {}
+
+        def request(texts):
+            results[texts[0]] = scheduler.encode(texts, timeout=5)
+
+        threads = [threading.Thread(target=request, args=(["x" * size] * size,)) for size in (1, 2, 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for size in (1, 2, 3):
+            assert results["x" * size].tolist() == [[size]] * size
+        assert sum(model.batches) == 6
+        assert len(model.batches) < 3
+    finally:
+        scheduler.close()
+
+
+def test_batches_never_exceed_the_maximum_size():
+    model = RecordingModel()
+    scheduler = InferenceScheduler(model, max_batch_size=4, max_wait_ms=50)
+    try:
+        futures = [scheduler.submit(["text"] * 3) for _ in range(5)]
+        assert all(future.result(timeout=5).shape == (3, 1) for future in futures)
+        assert max(model.batches) <= 4
+        assert scheduler.stats()["texts_encoded"] == 15
+    finally:
+        scheduler.close()
+
+
+def test_model_errors_reach_every_caller_in_the_batch():
+    class FailingModel:
+        def encode(self, texts, batch_size):
+            raise RuntimeError("out of memory")
+
+    scheduler = InferenceScheduler(FailingModel(), max_wait_ms=50)
+    try:
+        futures = [scheduler.submit(["a"]), scheduler.submit(["b"])]
+        for future in futures:
+            assert isinstance(future.exception(timeout=5), RuntimeError)
+    finally:
+        scheduler.close()
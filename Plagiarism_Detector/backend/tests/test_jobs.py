@@ -0,0 +1,66 @@
+import time
+import threading
+
+import numpy as np
+import pytest
+
+from jobs import CANCELLED, COMPLETED, PAIR_BYTES, Job, JobLimitExceeded, JobManager, run_comparison
+
+
+def embed(texts):
+    return np.array([[1.0, 0.0] if text.startswith("a") else [0.0, 1.0] for text in texts], dtype=np.float32)
+
+
+def wait(job):
+    for _ in job.iter_pairs(heartbeat=0.1):
+        pass
+    return job
+
+
+def test_comparison_publishes_pairs_and_keeps_the_matrix_as_an_array():
+    job = Job(4)
+    result = run_comparison(job, ["a1", "b1", "a2", "b2"], embed, 0.9, block_size=1, include_matrix=True, embed_chunk_size=3)
+    pairs = [(pair["text1_index"], pair["text2_index"]) for pair in result["potential_plagiarism"]]
+    assert pairs == [(0, 2), (1, 3)]
+    assert isinstance(result["similarity_matrix"], np.ndarray)
+    assert job.progress()["blocks_compared"] == 4
+    assert job.texts_embedded == 4
+
+
+def test_finished_jobs_are_pruned_by_retained_bytes():
+    manager = JobManager(max_finished_bytes=3 * PAIR_BYTES)
+    try:
+        def runner(job):
+            job.add_pairs([{"text1_index": 0, "text2_index": 1, "similarity": 1.0}] * 2)
+            return {"similarity_matrix": None, "potential_plagiarism": list(job.pairs)}
+
+        jobs = [wait(manager.submit(2, runner)) for _ in range(3)]
+        # Pruning runs after the job finishes; give the worker a moment to take the lock
+        for _ in range(100):
+            if manager.get(jobs[1].id) is None:
+                break
+            time.sleep(0.01)
+        assert manager.get(jobs[0].id) is None
+        assert manager.get(jobs[1].id) is None
+        assert manager.get(jobs[2].id).status == COMPLETED
+    finally:
+        manager.shutdown()
+
+
+def test_queue_limit_and_cancellation():
+    manager = JobManager(max_concurrent_jobs=1, max_queued_jobs=1)
+    release = threading.Event()
+    try:
+        running = manager.submit(1, lambda job: release.wait(5) and {})
+        for _ in range(100):
+            if running.status != "queued":
+                break
+            time.sleep(0.01)
+        queued = manager.submit(1, lambda job: {})
+        with pytest.raises(JobLimitExceeded):
+            manager.submit(1, lambda job: {})
+        manager.cancel(queued.id)
+        assert queued.status == CANCELLED
+    finally:
+        release.set()
+        manager.shutdown()
@@ -0,0 +1,47 @@
+import numpy as np
+
+from lexical import MinHashLSH, classify_pairs, sample_pairs
+
+BASE = "the quick brown fox jumps over the lazy dog while the cat sleeps on the warm mat by the door"
+
+
+def brute_force_candidates(lsh, signatures):
+    rows, cols = [], []
+    n = signatures.shape[0]
+    bands = signatures.reshape(n, lsh.bands, lsh.rows_per_band)
+    for i in range(n):
+        for j in range(i + 1, n):
+            if (bands[i] == bands[j]).all(axis=1).any():
+                rows.append(i)
+                cols.append(j)
+    return rows, cols
+
+
+def test_candidate_pairs_match_brute_force_banding():
+    rng = np.random.default_rng(0)
+    words = BASE.split()
+    texts = [" ".join(rng.permutation(words)[:12]) for _ in range(30)] + [BASE, BASE + " again", BASE]
+    lsh = MinHashLSH(num_perm=32, bands=16)
+    signatures = lsh.signatures(texts)
+    rows, cols = lsh.candidate_pairs(signatures)
+    assert (rows.tolist(), cols.tolist()) == brute_force_candidates(lsh, signatures)
+    assert (30, 32) in set(zip(rows.tolist(), cols.tolist()))
+
+
+def test_identical_texts_estimate_full_jaccard_and_are_labelled_exact():
+    lsh = MinHashLSH()
+    texts = [BASE, BASE, "something completely different about rivers and mountains"]
+    signatures = lsh.signatures(texts)
+    rows, cols = np.array([0, 0]), np.array([1, 2])
+    similarities = lsh.estimate_jaccard(signatures, rows, cols)
+    assert similarities[0] == 1.0
+    assert similarities[1] < 0.2
+    assert classify_pairs(texts, rows, cols, similarities, 0.8) == ["exact", "semantic"]
+    assert lsh.stats()["signature_cache_hits"] == 1
+
+
+def test_sampled_pairs_are_distinct_upper_triangle_pairs():
+    rows, cols = sample_pairs(50, 0.1, seed=3)
+    assert rows.size == round(50 * 49 / 2 * 0.1)
+    assert (rows < cols).all() and (cols < 50).all()
+    assert len(set(zip(rows.tolist(), cols.tolist()))) == rows.size
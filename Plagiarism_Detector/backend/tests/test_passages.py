@@ -0,0 +1,47 @@
+import numpy as np
+
+from passages import detect_passage_plagiarism, merge_passage_matches, split_passages, split_sentences
+
+
+def embed(texts):
+    # One dimension per distinct passage: equal passages match, different ones do not
+    vocabulary = {text: i for i, text in enumerate(dict.fromkeys(texts))}
+    vectors = np.zeros((len(texts), len(vocabulary)), dtype=np.float32)
+    for row, text in enumerate(texts):
+        vectors[row, vocabulary[text]] = 1.0
+    return vectors
+
+
+def test_windows_cover_the_tail_of_the_text():
+    text = "One. Two. Three. Four. Five."
+    assert len(split_sentences(text)) == 5
+    windows = split_passages(text, window_size=3, stride=2)
+    assert [text[start:end] for start, end in windows] == ["One. Two. Three.", "Three. Four. Five."]
+
+
+def test_overlapping_window_matches_merge_into_one_span():
+    # Windows: (doc, first sentence, last sentence, start, end)
+    windows = [(0, 0, 2, 0, 30), (0, 1, 3, 10, 40), (1, 4, 6, 100, 130), (1, 5, 7, 110, 140)]
+    merged = merge_passage_matches(windows, [0, 1], [2, 3], [0.9, 0.95])
+    assert merged == [{
+        "text1_index": 0, "text1_start": 0, "text1_end": 40,
+        "text2_index": 1, "text2_start": 100, "text2_end": 140,
+        "similarity": 0.95, "matched_windows": 2
+    }]
+
+
+def test_copied_paragraph_is_reported_once():
+    shared = "Alpha beta gamma. Delta epsilon zeta. Eta theta iota. Kappa lambda mu."
+    texts = ["Intro sentence here. " + shared, shared + " Closing words here."]
+    result = detect_passage_plagiarism(texts, embed, threshold=0.99, window_size=2)
+    assert len(result["passage_matches"]) == 1
+    match = result["passage_matches"][0]
+    assert texts[0][match["text1_start"]:match["text1_end"]] == shared
+    assert texts[1][match["text2_start"]:match["text2_end"]] == shared
+    assert result["potential_plagiarism"][0]["text2_coverage"] == 0.75
+
+
+def test_max_matches_keeps_the_best_spans():
+    texts = ["First unique one. Second unique two.", "First unique one. Other filler.", "Filler. Second unique two."]
+    result = detect_passage_plagiarism(texts, embed, threshold=0.99, window_size=1, max_matches=1)
+    assert len(result["passage_matches"]) == 1
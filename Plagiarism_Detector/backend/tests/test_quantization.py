@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from quantization import QuantizedMatrix, dequantize_int8, quantize_int8
+from similarity import normalize_embeddings
+
+
+def vectors(n=50, dim=16, seed=0):
+    return normalize_embeddings(np.random.default_rng(seed).normal(size=(n, dim)))
+
+
+def test_int8_round_trip_error_is_within_half_a_step():
+    data = vectors()
+    codes, scales = quantize_int8(data)
+    assert codes.dtype == np.int8
+    assert np.abs(dequantize_int8(codes, scales) - data).max() <= scales.max() / 2 + 1e-6
+
+
+@pytest.mark.parametrize("storage", ["float32", "float16", "int8"])
+def test_dot_on_stored_rows_tracks_float32_scores(storage):
+    data = vectors()
+    queries = vectors(3, seed=1)
+    matrix = QuantizedMatrix.from_vectors(data, storage, block_size=7)
+    assert matrix.size == 50
+    assert np.abs(matrix.dot(queries, block_size=8) - queries @ data.T).max() < 0.02
+    subset = np.array([4, 0, 9])
+    assert np.allclose(matrix.dot(queries, subset), matrix.dot(queries)[:, subset], atol=1e-6)
+
+
+def test_int8_storage_is_a_quarter_of_float32_plus_scales():
+    data = vectors(dim=64)
+    assert QuantizedMatrix.from_vectors(data, "int8").nbytes == 50 * 64 + 50 * 4
+    assert QuantizedMatrix.from_vectors(data, "float32").nbytes == 50 * 64 * 4
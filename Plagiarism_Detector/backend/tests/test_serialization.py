@@ -0,0 +1,47 @@
+import io
+import json
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from serialization import negotiate_format, pack_matrix, packed_upper_triangle, render_result
+from similarity import full_similarity_matrix, normalize_embeddings
+
+
+def result(matrix):
+    return {
+        "similarity_matrix": matrix,
+        "potential_plagiarism": [{"text1_index": 0, "text2_index": 1, "similarity": 0.5}],
+        "model_used": "model"
+    }
+
+
+def test_format_comes_from_the_request_then_the_accept_header():
+    assert negotiate_format("npy", "application/msgpack") == "npy"
+    assert negotiate_format(None, "text/html, application/x-npy;q=0.9") == "npy"
+    assert negotiate_format(None, None) == "json"
+    with pytest.raises(HTTPException):
+        negotiate_format("xml", None)
+
+
+def test_packed_triangle_matches_the_full_matrix():
+    normalized = normalize_embeddings(np.random.default_rng(0).normal(size=(9, 4)))
+    packed = packed_upper_triangle(normalized, block_size=4)
+    assert np.allclose(packed, pack_matrix(full_similarity_matrix(normalized)), atol=1e-6)
+
+
+def test_npy_and_raw_carry_the_packed_triangle():
+    matrix = np.array([[1.0, 0.5, 0.25], [0.5, 1.0, 0.75], [0.25, 0.75, 1.0]], dtype=np.float32)
+    response = render_result(result(matrix), "npy", "float16", 3)
+    assert response.headers["x-matrix-dtype"] == "float16"
+    assert np.load(io.BytesIO(response.body)).tolist() == [0.5, 0.25, 0.75]
+    raw = render_result(result(matrix), "raw", "float32", 3)
+    assert np.frombuffer(raw.body, dtype=np.float32).tolist() == [0.5, 0.25, 0.75]
+
+
+def test_pairs_format_drops_the_matrix_and_binary_formats_require_it():
+    body = json.loads(render_result(result(np.eye(2, dtype=np.float32)), "pairs", "float32", 2).body)
+    assert body["similarity_matrix"] is None
+    with pytest.raises(HTTPException):
+        render_result(result(None), "raw", "float32", 2)
@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+
+from sessions import SessionManager
+
+VECTORS = {"a": [1.0, 0.0], "a2": [0.99, 0.1], "b": [0.0, 1.0]}
+
+
+def embed(texts):
+    return np.array([VECTORS[text] for text in texts], dtype=np.float32)
+
+
+def test_upsert_and_remove_report_pair_changes():
+    session = SessionManager().create(embed, threshold=0.9, model_used="model")
+    diff = session.upsert([("x", "a"), ("y", "b")], block_size=16)
+    assert diff == {"added": [], "removed": [], "updated": []}
+
+    diff = session.upsert([("z", "a2")], block_size=16)
+    assert [(pair["text1_id"], pair["text2_id"]) for pair in diff["added"]] == [("x", "z")]
+
+    # Editing a text recomputes only its pairs
+    diff = session.upsert([("x", "b")], block_size=16)
+    assert [(pair["text1_id"], pair["text2_id"]) for pair in diff["removed"]] == [("x", "z")]
+    assert [(pair["text1_id"], pair["text2_id"]) for pair in diff["added"]] == [("x", "y")]
+
+    diff = session.remove(["y"])
+    assert [(pair["text1_id"], pair["text2_id"]) for pair in diff["removed"]] == [("x", "y")]
+    assert session.ids == ["x", "z"]
+    assert session.text_bytes == len("b") + len("a2")
+
+
+def test_idle_sessions_expire_but_locked_ones_are_kept():
+    manager = SessionManager(idle_ttl_seconds=0.01)
+    idle = manager.create(embed, 0.9, "model")
+    busy = manager.create(embed, 0.9, "model")
+    time.sleep(0.02)
+    with manager.locked(busy.id) as session:
+        assert session is busy
+        manager.evict()
+    assert manager.get(idle.id) is None
+    assert manager.get(busy.id) is busy
+
+
+def test_memory_budget_evicts_least_recently_used_first():
+    manager = SessionManager()
+    sessions = [manager.create(embed, 0.9, "model") for _ in range(3)]
+    for session in sessions:
+        session.upsert([("t", "a")], block_size=16)
+    manager.max_memory_bytes = 2 * sessions[0].memory_bytes()
+    # Touching the oldest session makes the second one the least recently used
+    manager.get(sessions[0].id)
+    manager.evict()
+    assert manager.get(sessions[1].id) is None
+    assert manager.get(sessions[0].id) is sessions[0]
+
+
+def test_sweeper_evicts_without_new_writes():
+    manager = SessionManager(idle_ttl_seconds=0.01)
+    session = manager.create(embed, 0.9, "model")
+    manager.start_sweeper(0.02)
+    try:
+        for _ in range(100):
+            if manager.stats()["sessions"] == 0:
+                break
+            time.sleep(0.01)
+        assert manager.get(session.id) is None
+    finally:
+        manager.close()
@@ -0,0 +1,29 @@
+import numpy as np
+
+from similarity import find_similar_pairs, full_similarity_matrix, normalize_embeddings
+
+
+def random_embeddings(n=37, dim=8, seed=0):
+    return normalize_embeddings(np.random.default_rng(seed).normal(size=(n, dim)))
+
+
+def test_block_size_does_not_change_the_pairs():
+    normalized = random_embeddings()
+    expected = normalized @ normalized.T
+    rows, cols = np.nonzero(np.triu(expected >= 0.3, k=1))
+    for block_size in (1, 5, 37, 1024):
+        found_rows, found_cols, sims = find_similar_pairs(normalized, 0.3, block_size)
+        assert found_rows.tolist() == rows.tolist()
+        assert found_cols.tolist() == cols.tolist()
+        assert np.allclose(sims, expected[rows, cols], atol=1e-6)
+
+
+def test_full_matrix_matches_a_single_matmul():
+    normalized = random_embeddings()
+    assert np.allclose(full_similarity_matrix(normalized, block_size=6), normalized @ normalized.T, atol=1e-6)
+
+
+def test_zero_vectors_stay_zero():
+    normalized = normalize_embeddings(np.array([[0.0, 0.0], [3.0, 4.0]]))
+    assert normalized.dtype == np.float32
+    assert np.allclose(normalized, [[0.0, 0.0], [0.6, 0.8]])